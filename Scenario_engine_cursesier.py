@@ -35,13 +35,384 @@ import re
 from datetime import datetime
 import time
 import traceback
+import argparse
+import shutil
+import hashlib
+import calendar
+import io
+import gzip
+import bz2
+import lzma
+import zipfile
+import codecs
+import mmap
+import bisect
+import shlex
+import asyncio
+import concurrent.futures
+import itertools
+import collections
+from array import array
+import contextlib
+import tempfile
+#shared with the toolkit, see log_stream.py
+from log_stream import stream_json
+
+class Scene_Graph(object):
+	#the scenes as a graph, worked out once when the scenario is loaded
+	#scenes are reached from the root through scene_children; each reachable scene gets the parent and depth of its shortest path from the root,
+	#so the path back to the root of any scene is a lookup, see path
+	#a scene can be the child of more than one scene, cycles are found but the scenario still runs with them
+	# Scenario : dict, scenario sheet from Scenario_Data
+	# root : string, scene the scenario starts at
+	def __init__(self, Scenario, root='0'):
+		self.root = root
+		#blank rows in the sheet come through as a scene called 'None'
+		self.scenes = [i for i in Scenario.keys() if i != 'None']
+		self.children = {}
+		self.parents = {i:[] for i in self.scenes}
+		for i in self.scenes:
+			self.children[i] = [n for n in dict.fromkeys(Scenario[i].get('scene_children', [])) if n in self.parents]
+			for n in self.children[i]:
+				self.parents[n].append(i)
+
+		#breadth first from the root, so parent and depth are of the shortest path
+		self.parent = {}
+		self.depth = {}
+		self.paths = {}
+		if root in self.children:
+			self.parent[root] = None
+			self.depth[root] = 0
+			self.paths[root] = (root,)
+			frontier = collections.deque([root])
+			while frontier:
+				i = frontier.popleft()
+				for n in self.children[i]:
+					if not n in self.depth:
+						self.parent[n] = i
+						self.depth[n] = self.depth[i] + 1
+						self.paths[n] = self.paths[i] + (n,)
+						frontier.append(n)
+		self.reachable = set(self.depth)
+		self.unreachable = [i for i in self.scenes if not i in self.reachable]
+		self.dead_ends = [i for i in self.scenes if len(self.children[i]) == 0]
+		self.cycles = self.find_cycles()
+
+	#one cycle for each edge back to a scene still on the depth first path, as the list of scenes around it
+	def find_cycles(self):
+		cycles = []
+		state = {}		#1 on the current path, 2 finished
+		for start in self.scenes:
+			if start in state:
+				continue
+			path = [start]
+			stack = [iter(self.children[start])]
+			state[start] = 1
+			while stack:
+				n = next(stack[-1], None)
+				if n == None:
+					state[path.pop()] = 2
+					stack.pop()
+				elif state.get(n) == 1:
+					cycles.append(path[path.index(n):] + [n])
+				elif not n in state:
+					state[n] = 1
+					path.append(n)
+					stack.append(iter(self.children[n]))
+		return cycles
+
+	#scenes from the root down to scene, shortest way; just the scene if it can not be reached from the root
+	def path(self, scene):
+		return self.paths.get(scene, (scene,))
+
+	#short report for the validator
+	def summary(self):
+		lines = ['Scene graph: {} scenes, {} reachable from scene {}, {} dead ends, {} cycles'.format(len(self.scenes), len(self.reachable), self.root, len(self.dead_ends), len(self.cycles))]
+		if not self.root in self.children:
+			lines.append('Scene {} does not exist!'.format(self.root))
+		if len(self.unreachable) != 0:
+			lines.append('Not reachable from scene {} (only by ID): {}'.format(self.root, ', '.join(self.unreachable)))
+		for cycle in self.cycles:
+			lines.append('Scene cycle: {}'.format(' -> '.join(cycle)))
+		return '\n'.join(lines)
+
+class Asset_Validator(object):
+	#deep check of what the scenario sheets point at, on top of the file checks in Scenario_validate:
+	#every log source is parsed and its timestamps found (in a process pool, one file per process), every config_file is read and its settings checked,
+	#and optionally every elastic and effect agent is connected to
+	#log results are cached by file size, mtime and sha256 so unchanged files are not parsed again; a file that was only touched is hashed but not parsed
+	# Scenario : Scenario_Data
+	# workers : int, processes parsing logs at once, default one per cpu
+	cache_version = 1
+
+	def __init__(self, Scenario, workers=None):
+		self.Scenario = Scenario
+		self.workers = workers if workers != None else (os.cpu_count() or 1)
+		self.cache_path = os.path.join(Scenario.cache_dir, 'validation.json')
+		self.cache = {}
+		try:
+			with open(self.cache_path, 'r') as f:
+				cache = json.load(f)
+			if cache.get('version') == self.cache_version:
+				self.cache = cache['logs']
+		except Exception:
+			pass
+
+	def save_cache(self):
+		try:
+			os.makedirs(self.Scenario.cache_dir, exist_ok=True)
+			tmp_path = self.cache_path + '.tmp'
+			with open(tmp_path, 'w') as f:
+				json.dump({'version':self.cache_version, 'logs':self.cache}, f)
+			os.replace(tmp_path, self.cache_path)
+		except Exception as e:
+			print('Could not save validation cache {}: {}'.format(self.cache_path, str(e)))
+
+	#time options Log_Controller takes, from the .conf time or a log_time in the logs sheet: no_update, now or a timestamp
+	@staticmethod
+	def time_option_ok(option):
+		return option in ('no_update', 'now') or Timestamp_Rebaser.iso_pattern.fullmatch(option) != None
+
+	#problems with a .conf, the same settings Log_Controller.setup reads
+	def check_config(self, conf_file):
+		problems = []
+		try:
+			config = ELK_Connections.config(conf_file)
+		except Exception as e:
+			return ['{}: could not be read: {}'.format(conf_file, str(e))]
+		if not 'ELK' in config:
+			return ['{}: no [ELK] section'.format(conf_file)]
+		elk = config['ELK']
+		for opt in ['delay', 'ip', 'port', 'time', 'index', 'username', 'password', 'security']:
+			if not opt in elk:
+				problems.append('{}: {} not found'.format(conf_file, opt))
+		if 'time' in elk and not self.time_option_ok(elk['time']):
+			problems.append('{}: time option <{}> not supported'.format(conf_file, elk['time']))
+		for opt, kind in [('port', int), ('timestamp_sample', int), ('bulk_docs', int), ('bulk_bytes', int), ('bulk_retries', int), ('workers', int), ('timeout', float), ('trickle_tick', float), ('replay_start', float)]:
+			try:
+				if opt in elk:
+					kind(elk[opt])
+			except ValueError:
+				problems.append('{}: {} is not a number: {}'.format(conf_file, opt, elk[opt]))
+		return problems
+
+	# returns the number of errors, problems are printed like Scenario_validate
+	# probe : bool, also connect to every elastic and effect agent
+	def run(self, probe=False):
+		start = time.monotonic()
+		errors = 0
+
+		#configs first, the log checks need their settings
+		confs = sorted(set(log['config_file'][0] for log in self.Scenario.Logs.values() if log['config_file'][0] not in ("None", None) and os.path.exists(log['config_file'][0])))
+		for conf_file in confs:
+			for problem in self.check_config(conf_file):
+				print(problem)
+				errors += 1
+		#a log_time replaces the .conf time for its log
+		for Log_ID, log in self.Scenario.Logs.items():
+			log_time = log['log_time'][0]
+			if log_time != "None" and log_time != None and not self.time_option_ok(str(log_time)):
+				print('{}: log_time <{}> not supported'.format(Log_ID, log_time))
+				errors += 1
+
+		#one check per log source and timestamp settings, shared by every log ID using them
+		checks = {}
+		for Log_ID in self.Scenario.Logs.keys():
+			try:
+				key = self.Scenario.payload_key(Log_ID)
+			except Exception:
+				key = None
+			if key == None or not log_source_exists(key[0]):
+				continue
+			checks.setdefault(json.dumps([key[0], key[2], key[3]]), (key, []))[1].append(Log_ID)
+
+		results = {}
+		pending = {}
+		cached = 0
+		with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as pool:
+			for name, (key, Log_IDs) in checks.items():
+				info = os.stat(split_log_source(key[0])[0])
+				entry = self.cache.get(name)
+				if entry != None and entry['size'] == info.st_size and entry['mtime'] == info.st_mtime_ns:
+					results[name] = entry['result']
+					cached += 1
+					continue
+				known = entry['result']['sha256'] if entry != None and entry['size'] == info.st_size else None
+				pending[pool.submit(check_log_source, key[0], list(key[2]) if key[2] != None else None, key[3], known)] = (name, info)
+			for future in concurrent.futures.as_completed(pending):
+				name, info = pending[future]
+				try:
+					result = future.result()
+				except Exception as e:
+					result = {'error':"{}: {}".format(type(e).__name__, str(e))}
+				if result.get('unchanged'):
+					result = self.cache[name]['result']
+					cached += 1
+				results[name] = result
+				if result.get('sha256') != None:
+					self.cache[name] = {'size':info.st_size, 'mtime':info.st_mtime_ns, 'result':result}
+				print('Checked {}/{} log files: {}'.format(len(results), len(checks), checks[name][0][0]))
+		self.save_cache()
+
+		for name, (key, Log_IDs) in checks.items():
+			result = results[name]
+			IDs = ', '.join(Log_IDs)
+			if result.get('error') != None:
+				print('{} ({}) \nLog source does not parse: {}'.format(key[0], IDs, result['error']))
+				errors += 1
+			elif result['docs'] == 0:
+				print('{} ({}) \nLog source has no documents!'.format(key[0], IDs))
+				errors += 1
+			elif key[1] and not result['rebased']:
+				print('{} ({}) \nNo timestamps found to update{}!'.format(key[0], IDs, '' if key[2] == None else ' in ' + ', '.join(key[2])))
+				errors += 1
+			elif result['timed'] < result['docs']:
+				#delayed logs without a timestamp are sent with the first tick, worth knowing but not wrong
+				print('{} ({}) \n{} of {} documents have no @timestamp or ts'.format(key[0], IDs, result['docs'] - result['timed'], result['docs']))
+
+		if probe:
+			errors += self.probe()
+
+		print('Deep validation: {} configs, {} log files ({} unchanged since last check), {} errors in {:.1f}s'.format(len(confs), len(checks), cached, errors, time.monotonic() - start))
+		return errors
+
+	#connect to every elastic and effect agent in the scenario, at once
+	def probe(self):
+		targets = {}
+		for log in self.Scenario.Logs.values():
+			conf_file = log['config_file'][0]
+			if conf_file in ("None", None) or not os.path.exists(conf_file):
+				continue
+			config = ELK_Connections.config(conf_file)
+			elk = config['ELK'] if 'ELK' in config else {}
+			if all(opt in elk for opt in ['ip', 'port', 'username', 'password', 'security']):
+				url = ("https://" if elk['security'] == 'True' else "http://") + elk['ip'] + ":" + str(elk['port'])
+				targets[('ELK', url, elk['username'])] = elk['password']
+		for effect in self.Scenario.Effects.values():
+			for n, agent_ip in enumerate(effect['agent_ip']):
+				if agent_ip in ("None", None):
+					continue
+				username = effect['agent_username'][min(n, len(effect['agent_username']) - 1)]
+				password = effect['agent_password'][min(n, len(effect['agent_password']) - 1)]
+				targets[('SSH', agent_ip, username)] = password
+
+		def probe_target(target, password):
+			kind, address, username = target
+			if kind == 'ELK':
+				response = ELK_Connections.session(address, username, password).get(address + '/', timeout=5)
+				if response.status_code != 200:
+					raise ValueError(str(response))
+			else:
+				SSH_Connections.client(address, username, password, timeout=5)
+
+		errors = 0
+		with concurrent.futures.ThreadPoolExecutor(max_workers=32) as pool:
+			futures = {pool.submit(probe_target, target, password): target for target, password in targets.items()}
+			for future in concurrent.futures.as_completed(futures):
+				kind, address, username = futures[future]
+				try:
+					future.result()
+				except Exception as e:
+					print('{} {}@{} could not be reached: {}'.format(kind, username, address, str(e)))
+					errors += 1
+		print('Probed {} elastic and agent targets, {} could not be reached'.format(len(targets), errors))
+		return errors
 
 class Scenario_Data(object):
-	def __init__(self,XLSX_File):
-		self.Scenario = self.read(XLSX_File,'scenario')
-		self.Effects = self.read(XLSX_File,'effects')
-		self.Logs = self.read(XLSX_File, 'logs')
+	# deep : bool, parse the log files and configs too, see Asset_Validator
+	# probe : bool, connect to every elastic and effect agent too
+	def __init__(self,XLSX_File, deep=True, probe=False):
+		self.XLSX_File = XLSX_File
+		#kept next to the workbook so the caches are the same wherever the ECS is started from
+		self.cache_dir = os.path.join(os.path.dirname(os.path.abspath(XLSX_File)), '.ecs_cache')
+		self.snapshot_version = 1
+		self.Scenario, self.Effects, self.Logs = self.load(XLSX_File)
 		self.Scenario_valid = self.Scenario_validate(self.Scenario, self.Effects, self.Logs)
+		self.Graph = Scene_Graph(self.Scenario)
+		print(self.Graph.summary())
+		if deep:
+			self.Scenario_valid += Asset_Validator(self).run(probe)
+		self.Payloads = {}
+		self.stage_limit = 256 << 20
+		self.stage_status = None
+
+	#the settings that decide how a log is staged, None if the log can not be staged
+	#mirrors Log_Controller.setup, the time in the logs sheet wins over the .conf
+	def payload_key(self, Log_ID):
+		log = self.Logs[Log_ID]
+		conf_file = log['config_file'][0]
+		if conf_file == "None" or conf_file == None:
+			return None
+		config = ELK_Connections.config(conf_file)
+		if not 'ELK' in config or not 'time' in config['ELK']:
+			return None
+		time_option = config['ELK']['time']
+		if log['log_time'][0] != "None" and log['log_time'][0] != None:
+			time_option = log['log_time'][0]
+		fields = config['ELK'].get('timestamp_fields', 'auto')
+		if fields == 'auto':
+			fields = None
+		else:
+			fields = tuple(x.strip() for x in fields.split(',') if x.strip() != '')
+		return (log['log_file'][0], time_option != 'no_update', fields, config['ELK'].getint('timestamp_sample', 1000))
+
+	#staged payload for a log, None if it has not been staged
+	def get_payload(self, Log_ID):
+		try:
+			key = self.payload_key(Log_ID)
+		except Exception:
+			return None
+		return self.Payloads.get(key)
+
+	#parse every log file in the logs sheet ahead of time so triggering a scene only has to rebase and send
+	#files are staged smallest first until stage_limit bytes are used, the rest are parsed when their scene is triggered
+	#progress is kept in stage_status for the interface
+	# event : threading.Event, stops staging when set
+	def Stage_Logs(self, event=None):
+		keys = {}
+		for Log_ID in self.Logs.keys():
+			try:
+				key = self.payload_key(Log_ID)
+				if key != None and not key in keys:
+					keys[key] = log_source_size(key[0])
+			except Exception:
+				pass
+		keys = sorted((size, key) for key, size in keys.items())
+
+		used = 0
+		staged = 0
+		for n, (size, key) in enumerate(keys):
+			if event != None and event.is_set():
+				break
+			if used + size > self.stage_limit:
+				self.Index_Logs([key[0] for size, key in keys[n:]], event)
+				self.stage_status = "Staged logs: {}/{} ({} over memory budget)".format(staged, len(keys), len(keys) - n)
+				return
+			self.stage_status = "Staging logs: {}/{} {}".format(staged, len(keys), key[0])
+			try:
+				payload = Log_Payload(key[0], key[1], key[2], key[3]).build(event)
+			except Exception as e:
+				print('Could not stage {}: {}'.format(key[0], str(e)), file=sys.stderr)
+				continue
+			if event != None and event.is_set():
+				break
+			self.Payloads[key] = payload
+			used += len(payload.blob)
+			staged += 1
+		self.stage_status = "Staged logs: {}/{} ({:.1f} MB)".format(staged, len(keys), used / 1048576)
+
+	#logs too big to stage get their sidecar index built instead, so a delayed replay can start without parsing them
+	def Index_Logs(self, log_files, event=None):
+		for log_file in dict.fromkeys(log_files):
+			if event != None and event.is_set():
+				return
+			if not Log_Index.supported(log_file):
+				continue
+			self.stage_status = "Indexing logs: {}".format(log_file)
+			try:
+				Log_Index(log_file, self.cache_dir).load_or_build(event)
+			except Exception as e:
+				print('Could not index {}: {}'.format(log_file, str(e)), file=sys.stderr)
 
 	def Scenario_validate(self,Scenario_data, Effects_data, Logs_Data):
 		errors = 0
@@ -76,7 +447,10 @@ class Scenario_Data(object):
 					if j[-4:] == "file":
 						for n in data[i][j]:
 							if n != "None" and n != None:
-								if not os.path.exists(n):
+								if j == "log_file" and not log_source_exists(n):
+									print('{} \nLog source does not exist!'.format(n))
+									errors  += 1
+								elif j != "log_file" and not os.path.exists(n):
 									print('{} \nFile does not exist!'.format(n))
 									errors  += 1
 							elif j == "config_file" and (n == "None" or n == None):
@@ -86,34 +460,995 @@ class Scenario_Data(object):
 		print('There are {} errors in the Scenario File.'.format(errors))
 		return errors
 
-	def read(self, XLSX_File, sheet):
-		#reads in the XLSX file and converts it to a dictionary
-		wb = load_workbook(filename=XLSX_File)
-		
+	def file_hash(self, file_name):
+		#hash the file contents in chunks so big workbooks dont have to sit in memory
+		sha = hashlib.sha256()
+		with open(file_name, 'rb') as f:
+			for chunk in iter(lambda: f.read(1 << 20), b''):
+				sha.update(chunk)
+		return sha.hexdigest()
+
+	def load(self, XLSX_File):
+		#grab the compiled snapshot if this exact workbook has been read before, otherwise read it and save one
+		snapshot_path = os.path.join(self.cache_dir, self.file_hash(XLSX_File) + '.json')
+		if os.path.exists(snapshot_path):
+			try:
+				with open(snapshot_path, 'r') as f:
+					snapshot = json.load(f)
+				if snapshot.get('version') == self.snapshot_version:
+					return snapshot['scenario'], snapshot['effects'], snapshot['logs']
+			except Exception as e:
+				print('Ignoring bad scenario snapshot {}: {}'.format(snapshot_path, str(e)))
+
+		#one streaming pass over the workbook for all sheets
+		wb = load_workbook(filename=XLSX_File, read_only=True)
+		try:
+			Scenario = self.read(wb, 'scenario')
+			Effects = self.read(wb, 'effects')
+			Logs = self.read(wb, 'logs')
+		finally:
+			wb.close()
+
+		#write to a temp file and swap it in so a crash never leaves a half written snapshot
+		try:
+			os.makedirs(self.cache_dir, exist_ok=True)
+			tmp_path = snapshot_path + '.tmp'
+			with open(tmp_path, 'w') as f:
+				json.dump({'version':self.snapshot_version, 'scenario':Scenario, 'effects':Effects, 'logs':Logs}, f)
+			os.replace(tmp_path, snapshot_path)
+		except Exception as e:
+			print('Could not save scenario snapshot {}: {}'.format(snapshot_path, str(e)))
+
+		return Scenario, Effects, Logs
+
+	def read(self, wb, sheet):
+		#converts a sheet of an open workbook to a dictionary
+
 		#raise error if sheet does not exist
 		if not (sheet in wb.sheetnames):
 			print('Table is missing sheet: {}'.format(sheet))
 			raise ValueError('Table is missing sheet: {}'.format(sheet))
 		else:
 			ws = wb[sheet]
+			#dont trust the saved dimensions, some editors claim the whole sheet is in use
+			ws.reset_dimensions()
+			rows = ws.iter_rows(values_only=True)
 			#grab names of columns for dictionary
-			tags = [str(ws['1'][i].value).lower() for i in range(0,ws.max_column)]
+			tags = [str(x).lower() for x in next(rows, ())]
 			#grab all rows after first and convert into a dict of dict
 			d = {}
-			for row in list(ws.rows)[1:]:
+			for row in rows:
+				#read only rows can come back short, pad them out to the header
+				row = tuple(row) + (None,)*(len(tags)-len(row))
 				rowdict = dict()
-				for i in range(1,ws.max_column):
+				for i in range(1,len(tags)):
 					#split lists on ";" if not the discription
 					if tags[i] == "description": 
-						rowdict[tags[i]] = str(row[i].value)
+						rowdict[tags[i]] = str(row[i])
 					elif tags[i][-8:] == "_command":
-						rowdict[tags[i]] = str(row[i].value).split("\\n")
+						rowdict[tags[i]] = str(row[i]).split("\\n")
 					else:
-						rowdict[tags[i]] = [x.strip() for x in str(row[i].value).split(";")]
-				d[str(row[0].value)] = rowdict
-			wb.close()
+						rowdict[tags[i]] = [x.strip() for x in str(row[i]).split(";")]
+				d[str(row[0])] = rowdict
 			return d
 
+#log files can be plain files, compressed files (.gz, .bz2, .xz), or members of a zip archive written as archive.zip!member
+#returns (archive, member) for zip members and (path, None) for everything else
+def split_log_source(log_file):
+	if '!' in log_file:
+		archive, member = log_file.split('!', 1)
+		if archive.lower().endswith('.zip'):
+			return archive, member
+	return log_file, None
+
+#open a log source as text, decompressing on the fly as it is read
+# log_file : string, path to a log file, compressed log file, or zip archive member
+# raw : binary file object to read log_file from instead of opening it, not for zip members
+def open_log(log_file, raw=None):
+	archive, member = split_log_source(log_file)
+	if member != None:
+		#the member stream keeps the archive file open after the ZipFile is closed
+		with zipfile.ZipFile(archive) as zf:
+			raw = zf.open(member)
+		if member.lower().endswith('.gz'):
+			return gzip.open(raw, 'rt')
+		return io.TextIOWrapper(raw)
+	lower = log_file.lower()
+	source = raw if raw != None else log_file
+	if lower.endswith('.gz'):
+		return gzip.open(source, 'rt')
+	elif lower.endswith('.bz2'):
+		return bz2.open(source, 'rt')
+	elif lower.endswith('.xz'):
+		return lzma.open(source, 'rt')
+	if raw != None:
+		return io.TextIOWrapper(raw)
+	return open(log_file, 'r')
+
+#raw file that hashes the bytes read through it, so a log source can be hashed by the same read that parses it
+class Hashing_Reader(io.RawIOBase):
+	# fileobj : binary file object, read from the start
+	def __init__(self, fileobj):
+		self.fileobj = fileobj
+		self.sha = hashlib.sha256()
+
+	def readable(self):
+		return True
+
+	def readinto(self, b):
+		n = self.fileobj.readinto(b)
+		if n:
+			self.sha.update(memoryview(b)[:n])
+		return n
+
+	#sha256 of the whole file, reading what the parser did not get to
+	def hexdigest(self):
+		for block in iter(lambda: self.fileobj.read(1 << 20), b''):
+			self.sha.update(block)
+		return self.sha.hexdigest()
+
+#check a log source exists, including the member of a zip archive
+def log_source_exists(log_file):
+	archive, member = split_log_source(log_file)
+	if member == None:
+		return os.path.exists(log_file)
+	try:
+		with zipfile.ZipFile(archive) as zf:
+			zf.getinfo(member)
+		return True
+	except (OSError, KeyError, zipfile.BadZipFile):
+		return False
+
+#best guess at the uncompressed size of a log source in bytes, used for memory budgets
+def log_source_size(log_file):
+	archive, member = split_log_source(log_file)
+	if member != None:
+		with zipfile.ZipFile(archive) as zf:
+			return zf.getinfo(member).file_size
+	if log_file.lower().endswith('.gz'):
+		#gzip keeps the uncompressed size (mod 4GB) in its last 4 bytes
+		with open(log_file, 'rb') as f:
+			f.seek(-4, os.SEEK_END)
+			return max(int.from_bytes(f.read(4), 'little'), os.path.getsize(log_file))
+	return os.path.getsize(log_file)
+
+#deep check of one log source, run in a worker process by Asset_Validator
+#parses every document and runs the first <sample> of them through the rebaser to see that it finds timestamps to move
+#with known_sha the file may only have been touched, so it is hashed first and not parsed again if it matches
+#otherwise it is hashed by the same read that parses it; zip members are read out of order, so archives are always hashed first
+# log_file : string, log source as in the logs sheet
+# fields : list of timestamp fields from the .conf, None to auto detect
+# sample : int, documents walked by the rebaser
+# known_sha : string, sha256 of the file when it was last checked
+def check_log_source(log_file, fields=None, sample=1000, known_sha=None):
+	archive, member = split_log_source(log_file)
+	result = {'sha256':None, 'docs':0, 'timed':0, 'fields':[], 'rebased':False, 'error':None}
+	if known_sha != None or member != None:
+		sha = hashlib.sha256()
+		with open(archive, 'rb') as f:
+			for block in iter(lambda: f.read(1 << 20), b''):
+				sha.update(block)
+		result['sha256'] = sha.hexdigest()
+		if result['sha256'] == known_sha:
+			result['unchanged'] = True
+			return result
+
+	rebaser = Timestamp_Rebaser(0, fields, sample)
+	raw = open(archive, 'rb') if member == None else None
+	reader = Hashing_Reader(raw) if raw != None else None
+	try:
+		with open_log(log_file, io.BufferedReader(reader) if reader != None else None) as fileobj:
+			for log in stream_json(fileobj):
+				result['docs'] += 1
+				if Log_Index.primary_time(log) != None:
+					result['timed'] += 1
+				if result['docs'] <= sample:
+					rebaser.rebase(log)
+	except Exception as e:
+		result['error'] = "{} after document {}: {}".format(type(e).__name__, result['docs'], str(e))
+	if raw != None:
+		with raw:
+			result['sha256'] = reader.hexdigest()
+	result['fields'] = sorted('.'.join(f) for f in rebaser.fields)
+	result['rebased'] = rebaser.offset_us != None
+	return result
+
+class Timestamp_Rebaser(object):
+	#shifts the timestamps of a log replay so the first one lands on a new origin, keeping the deltas between logs
+	#the origin and first timestamp are parsed once and every other timestamp is moved with integer microsecond math
+	#only the configured fields are visited; with auto the first <sample> documents are walked to find the fields
+	#supports "2022-12-09T19:14:25.412Z" strings (winlogbeat, suricata, etc.) and a float "ts" epoch (zeek)
+	iso_pattern = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z')
+	cache_limit = 1 << 16
+
+	# origin_us : int, new start of the logs in microseconds since epoch
+	# fields : list of dotted field names (@timestamp, event.created, ...) or None to auto detect
+	# sample : int, number of documents to fully walk when auto detecting
+	def __init__(self, origin_us, fields=None, sample=1000):
+		self.origin_us = origin_us
+		self.offset_us = None
+		self.auto = fields is None
+		self.sample = sample
+		self.seen = 0
+		#kept in order, found or configured, so the same timestamp lands on the origin every run
+		self.fields = {}
+		if fields is not None:
+			self.fields = dict.fromkeys(tuple(f.split('.')) for f in fields)
+		self.format_cache = {}
+
+	@staticmethod
+	def parse_iso(stamp):
+		seconds = calendar.timegm((int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]), int(stamp[11:13]), int(stamp[14:16]), int(stamp[17:19])))
+		return seconds * 1000000 + int(stamp[20:23]) * 1000
+
+	def format_iso(self, us):
+		seconds, us = divmod(us, 1000000)
+		prefix = self.format_cache.get(seconds)
+		if prefix is None:
+			if len(self.format_cache) > self.cache_limit:
+				self.format_cache.clear()
+			prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+			self.format_cache[seconds] = prefix
+		return '{}.{:03d}Z'.format(prefix, us // 1000)
+
+	def is_iso(self, value):
+		return len(value) == 24 and value[23] == 'Z' and value[10] == 'T' and self.iso_pattern.fullmatch(value) is not None
+
+	def shift(self, us):
+		#the first timestamp seen is the one that lands on the origin
+		if self.offset_us is None:
+			self.offset_us = self.origin_us - us
+		return us + self.offset_us
+
+	def shift_iso(self, stamp):
+		return self.format_iso(self.shift(self.parse_iso(stamp)))
+
+	#walk every value of a document, rebasing and remembering the paths of any timestamps found
+	def discover(self, node, path):
+		if isinstance(node, dict):
+			items = node.items()
+		else:
+			items = enumerate(node)
+		for key, value in items:
+			if isinstance(value, str):
+				if self.is_iso(value):
+					node[key] = self.shift_iso(value)
+					self.fields.setdefault(path + (key if isinstance(node, dict) else '*',))
+			elif isinstance(value, (dict, list)):
+				self.discover(value, path + (key if isinstance(node, dict) else '*',))
+
+	#rebase only the value(s) at a known path, '*' steps into every item of a list
+	def visit(self, node, path, depth=0):
+		key = path[depth]
+		if key == '*':
+			if not isinstance(node, list):
+				return
+			keys = range(len(node))
+		else:
+			if not isinstance(node, dict) or key not in node:
+				return
+			keys = (key,)
+		for k in keys:
+			value = node[k]
+			if depth + 1 == len(path):
+				if isinstance(value, str) and self.is_iso(value):
+					node[k] = self.shift_iso(value)
+			elif isinstance(value, (dict, list)):
+				self.visit(value, path, depth + 1)
+
+	def rebase(self, log):
+		if self.auto and self.seen < self.sample:
+			if isinstance(log, (dict, list)):
+				self.discover(log, ())
+		else:
+			for path in self.fields:
+				self.visit(log, path)
+		self.seen += 1
+
+		#add @timestamp option in case of "ts" : "<epoch>" - this supports bro log format
+		if isinstance(log, dict) and isinstance(log.get("ts"), float):
+			log["@timestamp"], log["ts"] = self.shift_epoch(round(log["ts"] * 1000000))
+		return log
+
+	#new @timestamp and ts strings for a zeek epoch in microseconds
+	def shift_epoch(self, us):
+		us = self.shift(us)
+		return self.format_iso(us), self.format_epoch(us)
+
+	@staticmethod
+	def format_epoch(us):
+		return '{}.{:06d}'.format(*divmod(us, 1000000))
+
+class Timestamp_Recorder(Timestamp_Rebaser):
+	#finds timestamps the same way the rebaser does, but swaps each one for a numbered marker and records its offset from the first timestamp
+	#used to stage a log file so it can be rebased later by splicing strings instead of parsing json
+	marker_pattern = re.compile(r'"\\u0000ts(\d+)\\u0000"')
+	ISO = 0
+	EPOCH = 1
+
+	def __init__(self, fields=None, sample=1000):
+		Timestamp_Rebaser.__init__(self, 0, fields, sample)
+		self.marks = []
+
+	def mark(self, offset, kind):
+		self.marks.append((offset, kind))
+		return '\u0000ts{}\u0000'.format(len(self.marks) - 1)
+
+	def shift_iso(self, stamp):
+		return self.mark(self.shift(self.parse_iso(stamp)), self.ISO)
+
+	def shift_epoch(self, us):
+		us = self.shift(us)
+		return self.mark(us, self.ISO), self.mark(us, self.EPOCH)
+
+class Log_Payload(object):
+	#a log file parsed ahead of time into pre-serialized documents, so a scene trigger only has to rebase and send
+	#all documents live in one bytes blob, timestamps are kept as spans into it with their offset from the first timestamp
+	NO_TIME = -(1 << 63)
+
+	# log_file : string, logstash output to file using json plugin
+	# rebase : bool, record timestamps so they can be rebased; False keeps the documents exactly as they are (no_update)
+	# fields, sample : timestamp fields, see Timestamp_Rebaser
+	def __init__(self, log_file, rebase=True, fields=None, sample=1000):
+		self.log_file = log_file
+		self.rebase = rebase
+		self.fields = fields
+		self.sample = sample
+		self.blob = bytearray()
+		self.ends = array('Q')			#end of each document in the blob
+		self.span_ends = array('Q')		#number of spans up to the end of each document
+		self.span_start = array('Q')	#start of each span in the blob
+		self.span_len = array('I')
+		self.span_kind = array('b')
+		self.span_offset = array('q')	#microseconds from the first timestamp of the file
+		self.times = array('q')			#offset of the primary time of each document from the first one in the file (see Log_Index.primary_time), NO_TIME if it does not have one
+		self.formatter = Timestamp_Rebaser(0)
+
+	def __len__(self):
+		return len(self.ends)
+
+	# event : threading.Event, stops the build when set
+	def build(self, event=None):
+		recorder = Timestamp_Recorder(self.fields, self.sample) if self.rebase else None
+		first = None
+		with open_log(self.log_file) as fileobj:
+			for log in stream_json(fileobj, event):
+				#documents are scheduled by their own time whatever the time option, as trickle_indexed does
+				curr_time = Log_Index.primary_time(log)
+				if curr_time == None:
+					self.times.append(self.NO_TIME)
+				else:
+					if first == None:
+						first = curr_time
+					self.times.append(curr_time - first)
+
+				if recorder is None:
+					self.blob += (json.dumps(log) + "\n").encode()
+					self.ends.append(len(self.blob))
+					self.span_ends.append(0)
+					continue
+
+				recorder.marks = []
+				recorder.rebase(log)
+				#json.dumps escapes everything to ascii, so string positions are byte positions
+				text = json.dumps(log)
+				doc_start = len(self.blob)
+				for match in recorder.marker_pattern.finditer(text):
+					offset, kind = recorder.marks[int(match.group(1))]
+					self.span_start.append(doc_start + match.start())
+					self.span_len.append(match.end() - match.start())
+					self.span_kind.append(kind)
+					self.span_offset.append(offset)
+				self.blob += (text + "\n").encode()
+				self.ends.append(len(self.blob))
+				self.span_ends.append(len(self.span_start))
+		return self
+
+	#microsecond offsets of each document for scheduling, None where there is no usable time
+	def doc_times(self):
+		return [None if t == self.NO_TIME else t for t in self.times]
+
+	#serialized document k with its timestamps moved so the first timestamp of the file lands on origin_us
+	def doc(self, k, origin_us=None):
+		start = self.ends[k - 1] if k > 0 else 0
+		first_span = self.span_ends[k - 1] if k > 0 else 0
+		last_span = self.span_ends[k]
+		if first_span == last_span:
+			return bytes(self.blob[start:self.ends[k]])
+		pieces = []
+		pos = start
+		for n in range(first_span, last_span):
+			us = origin_us + self.span_offset[n]
+			pieces.append(self.blob[pos:self.span_start[n]])
+			if self.span_kind[n] == Timestamp_Recorder.ISO:
+				pieces.append(('"' + self.formatter.format_iso(us) + '"').encode())
+			else:
+				pieces.append(('"' + Timestamp_Rebaser.format_epoch(us) + '"').encode())
+			pos = self.span_start[n] + self.span_len[n]
+		pieces.append(self.blob[pos:self.ends[k]])
+		return b''.join(pieces)
+
+	def docs(self, origin_us=None):
+		for k in range(len(self.ends)):
+			yield self.doc(k, origin_us)
+
+	#microseconds from the first timestamp of the file to the first timestamp of document k, None if it has none
+	def first_offset(self, k):
+		first_span = self.span_ends[k - 1] if k > 0 else 0
+		if first_span == self.span_ends[k]:
+			return None
+		return self.span_offset[first_span]
+
+class Log_Index(object):
+	#sidecar index of a plain log file: byte offset, length, and primary timestamp of every document, kept in arrays
+	#built once and saved in the cache directory, then reused until the log file changes
+	#lets a replay mmap the file and read only the documents it needs, in time order, from any point in time
+	NO_TIME = -(1 << 63)
+	magic = b'ECSIDX1\n'
+
+	# log_file : string, plain (uncompressed) log file
+	# cache_dir : string, where the index is saved
+	def __init__(self, log_file, cache_dir='./.ecs_cache'):
+		self.log_file = log_file
+		self.index_path = os.path.join(cache_dir, hashlib.sha1(os.path.abspath(log_file).encode()).hexdigest() + '.idx')
+		self.offsets = array('Q')
+		self.lengths = array('I')
+		self.times = array('q')
+
+	def __len__(self):
+		return len(self.offsets)
+
+	#only plain files can be memory mapped
+	@staticmethod
+	def supported(log_file):
+		archive, member = split_log_source(log_file)
+		return member == None and not log_file.lower().endswith(('.gz', '.bz2', '.xz')) and os.path.isfile(log_file)
+
+	#microseconds since epoch of the @timestamp of a log (or zeek ts), None if it does not have a usable one
+	@staticmethod
+	def primary_time(log):
+		if not isinstance(log, dict):
+			return None
+		stamp = log.get("@timestamp")
+		if isinstance(stamp, str):
+			if Timestamp_Rebaser.iso_pattern.fullmatch(stamp):
+				return Timestamp_Rebaser.parse_iso(stamp)
+			try:
+				stamp = datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+			except ValueError:
+				return None
+			return calendar.timegm(stamp.timetuple()) * 1000000 + stamp.microsecond
+		if isinstance(log.get("ts"), float):
+			return round(log["ts"] * 1000000)
+		return None
+
+	def source_stamp(self):
+		info = os.stat(self.log_file)
+		return {'size':info.st_size, 'mtime':info.st_mtime_ns}
+
+	def load(self):
+		try:
+			with open(self.index_path, 'rb') as f:
+				if f.readline() != self.magic:
+					return False
+				header = json.loads(f.readline())
+				if header.get('source') != self.source_stamp():
+					return False
+				count = header['count']
+				self.offsets.fromfile(f, count)
+				self.lengths.fromfile(f, count)
+				self.times.fromfile(f, count)
+			return True
+		except (OSError, ValueError, EOFError, KeyError):
+			self.offsets = array('Q')
+			self.lengths = array('I')
+			self.times = array('q')
+			return False
+
+	#written to a temp file of its own and moved into place, so indexing the same file twice at once can not mix the two
+	def save(self):
+		os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.index_path) + '.', suffix='.tmp', dir=os.path.dirname(self.index_path))
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(self.magic)
+				f.write((json.dumps({'source':self.source_stamp(), 'count':len(self.offsets)}) + '\n').encode())
+				self.offsets.tofile(f)
+				self.lengths.tofile(f)
+				self.times.tofile(f)
+			os.replace(tmp_path, self.index_path)
+		except BaseException:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			raise
+
+	#same decoding as stream_json, but on bytes so the byte position of every document is known
+	# event : threading.Event, stops the build when set; returns False if it was stopped
+	# max_doc : int, see stream_json
+	def build(self, event=None, read_chunk=1 << 20, max_doc=64 << 20):
+		decoder = json.JSONDecoder()
+		utf8 = codecs.getincrementaldecoder('utf-8')()
+		whitespace = re.compile(r'[ \t\n\r]*')
+		buf = ''
+		pos = 0
+		#byte offset of buf[mark], advanced as documents are passed so each character is only encoded once
+		mark = 0
+		mark_byte = 0
+		eof = False
+		with open(self.log_file, 'rb') as f:
+			while True:
+				if event != None and event.is_set():
+					return False
+				pos = whitespace.match(buf, pos).end()
+				if pos == len(buf) and eof:
+					break
+				try:
+					curr_log, end = decoder.raw_decode(buf, pos)
+					if end == len(buf) and not eof:
+						raise json.JSONDecodeError("Document may continue in next chunk", buf, end)
+				except json.JSONDecodeError:
+					if eof:
+						raise
+					if len(buf) - pos > max_doc:
+						raise json.JSONDecodeError("No document ends within {} characters".format(max_doc), buf, pos)
+					data = f.read(max(read_chunk, len(buf) - pos))
+					eof = (data == b'')
+					mark_byte += len(buf[mark:pos].encode('utf-8'))
+					buf = buf[pos:] + utf8.decode(data, final=eof)
+					pos = 0
+					mark = 0
+					continue
+				start_byte = mark_byte + len(buf[mark:pos].encode('utf-8'))
+				end_byte = start_byte + len(buf[pos:end].encode('utf-8'))
+				mark = end
+				mark_byte = end_byte
+				pos = end
+				if curr_log == "":
+					continue
+				curr_time = self.primary_time(curr_log)
+				self.offsets.append(start_byte)
+				self.lengths.append(end_byte - start_byte)
+				self.times.append(self.NO_TIME if curr_time == None else curr_time)
+		return True
+
+	#load the saved index, or build and save it if it is missing or out of date
+	def load_or_build(self, event=None):
+		if self.load():
+			return self
+		if not self.build(event):
+			return None
+		try:
+			self.save()
+		except OSError:
+			pass
+		return self
+
+	def doc_times(self):
+		return [None if t == self.NO_TIME else t for t in self.times]
+
+class ELK_Registry(object):
+	#process wide cache of parsed log .conf files and one pooled keep-alive session per elastic target
+	#every Log_Controller of every scene goes through here so triggering a scene does not re-read configs or redo TLS handshakes
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.configs = {}
+		self.sessions = {}
+
+	#parsed config for a .conf file, re-read only when the file changes
+	# conf_file : string, filename of .conf file
+	def config(self, conf_file):
+		path = os.path.abspath(conf_file)
+		try:
+			mtime = os.stat(path).st_mtime_ns
+		except OSError:
+			mtime = None
+		with self.lock:
+			cached = self.configs.get(path)
+			if cached != None and cached[0] == mtime:
+				return cached[1]
+		config = configparser.ConfigParser()
+		config.read(path)
+		with self.lock:
+			self.configs[path] = (mtime, config)
+		return config
+
+	#shared session for an elastic target, the connection pool grows to the largest pool_size asked for
+	# base_url : string, protocol, ip, and port of elastic
+	def session(self, base_url, username, password, pool_size=4):
+		key = (base_url, username, password)
+		with self.lock:
+			cached = self.sessions.get(key)
+			if cached != None and cached[0] >= pool_size:
+				return cached[1]
+			if cached != None:
+				session = cached[1]
+			else:
+				urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+				session = requests.Session()
+				session.auth = (username, password)
+				session.verify = False
+				session.headers.update({'Content-Type': 'application/json'})
+			adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+			session.mount('http://', adapter)
+			session.mount('https://', adapter)
+			self.sessions[key] = (pool_size, session)
+			return session
+
+	def close(self):
+		with self.lock:
+			for pool_size, session in self.sessions.values():
+				session.close()
+			self.sessions = {}
+			self.configs = {}
+
+ELK_Connections = ELK_Registry()
+
+class SSH_Registry(object):
+	#process wide pool of keep-alive SSH connections, one per (agent_ip, username)
+	#every Effects_Agent opens its command channels and scp uploads on the pooled transport instead of doing a handshake for each
+	#connections nothing is using are closed once they sit idle for idle_timeout, or least recently used first once the pool holds more than max_clients,
+	#so the pool does not keep a transport thread per agent for the whole session
+	#connections opened for a prefetch are marked until an effect uses them, so the prefetcher can drop the ones it warmed for nothing
+	# keepalive : int, seconds between keepalive packets so idle connections are not dropped by the agent or firewalls
+	# compress : bool, zlib compress the connections, effect files are often pcaps and logs that shrink a lot
+	# max_clients : int, idle connections are closed to keep the pool at this many
+	# idle_timeout : float, seconds a connection can go unused before it is closed
+	def __init__(self, keepalive=30, compress=True, max_clients=64, idle_timeout=900):
+		self.lock = threading.Lock()
+		self.keepalive = keepalive
+		self.compress = compress
+		self.max_clients = max_clients
+		self.idle_timeout = idle_timeout
+		self.clients = {}		#(agent_ip, username) -> connected SSHClient
+		self.connecting = {}	#(agent_ip, username) -> Lock, so threads asking for the same agent at once share one handshake
+		self.used = {}			#(agent_ip, username) -> time.monotonic() it was last handed out or let go
+		self.holds = {}			#(agent_ip, username) -> uploads using it right now, see hold
+		self.channels = {}		#(agent_ip, username) -> channels opened by session, it is in use while any are open
+		self.prefetched = set()	#(agent_ip, username) connected for a prefetch and not used by an effect since
+
+	@staticmethod
+	def alive(ssh):
+		return ssh != None and ssh.get_transport() != None and ssh.get_transport().is_active()
+
+	#check for a live pooled connection without making one
+	def connected(self, agent_ip, username):
+		with self.lock:
+			return self.alive(self.clients.get((agent_ip, username)))
+
+	def __len__(self):
+		with self.lock:
+			return len(self.clients)
+
+	#live connection to an agent, connecting if there is none yet or the last one dropped
+	#the connection belongs to the pool, callers close their channels but never the connection
+	# prefetch : bool, asked for by the prefetcher; a connection it opens stays marked as prefetched until anything else asks for it
+	def client(self, agent_ip, username, password, timeout=2, prefetch=False):
+		key = (agent_ip, username)
+		with self.lock:
+			connect_lock = self.connecting.setdefault(key, threading.Lock())
+		with connect_lock:
+			with self.lock:
+				ssh = self.clients.get(key)
+			if not self.alive(ssh):
+				if ssh != None:
+					ssh.close()
+				ssh = paramiko.SSHClient()
+				ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+				ssh.connect(agent_ip, username=username, password=password, timeout=timeout, compress=self.compress)
+				ssh.get_transport().set_keepalive(self.keepalive)
+				with self.lock:
+					self.clients[key] = ssh
+					if prefetch:
+						self.prefetched.add(key)
+			with self.lock:
+				self.used[key] = time.monotonic()
+				if not prefetch:
+					self.prefetched.discard(key)
+		self.reap(key)
+		return ssh
+
+	#connection that is not closed as idle until the with block ends, for uploads
+	@contextlib.contextmanager
+	def hold(self, agent_ip, username, password, prefetch=False):
+		key = (agent_ip, username)
+		ssh = self.client(agent_ip, username, password, prefetch=prefetch)
+		with self.lock:
+			self.holds[key] = self.holds.get(key, 0) + 1
+		try:
+			yield ssh
+		finally:
+			with self.lock:
+				self.holds[key] -= 1
+				self.used[key] = time.monotonic()
+
+	#close connections that have been idle too long, then the least recently used idle ones while there are more than max_clients
+	# keep : (agent_ip, username) just handed out, never closed here
+	def reap(self, keep=None):
+		now = time.monotonic()
+		closing = []
+		with self.lock:
+			idle = []
+			for key in self.clients:
+				self.channels[key] = [channel for channel in self.channels.get(key, []) if not channel.closed]
+				if key != keep and len(self.channels[key]) == 0 and self.holds.get(key, 0) == 0:
+					idle.append(key)
+			idle.sort(key=lambda key: self.used.get(key, 0))
+			extra = len(self.clients) - self.max_clients
+			for key in idle:
+				if now - self.used.get(key, 0) >= self.idle_timeout or extra > 0:
+					closing.append(self.forget(key))
+					extra -= 1
+		for ssh in closing:
+			ssh.close()
+
+	#take a connection out of the pool, call with the lock held, returns the client to close
+	def forget(self, key):
+		self.used.pop(key, None)
+		self.holds.pop(key, None)
+		self.channels.pop(key, None)
+		self.prefetched.discard(key)
+		return self.clients.pop(key, None)
+
+	#new channel on the pooled transport, reconnecting once if the transport died since it was last checked
+	def session(self, agent_ip, username, password, timeout=2, prefetch=False):
+		try:
+			channel = self.client(agent_ip, username, password, timeout, prefetch).get_transport().open_session()
+		except paramiko.SSHException:
+			self.drop(agent_ip, username)
+			channel = self.client(agent_ip, username, password, timeout, prefetch).get_transport().open_session()
+		with self.lock:
+			if (agent_ip, username) in self.clients:
+				self.channels.setdefault((agent_ip, username), []).append(channel)
+		return channel
+
+	#run a short command on an agent and return its output, for housekeeping rather than effects
+	def run(self, agent_ip, username, password, command, timeout=10, prefetch=False):
+		channel = self.session(agent_ip, username, password, prefetch=prefetch)
+		try:
+			channel.settimeout(timeout)
+			channel.exec_command(command)
+			return channel.makefile('rb').read().decode('utf-8', 'replace')
+		finally:
+			channel.close()
+
+	#whether the connection to an agent was opened for a prefetch and no effect has used it since
+	def unclaimed(self, agent_ip, username):
+		with self.lock:
+			return (agent_ip, username) in self.prefetched
+
+	#close the connection to an agent
+	# prefetched : bool, only if it was opened for a prefetch and no effect has used it since
+	def drop(self, agent_ip, username, prefetched=False):
+		with self.lock:
+			if prefetched and not (agent_ip, username) in self.prefetched:
+				return
+			ssh = self.forget((agent_ip, username))
+		if ssh != None:
+			ssh.close()
+
+	def close(self):
+		with self.lock:
+			clients = [self.forget(key) for key in list(self.clients)]
+		for ssh in clients:
+			ssh.close()
+
+SSH_Connections = SSH_Registry()
+
+class Effect_Stager(object):
+	#content addressed upload of effect_files: local files are hashed once, the agent is asked for the hashes of the copies it has
+	#and only files that are missing or differ are sent over the pooled connection
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.hashes = {}	#absolute path -> (mtime, size, sha256), rehashed only when the file changes
+
+	#sha256 of a local file
+	def local_hash(self, file):
+		path = os.path.abspath(file)
+		info = os.stat(path)
+		stamp = (info.st_mtime_ns, info.st_size)
+		with self.lock:
+			cached = self.hashes.get(path)
+		if cached != None and cached[:2] == stamp:
+			return cached[2]
+		sha = hashlib.sha256()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(1 << 20), b''):
+				sha.update(block)
+		with self.lock:
+			self.hashes[path] = stamp + (sha.hexdigest(),)
+		return sha.hexdigest()
+
+	#remote path for the shell, keeping ~ unquoted so it still points at the agent user's home
+	@staticmethod
+	def shell_path(path):
+		if path == '~' or path.startswith('~/'):
+			return '"$HOME"' + shlex.quote(path[1:])
+		return shlex.quote(path)
+
+	#sha256 of the copy of each file on the agent, None where there is none (or no sha256sum)
+	#dest follows scp: a directory gets the file under its own name, anything else is the file itself
+	def remote_hashes(self, agent_ip, username, password, files, prefetch=False):
+		script = []
+		for n, (file, dest) in enumerate(files):
+			script.append('p={}; [ -d "$p" ] && p="$p"/{}; h=$(sha256sum "$p" 2>/dev/null) && echo {} "${{h%% *}}"'.format(
+				self.shell_path(dest), shlex.quote(os.path.basename(file)), n))
+		hashes = [None] * len(files)
+		for line in SSH_Connections.run(agent_ip, username, password, '; '.join(script), prefetch=prefetch).splitlines():
+			n, sep, digest = line.strip().partition(' ')
+			if sep and n.isdigit() and int(n) < len(files):
+				hashes[int(n)] = digest
+		return hashes
+
+	#make sure an agent has each (file, dest), returns (file, dest, result) with result "unchanged", "uploaded", or the exception
+	#raises if the agent cannot be reached
+	# event : threading.Event, stops before the next upload when set
+	# prefetch : bool, staged ahead of time by the prefetcher, see SSH_Registry.client
+	def stage(self, agent_ip, username, password, files, event=None, prefetch=False):
+		from scp import SCPClient
+
+		files = [(f, d) for f, d in files if not (f == None or f == 'None')]
+		if len(files) == 0:
+			return []
+		with SSH_Connections.hold(agent_ip, username, password, prefetch) as ssh:
+			try:
+				remote = self.remote_hashes(agent_ip, username, password, files, prefetch)
+			except Exception:
+				remote = [None] * len(files)
+
+			results = []
+			scp = None
+			for (file, dest), remote_hash in zip(files, remote):
+				if event != None and event.is_set():
+					break
+				try:
+					if remote_hash != None and remote_hash == self.local_hash(file):
+						results.append((file, dest, "unchanged"))
+						continue
+					if scp == None:
+						scp = SCPClient(ssh.get_transport())
+					scp.put(file, remote_path=dest)
+					results.append((file, dest, "uploaded"))
+				except Exception as e:
+					results.append((file, dest, e))
+			if scp != None:
+				scp.close()
+		return results
+
+Effect_Files = Effect_Stager()
+
+class Job_Registry(object):
+	#every running effect and log in the session, and a bounded thread pool per kind of job to run them on
+	#a job is a worker (Effects_Agent, Log_Controller) and the futures it runs as; when the last of them completes the job takes itself off the live list
+	#workers can show how far along they are with Progress(), and set failed / paused, which shows in Status
+	#calls that last as long as the scenario, like logs trickled out in real time, get a thread each so they do not hold the pool's threads for good
+	# limits : dict, kind of job -> most threads running jobs of that kind, the rest queue; set before the first job of the kind runs
+	# history : int, finished jobs kept for Status
+	def __init__(self, limits=None, history=50):
+		self.lock = threading.Lock()
+		self.limits = {'EFX':64, 'LOG':32, 'CLEAR':4}
+		if limits != None:
+			self.limits.update(limits)
+		self.pools = {}
+		self.busy = {}			#kind -> calls submitted to its pool that have not completed
+		self.jobs = []
+		self.ended = collections.deque(maxlen=history)
+
+	#pool for a kind of job, made the first time it is needed
+	def pool(self, kind):
+		with self.lock:
+			if not kind in self.pools:
+				self.pools[kind] = concurrent.futures.ThreadPoolExecutor(max_workers=self.limits.get(kind, 16), thread_name_prefix='ECS-' + kind)
+			return self.pools[kind]
+
+	# kind : string, EFX, LOG or CLEAR
+	# ID : string, effect/log ID the job is shown as, the indexes for CLEAR
+	# worker : object the job is, Stop() is called on it to end the job
+	# calls : list of (function, args), each run on the pool of the kind
+	# report : function taking a message, told when some of the calls have to queue for a thread
+	# pooled : bool, False to give each call a thread of its own instead, for calls that run for the whole scenario
+	# returns the futures of the calls
+	def run(self, kind, ID, worker, calls, report=None, pooled=True):
+		if not pooled:
+			return self.track(kind, ID, worker, [self.thread(kind, function, args) for function, args in calls])
+		pool = self.pool(kind)
+		with self.lock:
+			self.busy[kind] = self.busy.get(kind, 0) + len(calls)
+			queued = min(self.busy[kind] - self.limits.get(kind, 16), len(calls))
+		futures = [pool.submit(function, *args) for function, args in calls]
+		for future in futures:
+			future.add_done_callback(lambda future: self.release(kind))
+		if queued > 0 and report != None:
+			report('[!] {} {}: {} of {} threads queued, all {} {} threads are busy'.format(kind, ID, queued, len(calls), self.limits.get(kind, 16), kind))
+		return self.track(kind, ID, worker, futures)
+
+	def release(self, kind):
+		with self.lock:
+			self.busy[kind] -= 1
+
+	#run a call on a thread of its own, as a future like the pool's
+	def thread(self, kind, function, args):
+		future = concurrent.futures.Future()
+		def run():
+			if not future.set_running_or_notify_cancel():
+				return
+			try:
+				future.set_result(function(*args))
+			except BaseException as e:
+				future.set_exception(e)
+		threading.Thread(target=run, name='ECS-' + kind, daemon=True).start()
+		return future
+
+	#add a job that runs as futures made elsewhere, e.g. on Effects_Loop
+	def track(self, kind, ID, worker, futures):
+		job = {'kind':kind, 'ID':ID, 'worker':worker, 'futures':futures, 'pending':len(futures), 'start':time.monotonic(), 'end':None, 'error':None, 'stopped':False}
+		with self.lock:
+			self.jobs.append(job)
+		for future in futures:
+			future.add_done_callback(lambda future, job=job: self.completed(job, future))
+		return futures
+
+	#called as each future of a job completes, on the thread that completed it
+	def completed(self, job, future):
+		if not future.cancelled() and future.exception() != None:
+			job['error'] = future.exception()
+		with self.lock:
+			job['pending'] -= 1
+			if job['pending'] > 0:
+				return
+			job['end'] = time.monotonic()
+			if job in self.jobs:
+				self.jobs.remove(job)
+			self.ended.append(job)
+
+	#live jobs, oldest first
+	# kind : string, only jobs of this kind, None for all
+	def live(self, kind=None):
+		with self.lock:
+			return [job for job in self.jobs if kind == None or job['kind'] == kind]
+
+	#stop a job, the worker's Stop drops its calls that are still queued
+	def stop(self, job):
+		job['stopped'] = True
+		job['worker'].Stop()
+
+	def stop_all(self):
+		for job in self.live():
+			self.stop(job)
+
+	#stop taking jobs and let the pool threads go, call after stop_all
+	def shutdown(self):
+		with self.lock:
+			pools = list(self.pools.values())
+			self.pools = {}
+		for pool in pools:
+			pool.shutdown(wait=False, cancel_futures=True)
+
+	def state(self, job):
+		worker = job['worker']
+		if job['end'] == None:
+			if not any(future.running() or future.done() for future in job['futures']):
+				return "queued"
+			return "paused" if getattr(worker, 'paused', False) else "running"
+		if job['error'] != None or getattr(worker, 'failed', False):
+			return "failed"
+		return "stopped" if job['stopped'] else "done"
+
+	#one line per job, live jobs then the ones that finished most recently
+	def Status(self):
+		with self.lock:
+			jobs = list(self.jobs) + list(reversed(self.ended))
+		lines = []
+		for job in jobs:
+			duration = (job['end'] if job['end'] != None else time.monotonic()) - job['start']
+			progress = job['worker'].Progress() if hasattr(job['worker'], 'Progress') else ''
+			error = ' ({})'.format(job['error']) if job['error'] != None else ''
+			lines.append("{} {}: {} {:.1f}s {}{}".format(job['kind'], job['ID'], self.state(job), duration, progress, error).rstrip())
+		return lines
+
+Jobs = Job_Registry()
+
 class Log_Controller(object):
 
 
@@ -124,12 +1459,27 @@ class Log_Controller(object):
 		self.Error_message_queue = error_queue
 		self.Index_queue = index_queue
 		self.Event = threading.Event()
-		self.thread = None
+		self.futures = []		#what the thread runs as on Jobs
+		self.failed = False
+		self.docs_sent = 0
+		self.bytes_sent = 0
 		self.Scenario = Scenario
 		self.Log_ID = Log_ID
+		self.read_chunk = 1 << 20
+		#pause / seek requests from the CLI and the checkpoint of the replay, see Pause, Resume and Seek
+		self.Control = threading.Condition()
+		self.paused = False
+		self.seek_to = None
+		self.cursor = {'next':0, 'total':None, 'position':None}
+		self.session = None
 		self.conf_file = Scenario.Logs[Log_ID]['config_file'][0]
 		self.log_file = Scenario.Logs[Log_ID]['log_file'][0]
-		self.setup(self.conf_file)
+		#a log with a bad or missing config has been reported by setup and is not run
+		if self.setup(self.conf_file) == -1:
+			self.failed = True
+			self.Event.set()
+		if self.Event.is_set():
+			return
 		if Scenario.Logs[Log_ID]['log_index'][0] != "None" and Scenario.Logs[Log_ID]['log_index'][0] != None:
 			self.index = Scenario.Logs[Log_ID]['log_index'][0]
 		self.Index_queue.put(self.index)
@@ -152,8 +1502,7 @@ class Log_Controller(object):
 		if conf_file != "None" and conf_file != None:
 			#self.notify('Setting up log controller object with config: ' + conf_file + ' . . .')
 
-			config = configparser.ConfigParser()
-			config.read(conf_file)
+			config = ELK_Connections.config(conf_file)
 
 			if('ELK' not in config):
 				self.error("Bad config provided.")
@@ -180,6 +1529,21 @@ class Log_Controller(object):
 			self.username = config['ELK']['username']
 			self.password = config['ELK']['password']
 
+			#optional settings
+			try:
+				self.timestamp_fields = config['ELK'].get('timestamp_fields', 'auto')
+				self.timestamp_sample = config['ELK'].getint('timestamp_sample', 1000)
+				self.bulk_docs = config['ELK'].getint('bulk_docs', 5000)
+				self.bulk_bytes = config['ELK'].getint('bulk_bytes', 10485760)
+				self.bulk_retries = config['ELK'].getint('bulk_retries', 2)
+				self.timeout = config['ELK'].getfloat('timeout', 30.0)
+				self.workers = max(1, config['ELK'].getint('workers', 1))
+				self.trickle_tick = config['ELK'].getfloat('trickle_tick', 0.1)
+				self.replay_start = config['ELK'].getfloat('replay_start', 0.0)
+			except ValueError as e:
+				self.error("Bad config provided. " + str(e))
+				return -1
+
 			#self.notify("Log Controller created with options:\n\tIP: " + self.ip + ":" + str(self.port) + "\n\tSSL: " + str(self.security) + "\n\tTimestamps: " + self.time_option + "\n\tIndex: " + self.index + "\n\tAuthentication: " + self.username + ":" + self.password)
 		else:
 			self.Error_message_queue.put("Missing config file for {}. Log is disabled.".format(self.Log_ID))
@@ -198,186 +1562,323 @@ class Log_Controller(object):
 
 	# MAIN PROGRAM FUNCTIONS
 
+	#decode json documents out of a log file one at a time, see stream_json
+	# fileobj : open text file, logstash output to file using json plugin
+	def stream_logs(self, fileobj):
+		return stream_json(fileobj, self.Event, self.read_chunk)
+
 	#parse json log file into array of strings for manipulation later
-	#this is needed because logstash sometimes (always) does not use newlines between logs in a sensible manner
 	# my_file : string, logstash output to file using json plugin
 	def parse_logs(self, my_file):
 		try:
-			decoder = json.JSONDecoder()
-			fileobj = open(my_file, 'r')
-
-			all_logs = []
-			contents = fileobj.readlines()
-			for line in contents:
-				if self.Event.is_set():
-					break
-
-				line=line.strip()
-				pos = 0
-				while not pos == len(line):
-					curr_log, length = decoder.raw_decode(line[pos:])
-					all_logs.append(curr_log)
-					pos += length
-
-				#edge case where an empty string ends up in there
-				while("" in all_logs):
-					all_logs.remove("")
-
-			return all_logs
+			with open_log(my_file) as fileobj:
+				return list(self.stream_logs(fileobj))
 		except Exception as e:
 			self.error( "Error parsing " + my_file + "\n" + str(e) )
 			return ("failed.")
 
 
-	#sample timestamp: 2022-12-09T19:14:25.412Z
-	#KEY ASSUMPTION = LOGS ARE INGESTED IN ORDER BY TIMESTAMP
-	#format (supported) time fields according to input
-	# logs : array of strings, output from parse_logs]
+	#new start time of the logs in microseconds since epoch, None means leave timestamps alone and -1 is a bad option
 	# time_option : string in {no_update, now, <timestamp>} ; no option provided uses provided .conf
-	def update_timestamps(self, logs, time_option="default"):
-
-		datetime_format = "%Y-%m-%dT%H:%M:%S.%fZ"
-		earliest_timestamp = ""
-		earliest_datetime = None
-
+	def origin_time(self, time_option="default"):
 		if time_option == "default":
 			time_option = self.time_option
 
 		if time_option == 'no_update':
-			return logs
+			return None
 		elif time_option == 'now':
-			origin_datetime = datetime.utcnow()
-		elif re.match(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}.\d{3}Z', time_option):
-			origin_datetime = datetime.strptime(time_option, datetime_format)
+			return time.time_ns() // 1000
+		elif Timestamp_Rebaser.iso_pattern.fullmatch(time_option):
+			return Timestamp_Rebaser.parse_iso(time_option)
 		else:
 			self.error("Time option <" + time_option + "> not supported. See help for more details. Exiting . . .")
 			return(-1)
 
+	#configured timestamp fields as a list, None to auto detect
+	def timestamp_field_list(self):
+		if self.timestamp_fields == 'auto':
+			return None
+		return [x.strip() for x in self.timestamp_fields.split(',') if x.strip() != '']
+
+	#build a rebaser for the time option, None means leave timestamps alone and -1 is a bad option
+	def make_rebaser(self, time_option="default"):
+		origin_us = self.origin_time(time_option)
+		if origin_us is None or origin_us == -1:
+			return origin_us
+		return Timestamp_Rebaser(origin_us, self.timestamp_field_list(), self.timestamp_sample)
+
+	#sample timestamp: 2022-12-09T19:14:25.412Z
+	#KEY ASSUMPTION = LOGS ARE INGESTED IN ORDER BY TIMESTAMP
+	#format (supported) time fields according to input, see Timestamp_Rebaser
+	# logs : array of strings, output from parse_logs]
+	# time_option : string in {no_update, now, <timestamp>} ; no option provided uses provided .conf
+	def update_timestamps(self, logs, time_option="default"):
+		rebaser = self.make_rebaser(time_option)
+		if rebaser is None:
+			return logs
+		elif rebaser == -1:
+			return(-1)
 
 		#self.notify("Updating timestamps using option: " + time_option)
 
 		new_logs = []
-		
 		for i in logs:
 			if self.Event.is_set():
 				break
-			#I vehemently oppose this, but couldn't think of a faster way
-			log_string = json.dumps(i)
-			#finding strings that match format coming out of logstash and update - this supports winlogbeat format and possibly others
-			result = re.finditer(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}.\d{3}Z', log_string)
-			for j in result:
-				if self.Event.is_set():
-					break
-				if earliest_timestamp == "":
-					earliest_timestamp = j.group(0)
-				earliest_datetime = datetime.strptime(earliest_timestamp, datetime_format)
-				current_datetime = datetime.strptime(j.group(0), datetime_format)
-				time_delta = current_datetime - earliest_datetime
-				new_datetime = origin_datetime + time_delta
-				new_timestamp = new_datetime.strftime(datetime_format)
-				new_timestamp = new_timestamp[:-4] + 'Z' #python is automatically printing microseconds, chop off 3 LSDs + the 'Z' (zulu) and re-add the Z
-				log_string = log_string.replace(j.group(0), new_timestamp)
-			#add @timestamp option in case of "ts" : "<epoch>" - this supports bro log format
-			if "ts" in i:
-				if isinstance(i["ts"], float):
-					if earliest_datetime == None:
-						earliest_datetime = datetime.fromtimestamp(i["ts"])
-						earliest_timestamp = earliest_datetime.strftime(datetime_format)
-					current_datetime = datetime.fromtimestamp(i["ts"])
-					time_delta = current_datetime - earliest_datetime
-					new_datetime = origin_datetime + time_delta
-					new_timestamp = new_datetime.strftime(datetime_format)
-					new_timestamp = new_timestamp[:-4] + 'Z' #python is automatically printing microseconds, chop off 3 LSDs + the 'Z' (zulu) and re-add the Z
-					i["@timestamp"] = new_timestamp
-					i["ts"] = new_datetime.strftime("%s.%f")
-					log_string = json.dumps(i)
-			if ( len(list(result)) > 0 ) and ("ts" in i):
-				self.error("Provided log file has attributes of Zeek log dump and winlogbeat log dump. Exiting to avoid arbitrary behavior. . .")
-				return -1
-			new_logs.append(json.loads(log_string))
+			new_logs.append(rebaser.rebase(i))
 		return new_logs
 	
-	#forwards logs to elastic instance according to .conf values (ip, port, authentication options, etc.) in one POST
-	#if delay is set, will forward on to trickle_logs instead
-	# logs : array of strings, output from parse_logs or update_timestamps
-	# index : string, no option provided uses provided .conf
-	def send_logs(self, logs, index="default"):
-		if(index == "default"):
-			index = self.index
+	#keep-alive session for talking to elastic, shared with every other Log_Controller using the same target
+	def get_session(self):
+		if self.session is None:
+			self.session = ELK_Connections.session(self.es_url(''), self.username, self.password, max(4, self.workers))
+		return self.session
 
-		urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-		
+	def es_url(self, path):
 		if(self.security):
 			prot = "https://"
 		else:
 			prot = "http://"
+		return prot + self.ip + ":" + str(self.port) + path
 
-		es_url = prot + self.ip + ":" + str(self.port) + "/_bulk/?pretty"
-
-		headers = {
-			'Content-Type': 'application/json',
-		}
-		
-		actions = []
+	#serialize logs into newline terminated documents for _bulk
+	def serialize(self, logs):
 		for i in logs:
-			actions.append("{\"index\": {\"_index\": \"" + index + "\"}}")
-			actions.append(json.dumps(i))
-		
-		body='\n'.join(actions)
+			yield (json.dumps(i) + "\n").encode()
+
+	#split serialized documents into _bulk bodies by document count and size
+	# docs : iterable of newline terminated documents, see serialize
+	# index : string, index every document is sent to
+	def bulk_batches(self, docs, index):
+		action = (json.dumps({"index": {"_index": index}}) + "\n").encode()
+		lines = []
+		count = 0
+		size = 0
+		for doc in docs:
+			if count > 0 and (count >= self.bulk_docs or size + len(action) + len(doc) > self.bulk_bytes):
+				yield b''.join(lines), count
+				lines = []
+				count = 0
+				size = 0
+			lines.append(action)
+			lines.append(doc)
+			count += 1
+			size += len(action) + len(doc)
+		if count > 0:
+			yield b''.join(lines), count
+
+	#POST one _bulk body, retrying when elastic is busy or the connection drops
+	#returns the response (None if it never got one) and the number of documents elastic rejected
+	def post_bulk(self, body):
+		session = self.get_session()
+		#only ask for the errors back, the full item list can be as big as the request
+		url = self.es_url("/_bulk?filter_path=errors,items.*.error")
+		response = None
+		for attempt in range(self.bulk_retries + 1):
+			if attempt > 0 and self.Event.wait(timeout=min(2 ** attempt, 10)):
+				break
+			try:
+				response = session.post(url, data=body, timeout=self.timeout)
+			except Exception as e:
+				self.error( str(e) )
+				response = None
+				continue
+			if response.status_code != 429 and response.status_code < 500:
+				break
 
-		#The bulk request must be terminated by a newline [\\n]
-		body += "\n"
+		rejected = 0
+		if response is not None and response.status_code == 200:
+			try:
+				result = response.json()
+				if result.get('errors'):
+					items = result.get('items') or []
+					rejected = len(items)
+					if rejected == 0:
+						#filter_path can leave no items behind, elastic still says something went wrong
+						self.error("elastic reported errors in a batch but did not say which documents")
+					else:
+						first = next(iter(items[0].values()), {})
+						self.error("{} documents rejected by elastic, first error: {}".format(rejected, json.dumps(first.get('error') if isinstance(first, dict) else first)))
+			except (ValueError, AttributeError):
+				pass
+		return response, rejected
+
+	#send one batch and add it to the running totals of the send_logs call, safe to call from the bulk workers
+	def send_batch(self, stats, body, count, index, progress):
+		response, rejected = self.post_bulk(body)
+		with stats['lock']:
+			stats['batches'] += 1
+			if response is None or response.status_code != 200:
+				self.failed = True
+				stats['failed'] += count
+				self.error("{}: batch {} of {} documents failed: {}".format(self.Log_ID, stats['batches'], count, str(response)))
+				if response is None:
+					stats['result'] = "failed."
+				elif stats['result'] != "failed.":
+					stats['result'] = str(response)
+				return
+			stats['sent'] += count - rejected
+			stats['sent_bytes'] += len(body)
+			stats['failed'] += rejected
+			self.docs_sent += count - rejected
+			self.bytes_sent += len(body)
+			if stats['result'] == "no logs.":
+				stats['result'] = str(response)
+			if progress:
+				self.notify("{}: batch {} indexed {} documents ({:.1f} MB) into {}, {} sent".format(self.Log_ID, stats['batches'], count - rejected, len(body) / 1048576, index, stats['sent']))
+
+	#pulls batches off the queue until it gets None, batches are dropped without sending once the thread is killed
+	def bulk_worker(self, batch_queue, stats, index, progress):
+		while True:
+			batch = batch_queue.get()
+			if batch is None:
+				return
+			if not self.Event.is_set():
+				self.send_batch(stats, batch[0], batch[1], index, progress)
+				#the cursor counts what elastic has answered for, not what is waiting in the queue
+				with stats['lock']:
+					self.cursor['next'] += batch[1]
+
+	#forwards logs to elastic instance according to .conf values (ip, port, authentication options, etc.) in _bulk POSTs, see send_docs
+	#if delay is set, will forward on to trickle_logs instead
+	# logs : iterable of logs, output from parse_logs, update_timestamps or stream_logs
+	# index : string, no option provided uses provided .conf
+	# progress : bool, report each batch to the log message queue
+	def send_logs(self, logs, index="default", progress=True):
+		return self.send_docs(self.serialize(logs), index, progress)
+
+	#forwards serialized documents to elastic in _bulk POSTs
+	#batches are split by bulk_docs and bulk_bytes so big files do not time out or hit http.max_content_length
+	#with workers > 1 that many batches are in flight at once, the queue to them is bounded so a fast parser waits on elastic instead of filling memory
+	# docs : iterable of newline terminated documents, from serialize or a staged Log_Payload
+	# index : string, no option provided uses provided .conf
+	# progress : bool, report each batch to the log message queue
+	def send_docs(self, docs, index="default", progress=True):
+		if(index == "default"):
+			index = self.index
 
-		#print(body)
-		#return("stdout")
-		try:
-			response = requests.post(es_url, headers=headers, data=body, auth=(self.username, self.password), verify=False, timeout=5.0)
-			return str(response)
-		except Exception as e:
-			self.error( str(e) )
-			return ("failed.")
+		stats = {'lock':threading.Lock(), 'result':"no logs.", 'batches':0, 'sent':0, 'sent_bytes':0, 'failed':0}
+		self.cursor = {'next':0, 'total':None, 'position':None}
+		if self.workers > 1:
+			batch_queue = queue.Queue(maxsize=self.workers * 2)
+			workers = [threading.Thread(target=self.bulk_worker, args=[batch_queue, stats, index, progress], daemon=True) for i in range(self.workers)]
+			for worker in workers:
+				worker.start()
+			try:
+				for batch in self.bulk_batches(docs, index):
+					if self.paused and self.pause_point():
+						break
+					#wait for room in the queue, but give up if the thread is killed
+					while not self.Event.is_set():
+						try:
+							batch_queue.put(batch, timeout=0.5)
+							break
+						except queue.Full:
+							pass
+					if self.Event.is_set():
+						break
+			finally:
+				for worker in workers:
+					batch_queue.put(None)
+				for worker in workers:
+					worker.join()
+		else:
+			for body, count in self.bulk_batches(docs, index):
+				if self.paused and self.pause_point():
+					break
+				if self.Event.is_set():
+					break
+				self.send_batch(stats, body, count, index, progress)
+				self.cursor['next'] += count
+
+		if progress and stats['batches'] > 1:
+			self.notify("{}: {} documents ({:.1f} MB) sent in {} batches, {} failed".format(self.Log_ID, stats['sent'], stats['sent_bytes'] / 1048576, stats['batches'], stats['failed']))
+		return stats['result']
 
-	#forwards logs to elastic instance according to .conf values (ip, port, authentication options, etc.) in separate POSTs, waits delta of timestamps between POSTs
+	#forwards logs to elastic instance according to .conf values (ip, port, authentication options, etc.) spaced out by the deltas of their timestamps
 	# logs : array of strings, output from parse_logs or update_timestamps
 	# index : string, no option provided uses provided .conf
-	def trickle_logs(self, logs, index="default"):
+	# rebaser : Timestamp_Rebaser, rebase each log as it is sent so the first one sent lands on the origin; None sends them as they are
+	def trickle_logs(self, logs, index="default", rebaser=None):
+		#self.notify("Trickling logs one by one according to timestamp.")
+		rebased = bytearray(len(logs)) if rebaser != None else None
+		def fetch(k):
+			#logs are rebased in place, only once even if a seek sends them again
+			if rebased != None and not rebased[k]:
+				rebaser.rebase(logs[k])
+				rebased[k] = 1
+			return (json.dumps(logs[k]) + "\n").encode()
+		return self.trickle_docs([Log_Index.primary_time(i) for i in logs], fetch, index)
+
+	#the schedule is anchored to the wall clock at the start, so time spent sending never adds up as drift
+	#every tick (trickle_tick seconds) all documents that have come due are sent together in one _bulk request
+	#documents without a usable @timestamp are sent with the first tick
+	#documents due before replay_start seconds are skipped without being fetched
+	#the replay can be paused, resumed and moved with Seek; self.cursor is the checkpoint of the next document to send
+	# times : list of microsecond timestamps for each document, or None
+	# fetch : function returning the serialized document for an index into times
+	# index : string, no option provided uses provided .conf
+	def trickle_docs(self, times, fetch, index="default"):
 		if(index == "default"):
 			index = self.index
 
-		#self.notify("Trickling logs one by one according to timestamp.")
-
-		datetime_format = "%Y-%m-%dT%H:%M:%S.%fZ"
-		latest_datetime = None
-
 		#get logs sorted by time
-		logs.sort(key=lambda x: x["@timestamp"])
-
-		#TODO:: if we want total fidelity we can take timestamps during the loop and then diff real time past with time delta in logs.... I assume this time is negligble for now.
-		num = 0
-		#print(num)
-		for i in logs:
-			if self.Event.is_set():
-				return("thread killed.")
-			num += 1
-			#body = "{\"index\": {\"_index\": \"" + index + "\"}}"
-			#body  + = "\n" + json.dumps(i) + "\n"
-			current_datetime = datetime.strptime(i["@timestamp"], datetime_format)
-			if (latest_datetime == None):
-				latest_datetime = current_datetime
-			delta = current_datetime - latest_datetime
-			#print("current: ", current_datetime)
-			#print("latest: ", latest_datetime)
-			#print("delta: ", delta.total_seconds() )
-			if(current_datetime > latest_datetime):
-				latest_datetime = current_datetime
-			self.Event.wait(timeout=delta.total_seconds())
-			logslist = [] #the list will only ever have one, but sendlogs wants a list, so we shall oblige
-			logslist.append(i)
-			response = self.send_logs(logslist, index)
-			#print('\033[F' + str(num) )
-			if(response != "<Response [200]>"):
-				self.error("Bad response log #: " + str(num))
-
+		known = [t for t in times if t is not None]
+		first = min(known) if known else 0
+		due = [(t - first) / 1000000 if t is not None else 0.0 for t in times]
+		order = sorted(range(len(times)), key=due.__getitem__)
+		#due times in send order, for bisecting to replay_start and seeks (bisect only takes a key from Python 3.10)
+		order_due = [due[k] for k in order]
+
+		stats = {'lock':threading.Lock(), 'result':"no logs.", 'batches':0, 'sent':0, 'sent_bytes':0, 'failed':0}
+		max_lag = 0.0
+		#start the clock replay_start seconds into the logs
+		num = bisect.bisect_left(order_due, self.replay_start)
+		if num > 0:
+			self.notify("{}: starting {:.0f}s in, skipping {} documents".format(self.Log_ID, self.replay_start, num))
+		self.cursor = {'next':num, 'total':len(order), 'position':self.replay_start}
+		start = time.monotonic() - self.replay_start
+		last_send = None
+		while num < len(order):
+			#hold while paused, then restart the clock at the checkpoint so the pause is not made up in a burst
+			if self.paused:
+				if self.pause_point():
+					return("thread killed.")
+				start = time.monotonic() - self.cursor['position']
+				last_send = None
+
+			target = self.take_seek()
+			if target != None:
+				num = bisect.bisect_left(order_due, target)
+				self.notify("{}: seeking to {:.1f}s, next document {}/{}".format(self.Log_ID, target, num, len(order)))
+				self.cursor.update(next=num, position=target)
+				start = time.monotonic() - target
+				last_send = None
+				continue
+
+			#wait for the next log to come due, but no sooner than a tick after the last send
+			wait = due[order[num]] - (time.monotonic() - start)
+			if last_send != None:
+				wait = max(wait, last_send + self.trickle_tick - time.monotonic())
+			if self.hold(max(wait, 0.0)):
+				if self.Event.is_set():
+					return("thread killed.")
+				self.cursor['position'] = min(time.monotonic() - start, due[order[num]])
+				continue
+
+			#grab everything that is due now
+			elapsed = time.monotonic() - start
+			end = num
+			while end < len(order) and due[order[end]] <= elapsed:
+				end += 1
+			max_lag = max(max_lag, elapsed - due[order[num]])
+			last_send = time.monotonic()
+			for body, count in self.bulk_batches([fetch(k) for k in order[num:end]], index):
+				self.send_batch(stats, body, count, index, False)
+			num = end
+			self.cursor.update(next=num, position=elapsed)
+
+		self.notify("{}: trickled {} documents in {} requests, {} failed, max lag {:.3f}s".format(self.Log_ID, stats['sent'], stats['batches'], stats['failed'], max_lag))
 		return ("done.")
 	
 	#deletes all contents of provided index
@@ -388,227 +1889,1067 @@ class Log_Controller(object):
 
 		self.notify("clearing index: " + index)
 
-		if(self.security):
-			prot = "https://"
-		else:
-			prot = "http://"
-
-		es_url = prot + self.ip + ":" + str(self.port) + "/" + index + "?pretty"
-
-		headers = {
-			'Content-Type': 'application/json',
-		}
-
-		response = requests.delete(es_url, headers=headers, data=None, auth=(self.username, self.password), verify=False, timeout=1.0)
+		response = self.get_session().delete(self.es_url("/" + index + "?pretty"), data=None, timeout=self.timeout)
 
 		return str(response)
 	
-	#creating a single function to perform all tasks to be easily called as a thread
-	def parse_update_and_send(self, log_file, time_option="default", index="default"):
-		self.notify( "parsing logs from: " + log_file )
-		logs = self.parse_logs(log_file)
-		if( logs == "failed." or logs == None or logs == "None" ):
-			self.error( log_file + ": failed to parse json." )
-		self.notify( "updating timestampts from: " + log_file + " (w/ timestamp option " + time_option + ")" )
-		logs = self.update_timestamps(logs, time_option)
+	#parse, rebase and send in one pass so only a few batches of the file are ever in memory
+	def stream_and_send(self, log_file, time_option="default", index="default"):
+		rebaser = self.make_rebaser(time_option)
+		if rebaser == -1:
+			return ("failed.")
+		try:
+			with open_log(log_file) as fileobj:
+				logs = self.stream_logs(fileobj)
+				if rebaser is not None:
+					logs = map(rebaser.rebase, logs)
+				return self.send_logs(logs, index)
+		except Exception as e:
+			self.error( "Error parsing " + log_file + "\n" + str(e) )
+			return ("failed.")
+
+	#rebase and send a log file that was staged when the scenario was loaded
+	def send_payload(self, payload, time_option="default", index="default"):
+		origin_us = self.origin_time(time_option) if payload.rebase else None
+		if origin_us == -1:
+			return ("failed.")
 		if(self.delay == True):
+			#the origin is fixed by the first document sent, which is not the first of the file after replay_start or a seek
+			shift = {'origin':None}
+			def fetch(k):
+				if shift['origin'] == None and origin_us != None:
+					first = payload.first_offset(k)
+					if first != None:
+						shift['origin'] = origin_us - first
+				return payload.doc(k, shift['origin'])
+			return self.trickle_docs(payload.doc_times(), fetch, index)
+		return self.send_docs(payload.docs(origin_us), index)
+
+	#trickle a plain log file through its sidecar index, reading each document out of a memory map only when it is due
+	def trickle_indexed(self, log_file, time_option="default", index="default"):
+		rebaser = self.make_rebaser(time_option)
+		if rebaser == -1:
+			return ("failed.")
+		try:
+			log_index = Log_Index(log_file, self.Scenario.cache_dir).load_or_build(self.Event)
+		except Exception as e:
+			self.error( "Error parsing " + log_file + "\n" + str(e) )
+			return ("failed.")
+		if log_index == None:
+			return ("thread killed.")
+		if len(log_index) == 0:
+			return ("no logs.")
+
+		with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			def fetch(k):
+				log = json.loads(mm[log_index.offsets[k]:log_index.offsets[k] + log_index.lengths[k]])
+				if rebaser != None:
+					log = rebaser.rebase(log)
+				return (json.dumps(log) + "\n").encode()
 			self.notify( "trickling " + log_file + " into index " + index )
-			resp = self.trickle_logs(logs, index)
+			return self.trickle_docs(log_index.doc_times(), fetch, index)
+
+	#creating a single function to perform all tasks to be easily called as a thread
+	def parse_update_and_send(self, log_file, time_option="default", index="default"):
+		payload = self.Scenario.get_payload(self.Log_ID)
+		if payload != None:
+			self.notify( "sending staged " + log_file + " into index " + index + " (w/ timestamp option " + time_option + ")" )
+			resp = self.send_payload(payload, time_option, index)
+		elif(self.delay == True and Log_Index.supported(log_file)):
+			self.notify( "indexing logs from: " + log_file )
+			resp = self.trickle_indexed(log_file, time_option, index)
+		elif(self.delay == True):
+			self.notify( "parsing logs from: " + log_file )
+			logs = self.parse_logs(log_file)
+			rebaser = self.make_rebaser(time_option)
+			if( logs == "failed." or logs == None or logs == "None" ):
+				self.error( log_file + ": failed to parse json." )
+				resp = "failed."
+			elif rebaser == -1:
+				resp = "failed."
+			else:
+				#timestamps are updated as the logs are sent, so the first one sent gets the time option's timestamp
+				self.notify( "trickling " + log_file + " into index " + index + " (w/ timestamp option " + time_option + ")" )
+				resp = self.trickle_logs(logs, index, rebaser)
 		else:
-			self.notify( "bulk sending " + log_file + " into index " + index )
-			resp = self.send_logs(logs, index)
+			self.notify( "bulk sending " + log_file + " into index " + index + " (w/ timestamp option " + time_option + ")" )
+			resp = self.stream_and_send(log_file, time_option, index)
 		self.notify(log_file + " : " + resp)
+		if resp == "failed.":
+			self.failed = True
 		
-		#stop safely
-		self.Stop()
+		#done, the job comes off Jobs once this returns
+		self.Event.set()
 
 		#use to set Kill signal and kill trickling of logs in threads
 	def Stop(self):
 		#sys.stderr.write("killing thread\n")
 		self.Event.set()
-		self.thread.join()
+		with self.Control:
+			self.Control.notify_all()
+		for future in self.futures:
+			future.cancel()
+		concurrent.futures.wait(self.futures)
+
+	#wait up to timeout seconds, returns True early if the thread is killed, paused, or asked to seek
+	def hold(self, timeout=None):
+		with self.Control:
+			return self.Control.wait_for(lambda: self.Event.is_set() or self.paused or self.seek_to != None, timeout)
+
+	#block while paused, returns True if the thread was killed in the meantime
+	def pause_point(self):
+		self.notify("{}: {}".format(self.Log_ID, self.Status()))
+		with self.Control:
+			self.Control.wait_for(lambda: self.Event.is_set() or not self.paused)
+		if not self.Event.is_set():
+			self.notify("{}: {}".format(self.Log_ID, self.Status()))
+		return self.Event.is_set()
+
+	#pop a pending seek, in seconds into the logs
+	def take_seek(self):
+		with self.Control:
+			if self.seek_to == None:
+				return None
+			seconds, relative = self.seek_to
+			self.seek_to = None
+		if relative:
+			seconds += self.cursor['position'] or 0.0
+		return max(seconds, 0.0)
+
+	#pause the replay after the request in flight, the cursor keeps the next document to send
+	def Pause(self):
+		with self.Control:
+			self.paused = True
+			self.Control.notify_all()
+
+	#carry on from the cursor, nothing already sent is sent again
+	def Resume(self):
+		with self.Control:
+			self.paused = False
+			self.Control.notify_all()
+
+	#move a delayed replay to seconds into the logs (or by seconds from where it is, if relative); a paused replay stays paused
+	def Seek(self, seconds, relative=False):
+		if self.delay != True:
+			self.error("{}: only delayed logs can seek".format(self.Log_ID))
+			return
+		with self.Control:
+			self.seek_to = (seconds, relative)
+			self.Control.notify_all()
+
+	#short description of where the replay is, for the CLI
+	def Status(self):
+		state = "paused" if self.paused else "running"
+		if self.cursor['total'] == None:
+			return "{} {} documents sent".format(state, self.cursor['next'])
+		return "{} {}/{} documents, {:.0f}s in".format(state, self.cursor['next'], self.cursor['total'], self.cursor['position'] or 0.0)
+
+	#what has been sent so far, for Jobs.Status
+	def Progress(self):
+		return "{} docs, {:.1f} MB sent".format(self.docs_sent, self.bytes_sent / 1048576)
 
 	def Run(self):
-		thread = threading.Thread(target=self.parse_update_and_send, args=[self.log_file], daemon=True)
-		self.thread = thread
-		self.thread.start()
+		if self.Event.is_set():
+			return
+		#a log trickled out in real time runs for the whole scenario, so it does not take one of the pool's threads
+		self.futures = Jobs.run('LOG', self.Log_ID, self, [(self.parse_update_and_send, [self.log_file])], self.Error_message_queue.put, pooled=self.delay != True)
 
 	def Clear_Thread(self, index="default"):
 		#TODO:: what the hell is happening here with "all"? Does it even parse to the thread?
+		if self.Event.is_set():
+			return
+		indexes = []
 		if(index == "all"):
 			self.notify("Clearing all indexes that have been uploaded during this session . . .")
-			seen = []
 			while not self.Index_queue.empty():
 				current = self.Index_queue.get()
 				if(current == "all"):
 					self.error("While clearing indexes received keyword \"all\". Skipping to avoid infinite recursion. Do not use index \"all\" in the future.")
 					continue
-				if not current in seen:
-					self.Clear_Thread(current)
-					seen.append(current)
-		
-		thread = threading.Thread(target=self.clear_index, args=[index], daemon=True)
-		self.thread = thread
-		self.thread.start()
-
+				if not current in indexes:
+					indexes.append(current)
+		indexes.append(index)
+
+		indexes = [self.index if i == "default" else i for i in indexes]
+
+		#one job for all of them, so it is done when the last index is cleared
+		#a kind of its own, so it is not listed as the log whose connection settings it borrowed
+		self.futures = Jobs.run('CLEAR', ", ".join(indexes), self, [(self.clear_index, [i]) for i in indexes], self.Error_message_queue.put)
+
+
+
+
+class Effect_Process_Tracker(object):
+	#keeps track of the processes effects start on agents so stopping an effect stops them, and finds the ones left behind
+	#every effect command runs with ECS_EFFECT=<effect id>:<run> in its environment, which its whole process tree inherits,
+	#so processes that detached from the command can still be found; a process whose run is not tracked here is an orphan
+	find_script = 'for p in /proc/[0-9]*; do e=$(tr "\\0" "\\n" 2>/dev/null < $p/environ | grep "^ECS_EFFECT=") && echo "${p#/proc/} ${e#ECS_EFFECT=} $(cat $p/comm 2>/dev/null)"; done'
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.runs = {}	#run -> {(agent_ip, username): set of PIDs of commands still running}
+
+	@staticmethod
+	def tag(EFX_ID, run):
+		return '{}:{}'.format(EFX_ID, run)
+
+	#a command of a run is being started on an agent
+	def begin(self, run, agent_ip, username):
+		with self.lock:
+			self.runs.setdefault(run, {}).setdefault((agent_ip, username), set())
+
+	def started(self, run, agent_ip, username, pid):
+		with self.lock:
+			self.runs.setdefault(run, {}).setdefault((agent_ip, username), set()).add(pid)
+
+	def finished(self, run, agent_ip, username, pid):
+		with self.lock:
+			self.runs.get(run, {}).get((agent_ip, username), set()).discard(pid)
+
+	#stop tracking a run, returns {(agent_ip, username): PIDs still running}
+	def end(self, run):
+		with self.lock:
+			return self.runs.pop(run, {})
+
+	def live(self):
+		with self.lock:
+			return set(self.runs)
+
+	#effect processes running on an agent, as (pid, effect id, run, process name)
+	def scan(self, agent_ip, username, password):
+		found = []
+		for line in SSH_Connections.run(agent_ip, username, password, self.find_script).splitlines():
+			fields = line.split(' ', 2)
+			if len(fields) < 2 or not fields[0].isdigit():
+				continue
+			EFX_ID, sep, run = fields[1].rpartition(':')
+			found.append((int(fields[0]), EFX_ID, run, fields[2] if len(fields) > 2 else ''))
+		return found
+
+	#stop the process trees of pids, and every process tagged with one of tags; TERM first, KILL whatever is left a second later
+	def kill(self, agent_ip, username, password, pids=(), tags=()):
+		script = ['t(){ for c in $(pgrep -P $1); do t $c; done; echo $1; }', 'k=""']
+		for pid in pids:
+			script.append('k="$k $(t {})"'.format(int(pid)))
+		if len(tags) > 0:
+			script.append('for p in /proc/[0-9]*; do tr "\\0" "\\n" 2>/dev/null < $p/environ | grep -qxF {} && k="$k ${{p#/proc/}}"; done'.format(
+				' '.join('-e ' + shlex.quote('ECS_EFFECT=' + tag) for tag in tags)))
+		#kill fails when any pid has already exited, so its status must not decide whether the KILL is sent
+		script.append('if [ -n "$k" ]; then kill -TERM $k 2>/dev/null; sleep 1; kill -KILL $k 2>/dev/null; fi; true')
+		SSH_Connections.run(agent_ip, username, password, '; '.join(script))
+
+	#look for orphaned effect processes on agents, and kill them if asked
+	# agents : dict of (agent_ip, username) -> password
+	# report : function taking a message for each agent
+	def reap(self, agents, report, kill=False):
+		def reap_agent(agent_ip, username, password):
+			try:
+				live = self.live()
+				orphans = [i for i in self.scan(agent_ip, username, password) if not i[2] in live]
+				if len(orphans) == 0:
+					return
+				report('{}@{}: {} orphaned effect processes: {}'.format(username, agent_ip, len(orphans), ', '.join('{} ({}, effect {})'.format(i[0], i[3], i[1]) for i in orphans)))
+				if kill:
+					self.kill(agent_ip, username, password, tags=sorted(set(self.tag(i[1], i[2]) for i in orphans)))
+					report('{}@{}: killed {} orphaned effect processes'.format(username, agent_ip, len(orphans)))
+			except Exception as e:
+				report('{}@{}: could not check for orphaned effect processes: {}'.format(username, agent_ip, str(e)))
 
+		threads = [threading.Thread(target=reap_agent, args=[key[0], key[1], password], daemon=True) for key, password in agents.items()]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
 
+Effect_Processes = Effect_Process_Tracker()
+
+class Effect_Output(object):
+	#turns the raw output of an effect command into whole lines, sent to the message queue in one message per interval
+	#at most max_lines lines are passed on per interval, the rest are counted so a chatty effect cannot flood the screen
+	#the first line is the PID echoed before the command, it is handed to on_pid
+	def __init__(self, message_queue, username, agent_ip, interval=0.2, max_lines=100, on_pid=None):
+		self.message_queue = message_queue
+		self.on_pid = on_pid
+		self.pid = None
+		self.prefix = '{}@{} => '.format(username,agent_ip)
+		self.interval = interval
+		self.max_lines = max_lines
+		self.utf8 = codecs.getincrementaldecoder('utf-8')('replace')
+		self.partial = ''
+		self.lines = []
+		self.dropped = 0
+		self.pid_line = True
+		self.last_flush = time.monotonic()
+		self.eof = False
+
+	#add output read off the channel, an empty read is the end of it
+	def feed(self, data):
+		self.eof = len(data) == 0
+		split = (self.partial + self.utf8.decode(data, final=self.eof)).split('\n')
+		self.partial = split.pop()
+		if self.eof and self.partial != '':
+			split.append(self.partial)
+		for line in split:
+			if self.pid_line:
+				self.message_queue.put(self.prefix + 'PID: ' + line.strip())
+				self.pid_line = False
+				if line.strip().isdigit():
+					self.pid = int(line.strip())
+					if self.on_pid != None:
+						self.on_pid(self.pid)
+			elif len(self.lines) < self.max_lines:
+				self.lines.append(self.prefix + line.rstrip('\r'))
+			else:
+				self.dropped += 1
+
+	#send the lines gathered so far once the interval is up (or the output ended)
+	def flush(self):
+		if not self.eof and time.monotonic() - self.last_flush < self.interval:
+			return
+		if self.dropped > 0:
+			self.lines.append('{}... {} more lines not shown'.format(self.prefix, self.dropped))
+		if len(self.lines) > 0:
+			self.message_queue.put('\n'.join(self.lines))
+		self.lines = []
+		self.dropped = 0
+		self.last_flush = time.monotonic()
+
+	#send everything still held, the interval is not waited out and a last line without its newline goes too
+	#called when the command ends or is stopped, so stopping an effect does not lose the output it already printed
+	def close(self):
+		if not self.eof:
+			self.feed(b'')
+		self.flush()
 
 class Effects_Agent(object):
+	output_interval = 0.2	#seconds between batches of effect output
+	output_lines = 100		#lines of effect output shown per batch, per agent
+
 	def __init__(self, Scenario, EFX_ID, q, error):
 		self.Scenario = Scenario
 		self.EFX_ID = EFX_ID
 		self.message_queue = q
 		self.Error_message_queue = error
-		self.threads = []
+		self.futures = []		#one Commander per agent, on Jobs
 		self.Event = threading.Event()
+		self.lock = threading.Lock()
+		self.finished = 0
+		self.failed = False
+		self.output_bytes = 0
+		#tags the processes of this run of the effect, see Effect_Process_Tracker
+		self.run = os.urandom(4).hex()
 		self.EFX_Commands = self.Scenario.Effects[EFX_ID]['effect_command']
-		self.username = Scenario.Effects[EFX_ID]['agent_username']
-		self.agent_ip = Scenario.Effects[EFX_ID]['agent_ip']
-		self.password = Scenario.Effects[EFX_ID]['agent_password']
-		self.scp_files = self.Scenario.Effects[EFX_ID]['effect_file']
-		self.scp_file_dest = self.Scenario.Effects[EFX_ID]['effect_file_destination']
-		self.file_loc_default = '~/'
-		
-		#fix agent ip to passwords and usernames
-		if len(self.agent_ip) > len(self.username) and (self.username[0] != None or self.username != ''):
-			self.username.extend([str(self.username[-1]) for i in range(len(self.agent_ip)-len(self.username))])
-		elif self.username == None or self.username == '':
-			self.Error_message_queue.put('No username for IP: {}'.format(self.agent_ip[0]))
-
-		if len(self.agent_ip) > len(self.password) and (self.password[0] != None or self.password != ''):
-			self.password.extend([str(self.password[-1]) for i in range(len(self.agent_ip)-len(self.password))])
-		elif self.password == None or self.password == '':
-			self.Error_message_queue.put('No password for IP: {}'.format(self.agent_ip[0]))
-		
-		#fix mismatches in files and locations
-		if len(self.scp_files) > len(self.scp_file_dest) and (self.scp_file_dest[0] != None or self.scp_file_dest != ''):
-			self.scp_file_dest.extend([str(self.scp_file_dest[-1]) for i in range(len(self.scp_files)-len(self.scp_file_dest))])
-		elif self.scp_file_dest == None or self.scp_file_dest == '':
-			self.scp_file_dest = [str(self.file_loc_default) for i in range(len(self.scp_files))]
-		
-
-	def Commander(self,ID):
+		self.agent_ip, self.username, self.password, self.scp_files, self.scp_file_dest = self.settings(Scenario, EFX_ID)
+
+	#agents and files of an effect from the effects sheet, as lists of their own so the scenario is never changed
+	#usernames and passwords short of the agent ips repeat the last one, destinations short of the files repeat the last one or are ~/
+	#safe to call from any thread, the prefetcher uses it to find what to warm without making an Effects_Agent
+	# returns agent_ip, username, password, effect_file, effect_file_destination lists
+	@staticmethod
+	def settings(Scenario, EFX_ID, file_loc_default='~/'):
+		effect = Scenario.Effects[EFX_ID]
+		agent_ip = list(effect['agent_ip'])
+		scp_files = list(effect['effect_file'])
+		def fill(values, length, default=None):
+			values = list(values) if values != None else []
+			if len(values) == 0:
+				return [default] * length
+			return values + [str(values[-1])] * (length - len(values))
+		return (agent_ip, fill(effect['agent_username'], len(agent_ip)), fill(effect['agent_password'], len(agent_ip)),
+			scp_files, fill(effect['effect_file_destination'], len(scp_files), file_loc_default))
+
+
+	#pooled connection to an agent, shared with every other effect on it, see SSH_Registry
+	def connect(self, agent_ip, username, password):
+		return SSH_Connections.client(agent_ip, username, password)
+
+	#pass a command's output on to the message queue, see Effect_Output
+	#blocks in select on the channel, waking every output_interval to send what has come in and to check self.Event
+	def stream_output(self, channel, username, agent_ip):
 		import select
-		import socket
-		from scp import SCPClient
 
+		output = self.command_output(username, agent_ip)
+		while not output.eof and not self.Event.is_set():
+			readable, writable, errored = select.select([channel],[],[],self.output_interval)
+			if readable:
+				output.feed(self.received(channel.recv(32768)))
+			output.flush()
+		self.command_done(output, username, agent_ip)
+
+	#output of one command, its PID is tracked until it finishes
+	def command_output(self, username, agent_ip):
+		return Effect_Output(self.message_queue, username, agent_ip, self.output_interval, self.output_lines,
+			lambda pid: Effect_Processes.started(self.run, agent_ip, username, pid))
+
+	def command_done(self, output, username, agent_ip):
+		ended = output.eof
+		output.close()
+		if ended and output.pid != None:
+			Effect_Processes.finished(self.run, agent_ip, username, output.pid)
+
+	#upload the effect files one agent needs and report on them, see Effect_Stager
+	def stage_files(self, ID):
 		username = self.username[ID]
 		agent_ip = self.agent_ip[ID]
 		password = self.password[ID]
-		#connect to an ssh client and run commands
-		ssh = paramiko.SSHClient()
-		ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-		
-		#setup files for upload
-		set_continue = False
-			 
-		#upload files
-		f = 0
-		for i in self.scp_files:
-			#break if thread is closing
-			if self.Event.is_set():
-				break
-			self.message_queue.put('\nEffect Agent: {}@{} \t File: {} \t Dest: {}\n'.format(username,agent_ip,i,self.scp_file_dest[f]))
-			try:
-				ssh.connect(agent_ip, username=username, password=password, timeout=2)
-				scp = SCPClient(ssh.get_transport())
-				set_continue = True
-			except:
-				self.Error_message_queue.put('Could not connect to SSH on {}@{}'.format(username,agent_ip))
-			
-			if set_continue:
-				scp.put(i, remote_path=self.scp_file_dest[f])
-				f += 1
-				scp.close()
-				ssh.close()
+		try:
+			staged = Effect_Files.stage(agent_ip, username, password, list(zip(self.scp_files, self.scp_file_dest)), self.Event)
+		except Exception:
+			self.Error_message_queue.put('Could not connect to SSH on {}@{}'.format(username,agent_ip))
+			staged = []
+		for i, dest, result in staged:
+			self.message_queue.put('\nEffect Agent: {}@{} \t File: {} \t Dest: {}\n'.format(username,agent_ip,i,dest))
+			if isinstance(result, Exception):
+				self.Error_message_queue.put('Could not upload {} to {}@{}: {}'.format(i,username,agent_ip,str(result)))
+			elif result == "unchanged":
+				self.message_queue.put('{}@{} => {} is already on the agent'.format(username,agent_ip,i))
+
+	#start one line of effect_command on an agent, on a new channel of the pooled ssh connection
+	def start_command(self, ID, command):
+		username = self.username[ID]
+		agent_ip = self.agent_ip[ID]
+		#print out the ip of the agent and what command was run
+		self.message_queue.put('\nEffect Agent: {}@{} \t Command: {} \n'.format(username,agent_ip,command))
+		Effect_Processes.begin(self.run, agent_ip, username)
+		channel = SSH_Connections.session(agent_ip, username, self.password[ID])
+		channel.set_combine_stderr(True)
+		#set up command to print out the PID of the command (technically the PID of the ssh terminal), tagged so its processes can be found
+		channel.exec_command('echo $$; exec env ECS_EFFECT=' + shlex.quote(Effect_Processes.tag(self.EFX_ID, self.run)) + ' bash -c \'' + command + '\'')
+		return channel
+
+	def Commander(self,ID):
+		#upload files the agent does not already have
+		self.stage_files(ID)
 
 		for i in self.EFX_Commands:
 			if self.Event.is_set():
 				break
-
-			#set up command to print out the PID of the command (technically the PID of the ssh terminal)
-			command = 'echo $$; exec bash -c \'' + i + '\''
-			#print out the ip of the agent and what command was run
-			
-			self.message_queue.put('\nEffect Agent: {}@{} \t Command: {} \n'.format(username,agent_ip,i))
-			
-			#attempt to connect to the ssh client, start an ssh channel, and continuously output the ssh command output
+			#continuously output the ssh command output
 			try:
-				ssh.connect(agent_ip, username=username, password=password, timeout=2)
-				transport = ssh.get_transport()
-				channel = transport.open_session()
-				channel.settimeout(0.0)
-				channel.set_combine_stderr(True)
-				channel.exec_command(command)
-				pid_line = True
-				while not self.Event.is_set():
-					rl, wl, xl = select.select([channel],[],[])
-					if channel in rl:
-						try:
-							message = channel.recv(1024)
-							if len(message) == 0:
-								break
-							#if this is the first line, its the PID
-							if pid_line:
-								self.message_queue.put('{}@{} => PID: {}'.format(username,agent_ip,message.decode('ascii').strip("\n")))
-								pid_line = False
-							else:
-								self.message_queue.put('{}@{} => {}'.format(username,agent_ip,message.decode('ascii').strip("\n")))
-						except socket.timeout:
-							pass
-				ssh.close()
+				channel = self.start_command(ID, i)
+				self.stream_output(channel, self.username[ID], self.agent_ip[ID])
+				channel.close()
 			except:
-				self.Error_message_queue.put('Could not connect to SSH on {}@{}'.format(username,agent_ip))
-		#stop safely
-		self.Stop()
+				self.failed = True
+				self.Error_message_queue.put('Could not connect to SSH on {}@{}'.format(self.username[ID],self.agent_ip[ID]))
+		#the effect is done once every agent has finished
+		with self.lock:
+			self.finished += 1
+			if self.finished == len(self.agent_ip) and not self.Event.is_set():
+				Effect_Processes.end(self.run)
+				self.Event.set()
 		
 	def Run(self):
 		#run the EFX Commmander for each ip in a different thread.
-		for i in range(len(self.agent_ip)):
-			thread = threading.Thread(target=self.Commander, args=[i], daemon=True)
-			self.threads.append(thread)
+		self.futures = Jobs.run('EFX', self.EFX_ID, self, [(self.Commander, [i]) for i in range(len(self.agent_ip))], self.Error_message_queue.put)
+
+	def Wait(self):
+		concurrent.futures.wait(self.futures)
+
+	def Stop(self):
+		self.Event.set()
+		#agents still waiting for a thread are never started
+		for future in self.futures:
+			future.cancel()
+		concurrent.futures.wait(self.futures)
+		self.kill_remote()
+
+	#count command output as it comes in, for Progress
+	def received(self, data):
+		with self.lock:
+			self.output_bytes += len(data)
+		return data
+
+	#how far along the effect is, for Jobs.Status
+	def Progress(self):
+		return "{}/{} agents done, {:.1f} KB output".format(self.finished, len(self.agent_ip), self.output_bytes / 1024)
+
+	#stop whatever this run of the effect still has running on its agents, over the pooled connections
+	def kill_remote(self):
+		remaining = Effect_Processes.end(self.run)
+		passwords = dict(zip(zip(self.agent_ip, self.username), self.password))
+		def kill_agent(agent_ip, username, pids):
+			try:
+				Effect_Processes.kill(agent_ip, username, passwords[(agent_ip, username)], pids, [Effect_Processes.tag(self.EFX_ID, self.run)])
+				self.message_queue.put('{}@{} => stopped {}'.format(username,agent_ip,self.EFX_ID))
+			except Exception as e:
+				self.Error_message_queue.put('Could not stop {} on {}@{}: {}'.format(self.EFX_ID,username,agent_ip,str(e)))
+		threads = [threading.Thread(target=kill_agent, args=[key[0], key[1], pids], daemon=True) for key, pids in remaining.items()]
+		for thread in threads:
 			thread.start()
+		for thread in threads:
+			thread.join()
+
+
+
+class Effects_Loop_Runner(object):
+	#one asyncio event loop, in its own thread, that runs the effects of every Async_Effects_Agent
+	#waiting on command output costs no threads; ssh handshakes, uploads, and opening channels block, so they go to a small thread pool
+	# limit : int, agents worked on at once over all effects, the rest wait their turn
+	# agent_limit : int, effects running at once on one agent, sshd allows 10 sessions on a connection by default
+	# blocking_threads : int, threads for the blocking ssh calls
+	def __init__(self, limit=256, agent_limit=8, blocking_threads=32):
+		self.limit = limit
+		self.agent_limit = agent_limit
+		self.blocking_threads = blocking_threads
+		self.lock = threading.Lock()
+		self.loop = None
+		self.thread = None
+		self.slots = None
+		self.agent_slots = {}	#(agent_ip, username) -> Semaphore, the queue of effects waiting on that agent
+
+	#start the loop the first time it is needed
+	def start(self):
+		with self.lock:
+			if self.loop == None:
+				self.loop = asyncio.new_event_loop()
+				self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=self.blocking_threads))
+				self.slots = asyncio.Semaphore(self.limit)
+				self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+				self.thread.start()
+			return self.loop
+
+	#run a coroutine on the loop, returns a concurrent.futures.Future
+	def submit(self, coroutine):
+		return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+	#only called on the loop
+	def agent_slot(self, agent_ip, username):
+		key = (agent_ip, username)
+		if not key in self.agent_slots:
+			self.agent_slots[key] = asyncio.Semaphore(self.agent_limit)
+		return self.agent_slots[key]
+
+	def in_loop(self):
+		return self.thread != None and threading.current_thread() is self.thread
+
+Effects_Loop = Effects_Loop_Runner()
+
+class Async_Effects_Agent(Effects_Agent):
+	#Effects_Agent that runs on Effects_Loop instead of a thread per agent, for scenes that fan out to large ranges
+	#same Run / Wait / Stop, the effect is done (Event set) once every agent has finished
+	future = None
+
+	def Run(self):
+		self.future = Effects_Loop.submit(self.run_agents())
+		self.futures = [self.future]
+		Jobs.track('EFX', self.EFX_ID, self, self.futures)
+
+	async def run_agents(self):
+		try:
+			await asyncio.gather(*[self.command_agent(i) for i in range(len(self.agent_ip))])
+		finally:
+			if not self.Event.is_set():
+				Effect_Processes.end(self.run)
+			self.Event.set()
+
+	async def command_agent(self, ID):
+		loop = asyncio.get_running_loop()
+		async with Effects_Loop.agent_slot(self.agent_ip[ID], self.username[ID]):
+			async with Effects_Loop.slots:
+				if self.Event.is_set():
+					return
+				#upload files the agent does not already have
+				await loop.run_in_executor(None, self.stage_files, ID)
+				for i in self.EFX_Commands:
+					if self.Event.is_set():
+						break
+					try:
+						channel = await loop.run_in_executor(None, self.start_command, ID, i)
+					except Exception:
+						self.failed = True
+						self.Error_message_queue.put('Could not connect to SSH on {}@{}'.format(self.username[ID],self.agent_ip[ID]))
+						continue
+					try:
+						await self.stream_output_async(channel, self.username[ID], self.agent_ip[ID])
+					except Exception as e:
+						self.Error_message_queue.put('Lost output of {}@{}: {}'.format(self.username[ID],self.agent_ip[ID],str(e)))
+					channel.close()
+				with self.lock:
+					self.finished += 1
+
+	#same as stream_output, but the loop watches the channel instead of a thread blocking on it
+	async def stream_output_async(self, channel, username, agent_ip):
+		loop = asyncio.get_running_loop()
+		ready = asyncio.Event()
+		output = self.command_output(username, agent_ip)
+		loop.add_reader(channel.fileno(), ready.set)
+		try:
+			while not output.eof and not self.Event.is_set():
+				try:
+					await asyncio.wait_for(ready.wait(), self.output_interval)
+				except asyncio.TimeoutError:
+					pass
+				ready.clear()
+				while channel.recv_ready():
+					output.feed(self.received(channel.recv(32768)))
+				if channel.eof_received and not channel.recv_ready():
+					output.feed(b'')
+				output.flush()
+		finally:
+			loop.remove_reader(channel.fileno())
+		self.command_done(output, username, agent_ip)
 
 	def Wait(self):
-		for i in range(len(self.threads)):
-			self.threads[i].join()
+		if self.future == None:
+			return
+		try:
+			self.future.result()
+		except Exception:
+			pass
 
 	def Stop(self):
 		self.Event.set()
-		for thread in self.threads:
+		if not Effects_Loop.in_loop():
+			self.Wait()
+			self.kill_remote()
+
+class Scene_Prefetcher(object):
+	#warms the resources of the scenes that can come next (scene_children) so a transition does not wait on parsing, handshakes, or uploads
+	#log files are staged into Scenario.Payloads, effect agents get a pooled SSH connection and their effect_files uploaded
+	#anything warmed for a branch that was not taken is dropped when the next scene starts, payloads and the connections the prefetcher opened, files stay on the agents
+	#a connection an effect has used since belongs to the pool and is left to it
+	# memory_limit : int, bytes of log payloads the prefetcher may hold on top of Stage_Logs
+	# connection_limit : int, SSH connections the prefetcher may hold open that no effect has used yet
+	def __init__(self, Scenario, error_queue, memory_limit=256 << 20, connection_limit=16):
+		self.Scenario = Scenario
+		self.Error_message_queue = error_queue
+		self.memory_limit = memory_limit
+		self.connection_limit = connection_limit
+		self.lock = threading.Lock()
+		self.Event = threading.Event()
+		self.thread = None
+		self.payloads = {}		#payload key -> bytes, payloads this prefetcher put in Scenario.Payloads
+		self.connections = set()	#(agent_ip, username) connections this prefetcher opened
+
+	#logs and effect agents used by a list of scenes
+	def wanted(self, scenes):
+		logs = set()
+		agents = set()
+		for scene in scenes:
+			if not scene in self.Scenario.Scenario:
+				continue
+			for i in self.Scenario.Scenario[scene]['logs']:
+				if not (i == None or i == 'None') and i in self.Scenario.Logs:
+					logs.add(i)
+			for i in self.Scenario.Scenario[scene]['effects']:
+				if not (i == None or i == 'None') and i in self.Scenario.Effects:
+					agents.add(i)
+		return logs, agents
+
+	#(agent_ip, username) -> (password, [(file, dest)]) the agents of a set of effects and the files each needs
+	def agent_files(self, effects):
+		agents = {}
+		for i in sorted(effects):
+			#an effect whose settings are broken fails when it is started, not here
+			try:
+				agent_ip, username, password, scp_files, scp_file_dest = Effects_Agent.settings(self.Scenario, i)
+			except Exception:
+				continue
+			for n in range(len(agent_ip)):
+				files = agents.setdefault((agent_ip[n], username[n]), (password[n], []))[1]
+				files.extend(pair for pair in zip(scp_files, scp_file_dest) if not pair in files)
+		return agents
+
+	#a scene became current, drop what is no longer reachable and warm its children in the background
+	#the previous round is told to stop but not waited on, it may be in the middle of a slow upload
+	def Warm(self, scene):
+		self.Event.set()
+		self.Event = threading.Event()
+
+		children = [i for i in self.Scenario.Scenario[scene]['scene_children'] if not (i == None or i == 'None')]
+		logs, effects = self.wanted([scene] + children)
+		self.evict(logs, self.agent_files(effects))
+
+		self.thread = threading.Thread(target=self.warm_thread, args=[children, self.Event], daemon=True)
+		self.thread.start()
+
+	#drop the payloads and connections this prefetcher warmed that are not for logs or agents
+	def evict(self, logs, agents):
+		keep = set()
+		for i in logs:
+			try:
+				keep.add(self.Scenario.payload_key(i))
+			except Exception:
+				pass
+		with self.lock:
+			for key in [k for k in self.payloads if not k in keep]:
+				self.Scenario.Payloads.pop(key, None)
+				del self.payloads[key]
+			dropped = [k for k in self.connections if not k in agents]
+			self.connections.difference_update(dropped)
+		for key in dropped:
+			SSH_Connections.drop(key[0], key[1], prefetched=True)
+
+	def warm_thread(self, children, event):
+		logs, effects = self.wanted(children)
+		warmed = [0, 0, 0]
+
+		#logs first, they are the slowest to get ready
+		for i in sorted(logs):
+			if event.is_set():
+				return
+			try:
+				key = self.Scenario.payload_key(i)
+				if key == None or key in self.Scenario.Payloads:
+					continue
+				if sum(self.payloads.values()) + log_source_size(key[0]) > self.memory_limit:
+					continue
+				payload = Log_Payload(key[0], key[1], key[2], key[3]).build(event)
+			except Exception as e:
+				self.Error_message_queue.put('[!] Prefetch of log {} failed: {}'.format(i, str(e)))
+				continue
+			#checked under the lock evict takes, so a round that was told to stop can not put back what was evicted
+			with self.lock:
+				if event.is_set():
+					return
+				self.Scenario.Payloads[key] = payload
+				self.payloads[key] = len(payload.blob)
+			warmed[0] += 1
+
+		#connect to the agents and push their files, one thread per agent
+		def warm_agent(agent_ip, username, password, files):
+			key = (agent_ip, username)
+			connected = SSH_Connections.connected(agent_ip, username)
+			if not connected:
+				#only connections no effect has used count against the limit, the rest are the pool's
+				with self.lock:
+					self.connections = set(k for k in self.connections if k == key or SSH_Connections.unclaimed(*k))
+					if not key in self.connections and len(self.connections) >= self.connection_limit:
+						return
+					self.connections.add(key)
+			try:
+				staged = Effect_Files.stage(agent_ip, username, password, files, event, prefetch=True)
+			except Exception as e:
+				self.Error_message_queue.put('[!] Prefetch for {}@{} failed: {}'.format(username, agent_ip, str(e)))
+				staged = None
+			finally:
+				#evicted while connecting, it was not in the pool yet when evict dropped it
+				with self.lock:
+					stale = event.is_set() and not key in self.connections
+				if stale:
+					SSH_Connections.drop(agent_ip, username, prefetched=True)
+			if staged == None:
+				return
+			with self.lock:
+				warmed[1] += not connected
+				warmed[2] += sum(1 for result in staged if result[2] == "uploaded")
+			for f, dest, result in staged:
+				if isinstance(result, Exception):
+					self.Error_message_queue.put('[!] Prefetch of {} to {}@{} failed: {}'.format(f, username, agent_ip, str(result)))
+
+		agents = self.agent_files(effects)
+		threads = [threading.Thread(target=warm_agent, args=[key[0], key[1], value[0], value[1]], daemon=True) for key, value in agents.items()]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
 			thread.join()
+		if event.is_set():
+			return
 
+		if sum(warmed) > 0:
+			self.Error_message_queue.put('[+] Prefetched scene children: {} logs, {} connections, {} files'.format(*warmed))
 
+	def Stop(self):
+		self.Event.set()
+		if self.thread != None:
+			self.thread.join()
+		self.evict(set(), set())
+
+class Message_Channel(object):
+	#handed to the Log Controllers, Effects Agents, etc. in place of a queue, put() sends a message onto the bus
+	def __init__(self, bus, source, priority, color, ID=None, scene=None):
+		self.bus = bus
+		self.source = source
+		self.priority = priority
+		self.color = color
+		self.ID = ID			#effect/log the messages are about, for the journal
+		self.scene = scene		#scene that started it
+
+	def put(self, message):
+		self.bus.put(self, message)
+
+	#same channel, with the messages marked as coming from ID started in scene
+	def tag(self, ID, scene):
+		return Message_Channel(self.bus, self.source, self.priority, self.color, ID, scene)
+
+class Message_Bus(object):
+	#one queue for every message shown in the middle of the screen, so the printer blocks on it instead of polling a queue per source
+	#messages come off by channel priority, then in the order they were sent
+	#a waiting message moves up one priority for every aging messages sent after it, so a flood of errors cannot hold back LOG/CONTEXT for good
+	#the journal is written as messages are sent, so it stays in time order whatever order the screen shows them in
+	# aging : int, messages sent behind a waiting message before it moves up a priority
+	def __init__(self, aging=50):
+		self.aging = max(aging, 1)
+		self.lock = threading.Condition()
+		self.waiting = {}		#priority -> deque of (order, channel, message, time sent)
+		self.sent = 0			#messages put so far, the order of the next one
+		self.wakes = 0			#wakes not yet handed to a get
+		self.journal = None
+		self.unjournaled = []	#(channel, message, time sent) put before there was a journal
+
+	# source : string, name of the sender (EFX, LOG, CONTEXT, ERROR)
+	# priority : int, lower comes off first
+	# color : curses color the messages are printed in
+	def channel(self, source, priority, color):
+		return Message_Channel(self, source, priority, color)
+
+	def put(self, channel, message):
+		with self.lock:
+			sent = time.time()
+			self.waiting.setdefault(channel.priority, collections.deque()).append((self.sent, channel, message, sent))
+			self.sent += 1
+			if self.journal != None:
+				self.journal(channel, message, sent)
+			else:
+				self.unjournaled.append((channel, message, sent))
+			self.lock.notify()
+
+	#journal every message from now on with write(channel, message, time sent), starting with the ones already sent
+	def journal_to(self, write):
+		with self.lock:
+			self.journal = write
+			for item in self.unjournaled:
+				write(*item)
+			self.unjournaled = []
+
+	#wake a blocked get without a message, e.g. on shutdown
+	def wake(self):
+		with self.lock:
+			self.wakes += 1
+			self.lock.notify()
+
+	def empty(self):
+		with self.lock:
+			return not any(self.waiting.values())
+
+	#next (channel, message, time sent), None if timeout runs out or the bus was woken
+	def get(self, timeout=None):
+		with self.lock:
+			if not self.lock.wait_for(lambda: self.wakes > 0 or any(self.waiting.values()), timeout):
+				return None
+			if self.wakes > 0:
+				self.wakes -= 1
+				return None
+			#lowest priority after aging, the oldest message on a tie
+			heads = [(priority - (self.sent - 1 - waiting[0][0]) // self.aging, waiting[0][0], priority) for priority, waiting in self.waiting.items() if waiting]
+			order, channel, message, sent = self.waiting[min(heads)[2]].popleft()
+			return (channel, message, sent)
+
+	#next (channel, message, time sent) if there is one waiting, otherwise None
+	def get_nowait(self):
+		return self.get(timeout=0)
+
+class Scrollback(object):
+	#ring buffer of the lines shown in the middle of the screen, the oldest lines are dropped once it holds capacity lines
+	#the view follows the newest line until it is scrolled up, then it stays put while new lines come in
+	# capacity : int, lines kept
+	# width : int, columns lines are wrapped at
+	def __init__(self, capacity=100000, width=80):
+		self.lock = threading.Lock()
+		self.lines = collections.deque(maxlen=capacity)	#(text, color)
+		self.width = max(width, 1)
+		self.offset = 0		#lines between the bottom of the view and the newest line
+		self.dirty = True	#the view changed since it was last drawn
+		self.highlight = ''	#lines containing this are highlighted, set by search
+
+	def append(self, text, color):
+		wrapped = [text[n:n+self.width] for n in range(0, len(text), self.width)] or ['']
+		with self.lock:
+			self.lines.extend((line, color) for line in wrapped)
+			if self.offset > 0:
+				self.offset = min(self.offset + len(wrapped), max(len(self.lines) - 1, 0))
+			self.dirty = True
+
+	#the rows lines that are in view, oldest first
+	def view(self, rows):
+		with self.lock:
+			self.dirty = False
+			end = len(self.lines) - self.offset
+			return list(itertools.islice(self.lines, max(end - rows, 0), end))
+
+	#move the view, positive is back in time
+	def scroll(self, n):
+		with self.lock:
+			offset = min(max(self.offset + n, 0), max(len(self.lines) - 1, 0))
+			self.dirty = self.dirty or offset != self.offset
+			self.offset = offset
+
+	def end(self):
+		self.scroll(-self.offset)
+
+	#offset of the newest line at or before (older than) start containing text, None if there is none
+	#with newer, the oldest line newer than start instead
+	def search(self, text, start=0, newer=False):
+		self.highlight = text.lower()
+		if text == '':
+			return None
+		text = text.lower()
+		#deque indexing is slow away from the ends, go over a copy in order instead, new lines are not held up by the search
+		with self.lock:
+			lines = list(self.lines)
+		if newer:
+			first = max(len(lines) - start, 0)
+			for n, line in enumerate(itertools.islice(lines, first, None), first):
+				if text in line[0].lower():
+					return len(lines) - 1 - n
+			return None
+		for offset, line in enumerate(itertools.islice(reversed(lines), start, None), start):
+			if text in line[0].lower():
+				return offset
+		return None
+
+	#put the line at offset at the bottom of the view
+	def jump(self, offset):
+		self.scroll(offset - self.offset)
+
+class Session_Journal(object):
+	#JSON Lines record of every message in the session, for going over the experiment afterwards
+	#records are handed to a writer thread and written in batches, so the thread drawing the screen never waits on the disk
+	#the file is flushed at least every flush_interval seconds and rotated to path.1 .. path.<backups> when it grows past max_bytes
+	# path : string, journal file
+	# flush_interval : float, most seconds a record sits in the buffer before it is on disk
+	# batch : int, most records written at once
+	# max_bytes : int, size the file is rotated at, 0 to never rotate
+	# backups : int, rotated files kept
+	def __init__(self, path, flush_interval=1.0, batch=1000, max_bytes=64 << 20, backups=9):
+		self.path = path
+		self.flush_interval = flush_interval
+		self.batch = batch
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self.queue = queue.Queue()
+		self.thread = None
+		self.file = None
+		self.size = 0
+		self.errors = 0
+
+	def Start(self):
+		self.file = open(self.path, 'a', encoding='utf-8')
+		self.size = self.file.tell()
+		self.thread = threading.Thread(target=self.writer_thread, daemon=True)
+		self.thread.start()
+
+	# source : string, EFX, LOG, CONTEXT or ERROR
+	# scene : string, scene the message belongs to
+	# ID : string, effect/log the message is about, None if it is not about one
+	# message : string
+	# sent : float, time.time() the message was sent
+	def write(self, source, scene, ID, message, sent):
+		self.queue.put((source, scene, ID, message, sent))
+
+	#write what is queued and close the file
+	def Stop(self):
+		if self.thread != None:
+			self.queue.put(None)
+			self.thread.join()
+			self.thread = None
+
+	def record(self, source, scene, ID, message, sent):
+		stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sent)) + ".{:03d}Z".format(int(sent * 1000) % 1000)
+		return json.dumps({'@timestamp':stamp, 'source':source, 'scene':scene, 'id':ID, 'message':message}) + '\n'
+
+	def rotate(self):
+		self.file.close()
+		for n in range(self.backups - 1, 0, -1):
+			if os.path.exists('{}.{}'.format(self.path, n)):
+				os.replace('{}.{}'.format(self.path, n), '{}.{}'.format(self.path, n + 1))
+		if self.backups > 0:
+			os.replace(self.path, self.path + '.1')
+		self.file = open(self.path, 'w', encoding='utf-8')
+		self.size = 0
+
+	def writer_thread(self):
+		last_flush = time.monotonic()
+		pending = False
+		stopping = False
+		while not stopping:
+			#wait for a record, but no longer than it takes for the buffer to be due on disk
+			wait = max(last_flush + self.flush_interval - time.monotonic(), 0) if pending else None
+			try:
+				item = self.queue.get(timeout=wait)
+			except queue.Empty:
+				item = False
+			lines = []
+			while item != False:
+				if item == None:
+					stopping = True
+					break
+				lines.append(self.record(*item))
+				if len(lines) >= self.batch:
+					break
+				try:
+					item = self.queue.get_nowait()
+				except queue.Empty:
+					item = False
+
+			try:
+				if len(lines) > 0:
+					chunk = ''.join(lines)
+					size = len(chunk.encode('utf-8'))
+					if self.max_bytes > 0 and self.size > 0 and self.size + size > self.max_bytes:
+						self.rotate()
+					self.file.write(chunk)
+					self.size += size
+					pending = True
+				if pending and (stopping or time.monotonic() - last_flush >= self.flush_interval):
+					self.file.flush()
+					last_flush = time.monotonic()
+					pending = False
+			except Exception:
+				#a full or missing disk should not take the engine down, count what was lost and keep going
+				self.errors += len(lines)
+				pending = False
+		self.file.close()
 
 class Scenario_Engine(object):
-	def __init__(self, Scenario):
+	# Scenario : Scenario_Data
+	# async_effects : bool, run effects with Async_Effects_Agent, see --async-effects
+	def __init__(self, Scenario, async_effects=False):
 		self.Scenario = Scenario
 		self.current_scene = '0'
 		self.scene_children = self.Scenario.Scenario['0']['scene_children']
-		self.Log_Controller_thread = []
-		self.EFX_Commander_thread = []
+		self.scene_path = list(self.Scenario.Graph.path('0'))	#scenes from the root to the current scene, the way the operator came
 		self.Context_thread = []
-		self.cli_columns = os.get_terminal_size().columns
-		self.cli_lines = os.get_terminal_size().lines
+		#falls back to 80x24 when there is no terminal, e.g. a headless run with output piped
+		self.cli_columns = shutil.get_terminal_size().columns
+		self.cli_lines = shutil.get_terminal_size().lines
 		self.cli_line_top = int(0.2*self.cli_lines)
 		self.cli_line_middle = int(0.6*self.cli_lines)
 		self.cli_line_bottom = int(0.2*self.cli_lines)
+		#shown at the bottom of the screen, see option_lines
+		self.cli_options = ["<i>Input Scene ID", "<B>Back", "<A>Ancestor", "<Q>Exit", "<C>Clear", "<L>List", "<E>Stop EFX", "<S>Stop Logs", "<P>Pause Logs", "<R>Resume Logs", "<G>Seek Logs", "<O>Orphans", "<J>Jobs", "<X>:Clear Index", "</>Search", "<PgUp/PgDn/End>Scroll"]
 		self.title = 'Sandia Experiment Control System'
 		self.title_center = int(self.cli_columns*0.5 - len(self.title)*0.5)
 		self.disc_padding = int(3+len("Description:"))
 		self.desc_len = int(self.cli_columns-(2*self.disc_padding))
 		self.shutdown = False
 		self.Sys_Message = None
-		self.EFX_message_queue = queue.Queue()
-		self.Log_message_queue = queue.Queue()
-		self.Context_message_queue = queue.Queue()
-		self.Error_message_queue = queue.Queue()
+		#all messages go through one bus, errors first, see Message_Bus
+		self.Message_Bus = Message_Bus()
+		self.EFX_message_queue = self.Message_Bus.channel('EFX', 1, curses.COLOR_GREEN)
+		self.Log_message_queue = self.Message_Bus.channel('LOG', 2, curses.COLOR_YELLOW)
+		self.Context_message_queue = self.Message_Bus.channel('CONTEXT', 3, curses.COLOR_BLUE)
+		self.Error_message_queue = self.Message_Bus.channel('ERROR', 0, curses.COLOR_RED)
+		self.frame_rate = 20			#most redraws of the screen per second
+		self.frame_messages = 1000		#most messages printed per redraw, so a flood cannot hold up the screen
+		self.top_drawn = None
 		self.Index_queue = queue.Queue()
-		self.scroll_pos = self.cli_line_bottom
-		self.scroll_height = 100
+		self.scrollback_lines = 100000	#lines of messages kept for scrolling back
+		self.Scrollback = Scrollback(self.scrollback_lines, self.cli_columns - 3)
+		self.view_rows = self.cli_line_middle - 1
 		self.sys_log_name = 'ECS_Log'
-		self.sys_log_path = './' + self.sys_log_name + '.txt'
+		self.sys_log_path = './' + self.sys_log_name + '.jsonl'
+		self.journal_flush = 1.0			#most seconds a message waits to be written to the journal
+		self.journal_max_bytes = 64 << 20	#journal is rotated at this size
+		self.journal_backups = 9			#rotated journal files kept
+		self.Journal = None
+		self.stage_event = threading.Event()
+		self.prefetch_memory = 256 << 20
+		self.prefetch_connections = 16
+		self.Prefetcher = None
+		#Async_Effects_Agent runs every effect on one asyncio loop instead of a thread per agent, for scenes that fan out to large ranges
+		self.Effects_Backend = Async_Effects_Agent if async_effects else Effects_Agent
 	
 	def text_wrangler(self, pad, text, columns, rows, x, y, idx=0):
 		
@@ -645,13 +2986,26 @@ class Scenario_Engine(object):
 		return remainder
 
 
+	#what the top section shows, it is only redrawn when this changes
+	def top_state(self):
+		return (self.current_scene, str(self.scene_children), self.Scenario.stage_status, tuple(self.scene_path))
+
 	def Top_clr(self, Top_pad):
+		self.top_drawn = self.top_state()
 		Top_pad.clear()
 		Top_pad.border(0)
 		Top_pad.addstr(1,self.title_center,self.title,curses.A_UNDERLINE)
+		if self.Scenario.stage_status != None:
+			stage_text = self.Scenario.stage_status[:self.title_center-4]
+			Top_pad.addstr(1,self.cli_columns-(2+len(stage_text)),stage_text)
 		Top_pad.addstr(3,2,"Current Scene: {}".format(self.current_scene),curses.A_BOLD)
 		Scene_child_text = "Scene Children: {}".format(str(self.scene_children).strip("[]"))
 		Top_pad.addstr(3,self.cli_columns-(2+len(Scene_child_text)),Scene_child_text,curses.A_BOLD)
+		#the end of the path is the part that matters when it does not fit
+		path_text = " > ".join(self.scene_path)
+		if len(path_text) > self.cli_columns-10:
+			path_text = "..." + path_text[-(self.cli_columns-13):]
+		Top_pad.addstr(4,2,"Path: {}".format(path_text))
 		Top_pad.addstr(5,2,"Description:",curses.A_BOLD)
 
 		#print out the description
@@ -661,28 +3015,63 @@ class Scenario_Engine(object):
 
 	def mid_clr(self, Middle_pad):
 		Middle_pad.clear()
-		Middle_pad.scrollok(1)
 		Middle_pad.refresh(0,0,self.cli_line_top+1,0,self.cli_line_middle+self.cli_line_top-1,self.cli_columns-1)
+
+	#draw the part of the scrollback in view, with a note on the last row when it is not following the newest messages
+	def mid_draw(self, Mid_pad):
+		lines = self.Scrollback.view(self.view_rows)
+		Mid_pad.erase()
+		highlight = self.Scrollback.highlight
+		for row, (text, color) in enumerate(lines):
+			Mid_pad.addstr(row,2,text,curses.color_pair(color) | (curses.A_REVERSE if highlight != '' and highlight in text.lower() else 0))
+		if self.Scrollback.offset > 0:
+			note = " {} more lines below, <End> to follow ".format(self.Scrollback.offset)
+			Mid_pad.addstr(self.view_rows-1,max(self.cli_columns-2-len(note),0),note[:self.cli_columns-2],curses.A_REVERSE)
+		Mid_pad.refresh(0,0,self.cli_line_top+1,0,self.cli_line_middle+self.cli_line_top-1,self.cli_columns-1)
 	
+	#the option labels wrapped to the screen width, at most rows lines
+	#the first row inside the border is kept for messages and the prompt, so with fewer rows than the options need
+	#as many options as fit are shown followed by <?>Help, which lists them all
+	# columns : int, width of the screen
+	# rows : int, height of the bottom section, borders included
+	def option_lines(self, columns, rows):
+		rows = max(rows - 3, 1)
+		def wrap(options):
+			lines = [""]
+			for opt in options:
+				if lines[-1] != "" and len(lines[-1]) + 1 + len(opt) > columns - 4:
+					lines.append("")
+				lines[-1] = (lines[-1] + " " + opt).strip()
+			return lines
+		shown = len(self.cli_options)
+		lines = wrap(self.cli_options)
+		while len(lines) > rows and shown > 0:
+			shown -= 1
+			lines = wrap(self.cli_options[:shown] + ["<?>Help"])
+		return lines
+
 	def bot_clr(self, Bottom_pad):
+		opt_lines = self.option_lines(self.cli_columns, self.cli_line_bottom)
 		#define a function for clearing the bottom
 		def bot_wipe():
 			Bottom_pad.clear()
 			Bottom_pad.border(0)
-			opt_string = "<i>Input Scene ID <Q>Exit <C>Clear <L>List <E>Stop EFX <S>Stop Logs <X>:Clear Index"
-			centering_pad = int(((self.cli_columns - len(opt_string))/2)-1)
-			Bottom_pad.addstr(self.cli_line_bottom-2,centering_pad,opt_string,curses.A_STANDOUT)
+			#options go up from the bottom
+			for n, opt_string in enumerate(reversed(opt_lines)):
+				centering_pad = max(int(((self.cli_columns - len(opt_string))/2)-1), 1)
+				Bottom_pad.addstr(self.cli_line_bottom-2-n,centering_pad,opt_string[:self.cli_columns-2],curses.A_STANDOUT)
 		
 		bot_wipe()
 
 		if self.Sys_Message != None:
-			rem = self.text_wrangler( Bottom_pad, self.Sys_Message, self.cli_columns-2, self.cli_line_bottom-3, 1, 1)
+			text_rows = max(self.cli_line_bottom-2-len(opt_lines), 1)
+			rem = self.text_wrangler( Bottom_pad, self.Sys_Message, self.cli_columns-2, text_rows, 1, 1)
 			while rem > 0:
 				Bottom_pad.refresh(0,0,self.cli_line_middle+self.cli_line_top,0,self.cli_lines-1,self.cli_columns-1)
 				curses.noecho()
 				get_key = Bottom_pad.getch(1,1)
 				bot_wipe()
-				rem = self.text_wrangler( Bottom_pad, self.Sys_Message, self.cli_columns-2, self.cli_line_bottom-3, 1, 1, rem)
+				rem = self.text_wrangler( Bottom_pad, self.Sys_Message, self.cli_columns-2, text_rows, 1, 1, rem)
 		Bottom_pad.refresh(0,0,self.cli_line_middle+self.cli_line_top,0,self.cli_lines-1,self.cli_columns-1)
 
 	def mid_update_thread(self, Mid_pad, Top_pad, Bottom_pad):
@@ -692,84 +3081,226 @@ class Scenario_Engine(object):
 		curses.init_pair(curses.COLOR_YELLOW,curses.COLOR_YELLOW,curses.COLOR_BLACK)
 		curses.init_pair(curses.COLOR_RED,curses.COLOR_RED,curses.COLOR_BLACK)
 		
-		#Check if system log exists and create a new file if it exists already.
-		n = 1
-		while os.path.exists(self.sys_log_path):
-			self.sys_log_path = './' + self.sys_log_name + str(n) + '.txt'
-			n += 1
-		self.Error_message_queue.put("[!] Starting log file @ " + self.sys_log_path)
-		
-		system_log = open(self.sys_log_path, 'w')
+		self.start_journal()
+
+		#only the bottom section needs the cursor
+		Mid_pad.leaveok(True)
+		Top_pad.leaveok(True)
 
 		#define the method to print things to the screen
-		def Message_Printer(Message,color):
-			system_log.write(Message)
-			system_log.write('\n')
+		def Message_Printer(channel,Message,sent):
 			for i in Message.split('\n'):
-				if len(i) > (self.cli_columns - 3):
-					for n in range(int(len(i)/(self.cli_columns - 3)) + (len(i) % (self.cli_columns - 3) > 0)):
-						m = i[n*(self.cli_columns - 3):(n+1)*(self.cli_columns - 3)]
-						Mid_pad.addstr(self.cli_line_middle+self.cli_line_top-1,2,m,curses.color_pair(color))
-						Mid_pad.scroll(1)
-				else:
-					Mid_pad.addstr(self.cli_line_middle+self.cli_line_top-1,2,i,curses.color_pair(color))
-					Mid_pad.scroll(1)
-			Mid_pad.scroll(1)
-			Mid_pad.refresh(self.scroll_pos,0,self.cli_line_top+1,0,self.cli_line_middle+self.cli_line_top-1,self.cli_columns-1)
+				self.Scrollback.append(i, channel.color)
+			self.Scrollback.append('', channel.color)
 		
-		#start loop to capture messages from the queues and print them
+		#block until there is something to show, print everything that has come in, and redraw at most frame_rate times a second
+		#the bus is checked once a second when idle so staging progress still shows up in the top section
+		#scrolling wakes the bus so the new view is drawn here, this is the only thread that draws the middle section
+		last_frame = 0.0
 		while self.shutdown == False:
-			tag = False
-			while not self.EFX_message_queue.empty():
-				Message_Printer(self.EFX_message_queue.get(),curses.COLOR_GREEN)
-				tag = True
-
-			while not self.Log_message_queue.empty():
-				Message_Printer(self.Log_message_queue.get(),curses.COLOR_YELLOW)
-				tag = True
-			
-			while not self.Context_message_queue.empty():
-				Message_Printer(self.Context_message_queue.get(),curses.COLOR_BLUE)
-				tag = True
-
-			while not self.Error_message_queue.empty():
-				Message_Printer(self.Error_message_queue.get(),curses.COLOR_RED)
-				tag = True
+			item = self.Message_Bus.get(timeout=1.0)
+			printed = 0
+			while item != None:
+				Message_Printer(*item)
+				printed += 1
+				if printed >= self.frame_messages:
+					break
+				item = self.Message_Bus.get_nowait()
 
-			if tag:
-				tag = False
+			if self.Scrollback.dirty:
+				self.mid_draw(Mid_pad)
+			if self.top_state() != self.top_drawn:
 				self.Top_clr(Top_pad)
-				self.bot_clr(Bottom_pad)
-		
-		system_log.close()
 
-	def trash_man(self):
-		#I'm the trashman, I clean up dead threads
-		
-		while self.shutdown == False:
-			
-			for i in range(10):
-				if self.shutdown == False:
-					time.sleep(0.5)
-				else:
-					break
+			#hold off the next frame, messages sent meanwhile are drawn together
+			last_frame = max(last_frame + 1.0 / self.frame_rate, time.monotonic())
+			time.sleep(max(0.0, last_frame - time.monotonic()))
 
-			#clean up EFX trash
-			EFX_trash = []
-			for idx, EFX in enumerate(self.EFX_Commander_thread):
-				if EFX.Event.is_set(): #find trash
-					EFX_trash.append(idx)
-			for idx in sorted(EFX_trash, reverse=True):
-				del self.EFX_Commander_thread[idx] #throw trash around the ring
-			
-			#clean up Log trash
-			Log_trash = []
-			for idx, LOG in enumerate(self.Log_Controller_thread):
-				if LOG.Event.is_set():
-					Log_trash.append(idx)
-			for idx in sorted(Log_trash, reverse=True):
-				del self.Log_Controller_thread[idx]
 
+	def start_journal(self):
+		#Check if system log exists and create a new file if it exists already.
+		n = 1
+		while os.path.exists(self.sys_log_path):
+			self.sys_log_path = './' + self.sys_log_name + str(n) + '.jsonl'
+			n += 1
+		self.Error_message_queue.put("[!] Starting log file @ " + self.sys_log_path)
+		
+		self.Journal = Session_Journal(self.sys_log_path, self.journal_flush, max_bytes=self.journal_max_bytes, backups=self.journal_backups)
+		self.Journal.Start()
+		self.Message_Bus.journal_to(self.journal)
+
+	#messages are journaled under the scene that started their effect/log, or the current scene if they are not from one
+	def journal(self, channel, message, sent):
+		self.Journal.write(channel.source, channel.scene if channel.scene != None else self.current_scene, channel.ID, message, sent)
+
+	#messages are journaled as they are sent, so what is left on the bus is already in it
+	def close_journal(self):
+		if self.Journal == None:
+			return
+		self.Journal.Stop()
+
+	#make scene the current scene and start its effects and logs
+	#returns the Effects Agents and Log Controllers started, and how many effects/logs could not be started
+	#a child of the current scene adds to scene_path and a scene already on it goes back along it,
+	#anything else starts the path over as the shortest way to the scene from the root
+	# scene : string, scene ID
+	# path_index : int, go back to this point on scene_path instead, for Back/Ancestor; scene is the one there
+	def Start_Scene(self, scene, path_index=None):
+		workers = []
+		errors = 0
+		if path_index != None:
+			del self.scene_path[path_index+1:]
+		elif scene in self.Scenario.Graph.children.get(self.current_scene, []):
+			self.scene_path.append(scene)
+		elif scene in self.scene_path:
+			del self.scene_path[self.scene_path.index(scene)+1:]
+		else:
+			self.scene_path = list(self.Scenario.Graph.path(scene))
+		self.current_scene = scene
+		self.scene_children = self.Scenario.Scenario[self.current_scene]['scene_children']
+		#EFX - Parsing for effects related to scene and creating threads based on them
+		for i in self.Scenario.Scenario[self.current_scene]['effects']:
+			if not (i == None or i == 'None'):
+				#run EFX threads
+				try:
+					workers.append(self.Effects_Backend(self.Scenario,i,self.EFX_message_queue.tag(i, self.current_scene), self.Error_message_queue.tag(i, self.current_scene)))
+					workers[-1].Run()
+				except Exception as e:
+					self.Error_message_queue.tag(i, self.current_scene).put("[!] Could not start effect {}: {}".format(i, e))
+					errors += 1
+				#holding space for running Log threads and Context threads
+		#LOG - Grab log files and send in separate threads
+		for i in self.Scenario.Scenario[self.current_scene]['logs']:
+			if not (i == None or i == 'None'):
+				#send accoring to Log Controller configuration, can change time_option, index if needed later
+				try:
+					workers.append(Log_Controller(self.Scenario,i,self.Log_message_queue.tag(i, self.current_scene), self.Error_message_queue.tag(i, self.current_scene), self.Index_queue))
+					workers[-1].Run()
+				except Exception as e:
+					self.Error_message_queue.tag(i, self.current_scene).put("[!] Could not start log {}: {}".format(i, e))
+					errors += 1
+		#TODO::CONTEXT
+		#get the next possible scenes ready
+		if self.Prefetcher != None:
+			self.Prefetcher.Warm(self.current_scene)
+		return workers, errors
+
+	#stop everything the session started, running effects are stopped on their agents too
+	def Shutdown(self):
+		self.shutdown = True
+		self.Message_Bus.wake()
+		self.stage_event.set()
+		if self.Prefetcher != None:
+			self.Prefetcher.Stop()
+		Jobs.stop_all()
+		Jobs.shutdown()
+		ELK_Connections.close()
+		SSH_Connections.close()
+
+	#run the scenes of a timeline without the curses interface, print every message, and summarize how each scene went
+	#scenes start on the same effects and log machinery as the CLI, messages are journaled as in the CLI too
+	# timeline : list of (offset, scene), seconds after the start to start each scene, see read_timeline
+	# out : file messages and the summary are written to
+	# json_lines : bool, write messages as journal records and the summary as one record instead of text
+	# timeout : float, seconds after the last scene starts to wait for everything to finish before stopping it, None waits
+	# returns the number of scenes that had an effect or log fail, or did not finish
+	def Headless(self, timeline, out=sys.stdout, json_lines=False, timeout=None):
+		self.start_journal()
+
+		def printer():
+			while True:
+				item = self.Message_Bus.get(timeout=1.0)
+				while item != None:
+					channel, message, sent = item
+					scene = channel.scene if channel.scene != None else self.current_scene
+					if json_lines:
+						out.write(self.Journal.record(channel.source, scene, channel.ID, message, sent))
+					else:
+						stamp = time.strftime("%H:%M:%S", time.localtime(sent))
+						ID = channel.ID if channel.ID != None else '-'
+						for line in message.split('\n'):
+							out.write("{} {} {} {} {}\n".format(stamp, channel.source, scene, ID, line))
+					item = self.Message_Bus.get_nowait()
+				out.flush()
+				if self.shutdown and self.Message_Bus.empty():
+					break
+		printer_thread = threading.Thread(target=printer, daemon=True)
+		printer_thread.start()
+
+		stage_thread = threading.Thread(target=self.Scenario.Stage_Logs, args=[self.stage_event], daemon=True)
+		stage_thread.start()
+		self.Prefetcher = Scene_Prefetcher(self.Scenario, self.Error_message_queue, self.prefetch_memory, self.prefetch_connections)
+		self.Prefetcher.Warm(self.current_scene)
+
+		#one entry per timeline line, times are seconds after the start
+		#threads that end because the run was stopped do not count as the scene finishing
+		runs = []
+		lock = threading.Lock()
+		stopping = threading.Event()
+		def finished(run, future):
+			with lock:
+				run['pending'] -= 1
+				if run['pending'] == 0 and not stopping.is_set():
+					run['end'] = time.monotonic() - start
+
+		start = time.monotonic()
+		try:
+			for offset, scene in timeline:
+				time.sleep(max(0.0, start + offset - time.monotonic()))
+				began = time.monotonic()
+				run = {'offset':offset, 'scene':scene, 'start':began - start, 'trigger':0.0, 'end':None, 'workers':[], 'errors':0, 'pending':0}
+				self.Error_message_queue.put("[!] Timeline starting scene {} at {:.3f}s".format(scene, run['start']))
+				run['workers'], run['errors'] = self.Start_Scene(scene)
+				run['trigger'] = time.monotonic() - began
+				futures = [future for worker in run['workers'] for future in worker.futures]
+				run['pending'] = len(futures)
+				if len(futures) == 0:
+					run['end'] = run['start'] + run['trigger']
+				for future in futures:
+					future.add_done_callback(lambda future, run=run: finished(run, future))
+				runs.append(run)
+			futures = [future for run in runs for worker in run['workers'] for future in worker.futures]
+			done, not_done = concurrent.futures.wait(futures, timeout)
+			if len(not_done) != 0:
+				self.Error_message_queue.put("[!] Timeline timed out with {} effect/log threads still running, stopping them".format(len(not_done)))
+		except KeyboardInterrupt:
+			self.Error_message_queue.put("[!] Timeline interrupted, stopping")
+
+		stopping.set()
+		self.Shutdown()
+		printer_thread.join()
+		self.close_journal()
+
+		failures = 0
+		rows = []
+		for run in runs:
+			failed = run['errors'] + sum(1 for worker in run['workers'] if getattr(worker, 'failed', False) or any(future.done() and not future.cancelled() and future.exception() != None for future in worker.futures))
+			if failed > 0 or run['end'] == None:
+				failures += 1
+			rows.append({
+				'scene':run['scene'],
+				'offset':run['offset'],
+				'lag':round(run['start'] - run['offset'], 3),
+				'trigger_ms':round(run['trigger'] * 1000, 1),
+				'effects':sum(1 for worker in run['workers'] if isinstance(worker, Effects_Agent)),
+				'logs':sum(1 for worker in run['workers'] if isinstance(worker, Log_Controller)),
+				'finished':round(run['end'] - run['start'], 3) if run['end'] != None else None,
+				'docs':sum(getattr(worker, 'docs_sent', 0) for worker in run['workers']),
+				'MB':round(sum(getattr(worker, 'bytes_sent', 0) for worker in run['workers']) / 1048576, 2),
+				'failed':failed})
+
+		if json_lines:
+			out.write(json.dumps({'summary':rows, 'scenes':len(rows), 'failures':failures, 'elapsed':round(time.monotonic() - start, 3)}) + '\n')
+		else:
+			out.write("\nScene timings (seconds after start / after the scene started):\n")
+			out.write("{:<12} {:>8} {:>7} {:>10} {:>4} {:>4} {:>9} {:>10} {:>8} {:>6}\n".format('scene', 'offset', 'lag', 'trigger ms', 'efx', 'log', 'finished', 'docs', 'MB', 'failed'))
+			for row in rows:
+				out.write("{:<12} {:>8.3f} {:>7.3f} {:>10.1f} {:>4} {:>4} {:>9} {:>10} {:>8.2f} {:>6}\n".format(
+					str(row['scene']), row['offset'], row['lag'], row['trigger_ms'], row['effects'], row['logs'],
+					'{:.3f}'.format(row['finished']) if row['finished'] != None else 'no', row['docs'], row['MB'], row['failed']))
+			out.write("{} scenes, {} with failures, {:.3f}s\n".format(len(rows), failures, time.monotonic() - start))
+		out.flush()
+		return failures
 
 	def CLI(self):
 		#user interface system
@@ -787,8 +3318,9 @@ class Scenario_Engine(object):
 
 		#generate pads
 		Top_pad = curses.newpad(self.cli_line_top,self.cli_columns)
-		Middle_pad = curses.newpad(self.scroll_height,self.cli_columns)
+		Middle_pad = curses.newpad(self.view_rows+1,self.cli_columns)
 		Bottom_pad = curses.newpad(self.cli_line_bottom,self.cli_columns)
+		Bottom_pad.keypad(True)
 		
 		#clear out the screen
 		self.Top_clr(Top_pad)
@@ -799,9 +3331,13 @@ class Scenario_Engine(object):
 		mid_thread = threading.Thread(target=self.mid_update_thread,args=[Middle_pad, Top_pad, Bottom_pad], daemon=True)
 		mid_thread.start()
 
-		#trashman thread start
-		trash_man_thread = threading.Thread(target=self.trash_man, daemon=True)
-		trash_man_thread.start()
+		#stage the log files in the background so scenes can send them right away
+		stage_thread = threading.Thread(target=self.Scenario.Stage_Logs, args=[self.stage_event], daemon=True)
+		stage_thread.start()
+
+		#warm up whatever the first scene can lead to
+		self.Prefetcher = Scene_Prefetcher(self.Scenario, self.Error_message_queue, self.prefetch_memory, self.prefetch_connections)
+		self.Prefetcher.Warm(self.current_scene)
 
 		#Start defining function calls that the user can make
 		def Exit():
@@ -812,11 +3348,7 @@ class Scenario_Engine(object):
 			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8")
 
 			if selection.lower() == 'y' or selection.lower() == 'yes':
-				self.shutdown = True
-				for i in self.EFX_Commander_thread:
-					i.Stop()
-				for i in self.Log_Controller_thread:
-					i.Stop()
+				self.Shutdown()
 			else:
 				self.Sys_Message = None
 				curses.noecho()
@@ -832,65 +3364,125 @@ class Scenario_Engine(object):
 			self.Sys_Message = 'List of all Scene Options: \n{}\n\nList of all Effects Options: \n{}'.format(str(list(self.Scenario.Scenario.keys())).strip("[]"),str(list(self.Scenario.Effects.keys())).strip("[]"))
 			self.bot_clr(Bottom_pad)
 
-		def Kill_EFX():
-			Efx_threads = [str(i.EFX_ID) for i in self.EFX_Commander_thread]
-			Efx_threads_low = [i.lower() for i in Efx_threads]
-			if len(Efx_threads) != 0:
-				self.Sys_Message = "Select EFX Threads to kill (or all): \n {}".format(str(Efx_threads).strip("[]"))
+		#ask which live jobs of a kind to stop, jobs take themselves off Jobs once they are stopped
+		# kind : string, EFX or LOG
+		# label : string, what a job is called in messages
+		# name : string, what the jobs are called together in messages
+		def Kill_Jobs(kind, label, name):
+			jobs = Jobs.live(kind)
+			if len(jobs) != 0:
+				self.Sys_Message = "Select {} Threads to kill (or all): \n {}".format(label, "\n ".join("{}: {}".format(job['ID'], Jobs.state(job)) for job in jobs))
 				self.bot_clr(Bottom_pad)
 
 				curses.echo()
 				selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8")
 				
 				if selection.lower() == 'all':
-					self.Sys_Message = "Ending Effects"
+					self.Sys_Message = "Ending {}".format(name)
 					self.bot_clr(Bottom_pad)
-					for i in self.EFX_Commander_thread:
-						i.Stop()
-					self.EFX_Commander_thread = []
+					for job in jobs:
+						Jobs.stop(job)
 					self.bot_clr(Bottom_pad)
-				elif selection.lower() in Efx_threads_low:
-					death_note = [i for i, e in enumerate(Efx_threads_low) if e == selection.lower() ]
-					for i in death_note:
-						self.EFX_Commander_thread[i].Stop()
-					for idx in sorted(death_note, reverse=True):
-						del self.EFX_Commander_thread[idx]
-					self.Sys_Message = "Killing EFX: {}".format(selection)	
+				elif selection.lower() in [str(job['ID']).lower() for job in jobs]:
+					for job in jobs:
+						if str(job['ID']).lower() == selection.lower():
+							Jobs.stop(job)
+					self.Sys_Message = "Killing {}: {}".format(label, selection)
 					self.bot_clr(Bottom_pad)
 
 			else:
-				self.Sys_Message = "No EFX Threads to kill"
+				self.Sys_Message = "No {} Threads to kill".format(label)
 				self.bot_clr(Bottom_pad)
 
+		def Kill_EFX():
+			Kill_Jobs('EFX', "EFX", "Effects")
+
 		def Kill_Log_Controller():
-			Log_threads = [str(i.Log_ID) for i in self.Log_Controller_thread]
-			Log_threads_low = [i.lower() for i in Log_threads]
-			if len(Log_threads) != 0:
-				self.Sys_Message = "Select Log Threads to kill (or all): \n {}".format(str(Log_threads).strip("[]"))
+			Kill_Jobs('LOG', "Log", "Logs")
+
+		#every option, for when the screen is too small to show them all
+		def Help():
+			self.Sys_Message = "Options:\n {}".format("\n ".join(self.cli_options))
+			self.bot_clr(Bottom_pad)
+
+		#what every job is doing, and how the last ones to finish ended
+		def Job_Status():
+			lines = Jobs.Status()
+			self.Sys_Message = "Jobs:\n {}".format("\n ".join(lines)) if len(lines) != 0 else "No Jobs"
+			self.bot_clr(Bottom_pad)
+
+		#ask which running log threads to act on, returns the chosen Log Controllers
+		def Log_select(action):
+			Log_threads = [job['worker'] for job in Jobs.live('LOG') if not job['worker'].Event.is_set()]
+			if len(Log_threads) == 0:
+				self.Sys_Message = "No Log Threads to {}".format(action)
 				self.bot_clr(Bottom_pad)
+				return []
+			self.Sys_Message = "Select Log Threads to {} (or all): \n {}".format(action, "\n ".join("{}: {}".format(i.Log_ID, i.Status()) for i in Log_threads))
+			self.bot_clr(Bottom_pad)
 
-				curses.echo()
-				selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8")
-				
-				if selection.lower() == 'all':
-					self.Sys_Message = "Ending Logs"
-					self.bot_clr(Bottom_pad)
-					for i in self.Log_Controller_thread:
-						i.Stop()
-					self.Log_Controller_thread = []
-					self.bot_clr(Bottom_pad)
-				elif selection.lower() in Log_threads_low:
-					death_note = [i for i, e in enumerate(Log_threads_low) if e == selection.lower() ]
-					for i in death_note:
-						self.Log_Controller_thread[i].Stop()
-					for idx in sorted(death_note, reverse=True):
-						del self.Log_Controller_thread[idx]
-					self.Sys_Message = "Killing Logs: {}".format(selection)	
-					self.bot_clr(Bottom_pad)
+			curses.echo()
+			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8")
+			if selection.lower() == 'all':
+				return Log_threads
+			return [i for i in Log_threads if str(i.Log_ID).lower() == selection.lower()]
+
+		def Pause_Log_Controller():
+			chosen = Log_select("pause")
+			for i in chosen:
+				i.Pause()
+			if len(chosen) != 0:
+				self.Sys_Message = "Pausing Logs: {}".format(", ".join(str(i.Log_ID) for i in chosen))
+				self.bot_clr(Bottom_pad)
 
-			else:
-				self.Sys_Message = "No Log Threads to kill"
+		def Resume_Log_Controller():
+			chosen = Log_select("resume")
+			for i in chosen:
+				i.Resume()
+			if len(chosen) != 0:
+				self.Sys_Message = "Resuming Logs: {}".format(", ".join(str(i.Log_ID) for i in chosen))
+				self.bot_clr(Bottom_pad)
+
+		def Seek_Log_Controller():
+			chosen = Log_select("seek")
+			if len(chosen) == 0:
+				return
+			self.Sys_Message = "Seconds into the logs to seek to (+N / -N to move from the current position)"
+			self.bot_clr(Bottom_pad)
+
+			curses.echo()
+			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8").strip()
+			try:
+				seconds = float(selection)
+			except ValueError:
+				self.Sys_Message = "Not a number of seconds: {}".format(selection)
 				self.bot_clr(Bottom_pad)
+				return
+			for i in chosen:
+				i.Seek(seconds, selection.startswith(('+', '-')))
+			self.Sys_Message = "Seeking Logs: {}".format(", ".join(str(i.Log_ID) for i in chosen))
+			self.bot_clr(Bottom_pad)
+
+		#look for effect processes left running on the agents of the scenario, in the background
+		def Orphans():
+			self.Sys_Message = "Check agents for orphaned effect processes: (R)eport or (K)ill them? (r/k/N)"
+			self.bot_clr(Bottom_pad)
+
+			curses.echo()
+			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8").strip().lower()
+			if not selection in ['r', 'k']:
+				self.Sys_Message = None
+				self.bot_clr(Bottom_pad)
+				return
+			agents = {}
+			for i in self.Scenario.Effects.keys():
+				agent_ip, username, password = Effects_Agent.settings(self.Scenario, i)[:3]
+				for key, secret in zip(zip(agent_ip, username), password):
+					agents.setdefault(key, secret)
+			reaper = threading.Thread(target=Effect_Processes.reap, args=[agents, lambda message: self.Error_message_queue.put('[+] ' + message), selection == 'k'], daemon=True)
+			reaper.start()
+			self.Sys_Message = "Checking {} agents for orphaned effect processes".format(len(agents))
+			self.bot_clr(Bottom_pad)
 
 		#we have to convert the names of scenario IDs to all lower case and zip into a dict
 		#this is so we dont have case-sensitivity with input IDs cause its super annoying
@@ -898,6 +3490,44 @@ class Scenario_Engine(object):
 		Lower_keys = [x.lower() for x in Scenario_keys]
 		Selection_keys = dict(zip(Lower_keys,Scenario_keys))
 
+		def Run_Scene(scene, path_index=None):
+			self.Start_Scene(scene, path_index)
+			self.Top_clr(Top_pad)
+			self.bot_clr(Bottom_pad)
+
+		#run the scene before the current one on the path, the parent it was reached from
+		def Back():
+			if len(self.scene_path) < 2:
+				self.Sys_Message = "Scene {} has no parent to go back to".format(self.current_scene)
+				self.bot_clr(Bottom_pad)
+				return
+			Run_Scene(self.scene_path[-2], len(self.scene_path)-2)
+
+		#run any scene on the path back to the root, picked by its ID or by its place on the path as #N
+		#a scene that is on the path more than once is taken from nearest the current scene
+		def Ancestor():
+			ancestors = self.scene_path[:-1]
+			if len(ancestors) == 0:
+				self.Sys_Message = "Scene {} has no ancestors to jump to".format(self.current_scene)
+				self.bot_clr(Bottom_pad)
+				return
+			self.Sys_Message = "Select ancestor scene to jump to (scene ID, or #N for its place on the path): \n {}".format("\n ".join("#{}: {}".format(n, i) for n, i in enumerate(ancestors)))
+			self.bot_clr(Bottom_pad)
+
+			curses.echo()
+			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8").strip()
+			by_id = [n for n, i in enumerate(ancestors) if i.lower() == selection.lower()]
+			if selection.startswith('#') and selection[1:].isdigit() and int(selection[1:]) < len(ancestors):
+				Run_Scene(ancestors[int(selection[1:])], int(selection[1:]))
+			elif len(by_id) != 0:
+				Run_Scene(ancestors[by_id[-1]], by_id[-1])
+			elif selection != '':
+				self.Sys_Message = "Not an ancestor of {}: {}".format(self.current_scene, selection)
+				self.bot_clr(Bottom_pad)
+				return
+			self.Sys_Message = None
+			self.bot_clr(Bottom_pad)
+
 		def index_select():
 			self.Sys_Message = "Input Scene ID"
 			self.bot_clr(Bottom_pad)
@@ -906,24 +3536,7 @@ class Scenario_Engine(object):
 			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8")
 			
 			if selection.lower() in Selection_keys.keys():
-				self.current_scene = Selection_keys[selection.lower()]
-				self.scene_children = self.Scenario.Scenario[self.current_scene]['scene_children']
-				self.Top_clr(Top_pad)
-				self.bot_clr(Bottom_pad)
-				#EFX - Parsing for effects related to scene and creating threads based on them
-				for i in self.Scenario.Scenario[self.current_scene]['effects']:
-					if not (i == None or i == 'None'):
-						#run EFX threads
-						self.EFX_Commander_thread.append(Effects_Agent(self.Scenario,i,self.EFX_message_queue, self.Error_message_queue))
-						self.EFX_Commander_thread[-1].Run()
-						#holding space for running Log threads and Context threads
-				#LOG - Grab log files and send in separate threads
-				for i in self.Scenario.Scenario[self.current_scene]['logs']:
-					if not (i == None or i == 'None'):
-						#send accoring to Log Controller configuration, can change time_option, index if needed later
-						self.Log_Controller_thread.append(Log_Controller(self.Scenario,i,self.Log_message_queue, self.Error_message_queue, self.Index_queue))
-						self.Log_Controller_thread[-1].Run()
-				#TODO::CONTEXT
+				Run_Scene(Selection_keys[selection.lower()])
 			else:
 					self.Sys_Message = "Not an option try again."
 					self.Top_clr(Top_pad)
@@ -939,14 +3552,58 @@ class Scenario_Engine(object):
 			curses.echo()
 			selection = stdscr.getstr(self.cli_lines-3,1).decode(encoding="utf-8")
 			if selection != None and selection != "":
-				self.Log_Controller_thread.append(Log_Controller(self.Scenario,list(self.Scenario.Logs.keys())[0],self.Log_message_queue, self.Error_message_queue, self.Index_queue))
-				self.Log_Controller_thread[-1].Clear_Thread(selection.split()[0])
+				Log_Controller(self.Scenario,list(self.Scenario.Logs.keys())[0],self.Log_message_queue, self.Error_message_queue, self.Index_queue).Clear_Thread(selection.split()[0])
 			
 			self.Sys_Message = None
 			self.bot_clr(Bottom_pad)
 
+		#incremental search back through the messages, the view jumps to the newest match as the search is typed
+		#<Up>/<Down> go to the previous/next match, <Enter> stays there, <Esc> goes back to where the search started
+		def Search():
+			start = self.Scrollback.offset
+			text = ''
+			match = None
+			while True:
+				self.Sys_Message = "Search: {}{}".format(text, "" if text == '' or match != None else "   (not found)")
+				self.bot_clr(Bottom_pad)
+				key = Bottom_pad.getch(1,1)
+				if key in (curses.KEY_ENTER, 10, 13):
+					break
+				elif key == 27:
+					self.Scrollback.search('')
+					self.Scrollback.jump(start)
+					break
+				elif key in (curses.KEY_BACKSPACE, 8, 127):
+					text = text[:-1]
+					match = self.Scrollback.search(text, start)
+				elif key == curses.KEY_UP and match != None:
+					older = self.Scrollback.search(text, match + 1)
+					match = older if older != None else match
+				elif key == curses.KEY_DOWN and match != None:
+					newer = self.Scrollback.search(text, match, True)
+					match = newer if newer != None else match
+				elif 32 <= key < 256:
+					text += chr(key)
+					match = self.Scrollback.search(text, match if match != None else start)
+				if match != None:
+					self.Scrollback.jump(max(match - self.view_rows // 2, 0))
+				self.Message_Bus.wake()
+			self.Sys_Message = None
+			self.bot_clr(Bottom_pad)
+			self.Message_Bus.wake()
+
+		#keys that move the message view
+		Scroll_keys = {
+			curses.KEY_UP: lambda: self.Scrollback.scroll(1),
+			curses.KEY_DOWN: lambda: self.Scrollback.scroll(-1),
+			curses.KEY_PPAGE: lambda: self.Scrollback.scroll(self.view_rows - 1),
+			curses.KEY_NPAGE: lambda: self.Scrollback.scroll(1 - self.view_rows),
+			curses.KEY_HOME: lambda: self.Scrollback.scroll(self.scrollback_lines),
+			curses.KEY_END: self.Scrollback.end,
+		}
+
 		#define the options and attach to keys
-		Options_keys = { 'i':index_select, 'c':Clear, 'l':List, 'e':Kill_EFX, 's':Kill_Log_Controller, 'x':clear_index, 'q':Exit }
+		Options_keys = { '/':Search,  'i':index_select, 'b':Back, 'a':Ancestor, 'c':Clear, 'l':List, 'e':Kill_EFX, 's':Kill_Log_Controller, 'p':Pause_Log_Controller, 'r':Resume_Log_Controller, 'g':Seek_Log_Controller, 'o':Orphans, 'j':Job_Status, 'x':clear_index, 'q':Exit, '?':Help }
 
 
 		try:
@@ -958,15 +3615,11 @@ class Scenario_Engine(object):
 				self.Sys_Message = None
 				self.bot_clr(Bottom_pad)
 
-				if get_key == curses.KEY_DOWN and self.scroll_pos < self.scroll_height - self.cli_line_middle:
-					self.scroll_pos += 1
-					Middle_pad.refresh(self.scroll_pos,0,self.cli_line_top+1,0,self.cli_line_middle+self.cli_line_top-1,self.cli_columns-1)
+				if get_key in Scroll_keys:
+					Scroll_keys[get_key]()
+					self.Message_Bus.wake()
 
-				if get_key == curses.KEY_UP and self.scroll_pos > 0:
-					self.scroll_pos -= 1
-					Middle_pad.refresh(self.scroll_pos,0,self.cli_line_top+1,0,self.cli_line_middle+self.cli_line_top-1,self.cli_columns-1)
-
-				if chr(get_key) in Options_keys:
+				elif chr(get_key) in Options_keys:
 					Options_keys[chr(get_key)]()
 
 							
@@ -974,10 +3627,11 @@ class Scenario_Engine(object):
 			sys.stderr.write(str(e))
 			sys.stderr.write(traceback.format_exc())
 			curses.endwin()
-			self.shutdown = True
+			#the job pools do not run as daemons, stop what is running so the ECS can exit
+			self.Shutdown()
 
 		mid_thread.join()
-		trash_man_thread.join()
+		self.close_journal()
 		curses.endwin()
 	
 #handy input prompter with prefilled value
@@ -988,23 +3642,86 @@ def rlinput(prompt, prefill=''):
 	finally:
 		readline.set_startup_hook()
 
+#read a timeline for a headless run, one scene per line as "<seconds after the start> <scene ID>"
+#the two can be split by spaces, tabs or a comma, anything after a # is a comment
+# path : string, timeline file
+# scenes : iterable of scene IDs in the scenario, IDs in the file are matched to them ignoring case
+# returns list of (offset, scene) in the order they start, raises ValueError on a bad line or unknown scene
+def read_timeline(path, scenes):
+	names = {str(scene).lower(): scene for scene in scenes if scene != 'None'}
+	timeline = []
+	with open(path, 'r') as f:
+		for number, line in enumerate(f, 1):
+			line = line.split('#', 1)[0].replace(',', ' ').split()
+			if len(line) == 0:
+				continue
+			if len(line) != 2:
+				raise ValueError("{} line {}: expected <offset> <scene>".format(path, number))
+			try:
+				offset = float(line[0])
+			except ValueError:
+				raise ValueError("{} line {}: offset {} is not a number".format(path, number, line[0]))
+			if offset < 0:
+				raise ValueError("{} line {}: offset can't be negative".format(path, number))
+			if not line[1].lower() in names:
+				raise ValueError("{} line {}: scene {} is not in the scenario".format(path, number, line[1]))
+			timeline.append((offset, names[line[1].lower()]))
+	#sort keeps lines with the same offset in file order
+	timeline.sort(key=lambda entry: entry[0])
+	return timeline
+
 if __name__ == "__main__":
 	#main program
 	#check if on windows, suggest fix
 	if os.name == 'nt':
 		print("Windows sucks, get a better operating system...")
 		sys.exit("Bad OS")
+	parser = argparse.ArgumentParser(description='Sandia Experiment Control System')
+	parser.add_argument('-q', '--quick', action='store_true', help="Skip parsing the log files and configs when validating the scenario, only check they exist.")
+	parser.add_argument('--probe', action='store_true', help="Also check every elastic and effect agent in the scenario can be reached when validating.")
+	parser.add_argument('-f', '--file', help="Scenario xlsx file to use instead of asking for one.")
+	parser.add_argument('--timeline', help="Run headless: start the scenes listed in this file at their offsets, print the messages, and exit with a summary of the scene timings.")
+	parser.add_argument('--json', action='store_true', help="Headless runs print messages and the summary as JSON lines.")
+	parser.add_argument('--timeout', type=float, default=None, help="Headless runs stop whatever is still running this many seconds after the last scene starts.")
+	parser.add_argument('--async-effects', action='store_true', help="Run every effect on one asyncio event loop instead of a thread per agent, for scenes that fan out to large ranges.")
+	parser.add_argument('--effect-threads', type=int, default=None, help="Most threads running effects at once, one per agent of an effect (default 64).")
+	parser.add_argument('--log-threads', type=int, default=None, help="Most threads sending logs at once, not counting logs trickled out in real time (default 32).")
+	args = parser.parse_args()
+	for kind, threads in (('EFX', args.effect_threads), ('LOG', args.log_threads)):
+		if threads != None:
+			Jobs.limits[kind] = max(threads, 1)
+
+	#headless runs never prompt, a bad scenario or timeline just exits
+	if args.timeline != None:
+		if args.file == None:
+			sys.exit("--timeline needs the scenario given with --file")
+		#keep stdout to the JSON lines when asked for them
+		try:
+			with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+				Scenario = Scenario_Data(args.file, not args.quick, args.probe)
+		except Exception as e:
+			sys.exit("Scenario Data Error: "+ str(e))
+		if Scenario.Scenario_valid != 0:
+			sys.exit(1)
+		try:
+			timeline = read_timeline(args.timeline, Scenario.Scenario.keys())
+		except (OSError, ValueError) as e:
+			sys.exit("Timeline Error: " + str(e))
+		Engine = Scenario_Engine(Scenario, args.async_effects)
+		failures = Engine.Headless(timeline, sys.stdout, args.json, args.timeout)
+		sys.exit(1 if failures > 0 else 0)
+
 	#check for xlsx files around CWD
 	files = [f for f in os.listdir('.') if os.path.isfile(f) and f.endswith('.xlsx')]
 	#ask for input on which file to use
-	Scenario_file = rlinput("Enter Scenario File: ", files[0])
+	Scenario_file = args.file if args.file != None else rlinput("Enter Scenario File: ", files[0])
 	
 	#make sure the file exists, is readable, and has the right extension
 	check = False
 	if os.path.exists(Scenario_file) and os.access(Scenario_file, os.R_OK) and Scenario_file.endswith('.xlsx'):
 		check = True
 		try:
-			Scenario = Scenario_Data(Scenario_file)
+			Scenario = Scenario_Data(Scenario_file, not args.quick, args.probe)
 		except Exception as e:
 			print("Scenario Data Error: "+ str(e))
 			check = False
@@ -1016,13 +3733,13 @@ if __name__ == "__main__":
 		if os.path.exists(Scenario_file) and os.access(Scenario_file, os.R_OK) and Scenario_file.endswith('.xlsx'):
 			check = True
 			try:
-				Scenario = Scenario_Data(Scenario_file)
+				Scenario = Scenario_Data(Scenario_file, not args.quick, args.probe)
 			except Exception as e:
 				print("Scenario Data Error: "+ str(e))
 				check = False
 			if Scenario.Scenario_valid != 0:
 				check = False
 
-	Engine = Scenario_Engine(Scenario)
+	Engine = Scenario_Engine(Scenario, args.async_effects)
 	Engine.CLI()
 
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 National Technology & Engineering Solutions of Sandia, LLC (NTESS). 
+# Under the terms of Contract DE-NA0003525 with NTESS, the U.S. Government retains 
+# certain rights in this software.
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+#json decoding shared by the Scenario Engine and the toolkit, kept free of anything outside the standard library
+#so toolkit/standalone_log_controller.py still runs on a box with only requests installed
+
+import json
+import re
+
+#decode json documents out of a log file one at a time, reading it in chunks
+#this is needed because logstash sometimes (always) does not use newlines between logs in a sensible manner
+#documents are decoded in place with an offset into the buffer so long lines are not re-sliced after every document
+# fileobj : open text file, logstash output to file using json plugin
+# event : threading.Event, stops the stream when set
+# read_chunk : int, characters read at a time
+# max_doc : int, most characters one document can take; past that the input is taken as malformed instead of reading on to the end of the file
+def stream_json(fileobj, event=None, read_chunk=1 << 20, max_doc=64 << 20):
+	decoder = json.JSONDecoder()
+	whitespace = re.compile(r'[ \t\n\r]*')
+	buf = ''
+	pos = 0
+	eof = False
+	while event is None or not event.is_set():
+		pos = whitespace.match(buf, pos).end()
+		if pos == len(buf) and eof:
+			return
+		try:
+			curr_log, end = decoder.raw_decode(buf, pos)
+			#a number at the very end of the buffer may have been cut off by the chunk boundary
+			if end == len(buf) and not eof:
+				raise json.JSONDecodeError("Document may continue in next chunk", buf, end)
+		except json.JSONDecodeError:
+			if eof:
+				raise
+			if len(buf) - pos > max_doc:
+				raise json.JSONDecodeError("No document ends within {} characters".format(max_doc), buf, pos)
+			#grow the read to at least the size of the unfinished document so huge documents stay linear
+			more = fileobj.read(max(read_chunk, len(buf) - pos))
+			eof = (more == '')
+			buf = buf[pos:] + more
+			pos = 0
+			continue
+		pos = end
+		#edge case where an empty string ends up in there
+		if curr_log != "":
+			yield curr_log
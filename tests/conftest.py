@@ -0,0 +1,62 @@
+import os
+import queue
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import Scenario_engine_cursesier as ECS
+
+
+class Fake_Scenario(object):
+	#just what a Log_Controller reads from Scenario_Data
+	def __init__(self, log_file, conf_file, cache_dir, time_option='None', payload=None):
+		self.cache_dir = cache_dir
+		self.payload = payload
+		self.Logs = {'test':{'log_file':[log_file], 'config_file':[conf_file], 'log_index':['None'], 'log_time':[time_option]}}
+
+	def get_payload(self, Log_ID):
+		return self.payload
+
+
+#write documents one per line, as logstash's json output does
+def write_logs(path, logs):
+	import json
+	with open(path, 'w') as f:
+		for log in logs:
+			f.write(json.dumps(log) + '\n')
+	return str(path)
+
+
+#swap a Log_Controller's send_batch for one that notes what was sent and when, instead of posting to elastic
+#returns the list it appends (seconds since the call, list of documents) to for every batch
+def record_sends(controller, on_send=None):
+	import json
+	import time
+	start = time.monotonic()
+	sent = []
+	def send_batch(stats, body, count, index, progress):
+		sent.append((time.monotonic() - start, [json.loads(line) for line in body.split(b'\n')[1::2]]))
+		with stats['lock']:
+			stats['batches'] += 1
+			stats['sent'] += count
+		if on_send != None:
+			on_send(sent)
+	controller.send_batch = send_batch
+	return sent
+
+
+#Log_Controller built from a .conf in tmp_path, extra settings go in the [ELK] section
+@pytest.fixture
+def make_controller(tmp_path):
+	def make(log_file, time='no_update', delay=False, payload=None, **settings):
+		conf_file = tmp_path / 'test.conf'
+		lines = ['[ELK]', 'ip = 127.0.0.1', 'port = 9', 'time = ' + time, 'username = u', 'password = p', 'index = test', 'security = False', 'delay = ' + str(delay)]
+		lines += ['{} = {}'.format(key, value) for key, value in settings.items()]
+		conf_file.write_text('\n'.join(lines) + '\n')
+		scenario = Fake_Scenario(str(log_file), str(conf_file), str(tmp_path / '.ecs_cache'), payload=payload)
+		controller = ECS.Log_Controller(scenario, 'test', queue.Queue(), queue.Queue(), queue.Queue())
+		return controller
+	return make
@@ -0,0 +1,83 @@
+import gzip
+import hashlib
+import json
+import zipfile
+
+import pytest
+
+from conftest import ECS, Fake_Scenario, write_logs
+
+
+LOGS = [{"@timestamp": "2022-12-09T19:14:{:02d}.412Z".format(n), "n": n} for n in range(50)]
+
+def sha(path):
+	with open(path, 'rb') as f:
+		return hashlib.sha256(f.read()).hexdigest()
+
+def log_sources(tmp_path):
+	plain = write_logs(tmp_path / 'l.json', LOGS)
+	with open(plain, 'rb') as f:
+		data = f.read()
+	with gzip.open(tmp_path / 'l.json.gz', 'wb') as f:
+		f.write(data)
+	with zipfile.ZipFile(tmp_path / 'a.zip', 'w') as zf:
+		zf.writestr('inner/l.json', data)
+	return {'plain': (plain, plain), 'gz': (str(tmp_path / 'l.json.gz'), str(tmp_path / 'l.json.gz')), 'zip': (str(tmp_path / 'a.zip') + '!inner/l.json', str(tmp_path / 'a.zip'))}
+
+#count the times the engine opens a file
+@pytest.fixture
+def opens(monkeypatch):
+	counted = []
+	def counting_open(path, *args, **kwargs):
+		counted.append(str(path))
+		return open(path, *args, **kwargs)
+	monkeypatch.setattr(ECS, 'open', counting_open, raising=False)
+	return counted
+
+
+@pytest.mark.parametrize('kind', ['plain', 'gz', 'zip'])
+def test_hash_and_parse(tmp_path, kind):
+	log_file, archive = log_sources(tmp_path)[kind]
+	result = ECS.check_log_source(log_file)
+	assert result['sha256'] == sha(archive)
+	assert (result['docs'], result['timed'], result['rebased'], result['error']) == (50, 50, True, None)
+	assert result['fields'] == ['@timestamp']
+
+def test_changed_file_is_read_once(tmp_path, opens):
+	log_file = write_logs(tmp_path / 'l.json', LOGS)
+	assert ECS.check_log_source(log_file)['docs'] == 50
+	assert opens == [log_file]
+
+def test_touched_file_is_hashed_not_parsed(tmp_path, opens):
+	log_file = write_logs(tmp_path / 'l.json', LOGS)
+	result = ECS.check_log_source(log_file, known_sha=sha(log_file))
+	assert result['unchanged'] and result['docs'] == 0
+	assert opens == [log_file]
+	#same size, different content
+	result = ECS.check_log_source(log_file, known_sha='0' * 64)
+	assert not 'unchanged' in result and result['docs'] == 50
+
+def test_broken_file_is_still_hashed(tmp_path):
+	path = tmp_path / 'broken.json'
+	path.write_text(json.dumps(LOGS[0]) + '\n{"n": oops}\n' + 'x' * (3 << 20))
+	result = ECS.check_log_source(str(path))
+	assert result['docs'] == 1 and result['error'].startswith('JSONDecodeError after document 1')
+	assert result['sha256'] == sha(path)
+
+@pytest.mark.parametrize('option, ok', [('now', True), ('no_update', True), ('2023-03-02T17:41:08.512Z', True), ('2023-03-02 17:41:08', False), ('later', False), ('', False)])
+def test_time_options(option, ok):
+	assert ECS.Asset_Validator.time_option_ok(option) == ok
+
+class Validated_Scenario(Fake_Scenario):
+	payload_key = ECS.Scenario_Data.payload_key
+	Effects = {}
+
+@pytest.mark.parametrize('log_time, errors', [('None', 0), ('now', 0), ('2023-03-02T17:41:08.512Z', 0), ('yesterday', 1)])
+def test_log_time_is_checked(tmp_path, capsys, log_time, errors):
+	log_file = write_logs(tmp_path / 'l.json', LOGS)
+	conf_file = tmp_path / 'test.conf'
+	conf_file.write_text('[ELK]\nip = 127.0.0.1\nport = 9\ntime = now\nusername = u\npassword = p\nindex = test\nsecurity = False\ndelay = False\n')
+	scenario = Validated_Scenario(log_file, str(conf_file), str(tmp_path / '.ecs_cache'), log_time)
+	assert ECS.Asset_Validator(scenario, 1).run() == errors
+	if errors:
+		assert 'test: log_time <yesterday> not supported' in capsys.readouterr().out
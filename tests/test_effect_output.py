@@ -0,0 +1,73 @@
+import queue
+
+from conftest import ECS
+
+
+def drain(q):
+	lines = []
+	while not q.empty():
+		lines += q.get().split('\n')
+	return lines
+
+def test_lines_wait_for_the_interval():
+	q = queue.Queue()
+	output = ECS.Effect_Output(q, 'u', '10.0.0.1', interval=60)
+	output.feed(b'42\nfirst\nsecond\n')
+	output.flush()
+	assert drain(q) == ['u@10.0.0.1 => PID: 42']
+	assert output.pid == 42
+
+def test_close_sends_what_is_held():
+	q = queue.Queue()
+	output = ECS.Effect_Output(q, 'u', '10.0.0.1', interval=60, max_lines=2)
+	output.feed(b'42\nfirst\nsecond\nthird\npart')
+	output.flush()
+	output.close()
+	assert drain(q) == ['u@10.0.0.1 => PID: 42', 'u@10.0.0.1 => first', 'u@10.0.0.1 => second', 'u@10.0.0.1 => ... 2 more lines not shown']
+	#a second close has nothing left to send
+	output.close()
+	assert q.empty()
+
+def test_split_characters_are_decoded_on_close():
+	q = queue.Queue()
+	output = ECS.Effect_Output(q, 'u', 'h', interval=60)
+	data = '1\nnaïve\nnaïve'.encode()
+	output.feed(data[:5])
+	output.feed(data[5:])
+	output.close()
+	assert drain(q)[1:] == ['u@h => naïve', 'u@h => naïve']
+
+def test_stopped_command_keeps_its_output_and_pid():
+	q = queue.Queue()
+	agent = ECS.Effects_Agent.__new__(ECS.Effects_Agent)
+	agent.run = object()
+	agent.message_queue = q
+	output = ECS.Effect_Output(q, 'u', '10.0.0.1', interval=60, on_pid=lambda pid: ECS.Effect_Processes.started(agent.run, '10.0.0.1', 'u', pid))
+	ECS.Effect_Processes.begin(agent.run, '10.0.0.1', 'u')
+	output.feed(b'42\nstill running\n')
+	agent.command_done(output, 'u', '10.0.0.1')
+	assert drain(q)[1:] == ['u@10.0.0.1 => still running']
+	#the command did not end, so its PID is still there for kill_remote
+	assert ECS.Effect_Processes.end(agent.run) == {('10.0.0.1', 'u'): {42}}
+
+def test_kill_sends_kill_even_when_a_pid_has_exited(monkeypatch):
+	import signal
+	import subprocess
+	import sys
+	#ignores TERM, so only the KILL a second later stops it
+	stubborn = subprocess.Popen([sys.executable, '-c', 'import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print(1, flush=True); time.sleep(30)'], stdout=subprocess.PIPE)
+	stubborn.stdout.readline()
+	exited = subprocess.Popen(['true'])
+	exited.wait()
+	scripts = []
+	def run(agent_ip, username, password, command, timeout=10, prefetch=False):
+		scripts.append(command)
+		return subprocess.run(['sh', '-c', command], capture_output=True, text=True, timeout=timeout).stdout
+	monkeypatch.setattr(ECS.SSH_Connections, 'run', run)
+	try:
+		ECS.Effect_Processes.kill('10.0.0.1', 'u', 'p', pids=[exited.pid, stubborn.pid])
+		assert scripts[0].endswith('kill -TERM $k 2>/dev/null; sleep 1; kill -KILL $k 2>/dev/null; fi; true')
+		assert stubborn.wait(5) == -signal.SIGKILL
+	finally:
+		stubborn.kill()
+		stubborn.wait()
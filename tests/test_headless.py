@@ -0,0 +1,110 @@
+import io
+import json
+import threading
+
+import pytest
+
+from conftest import ECS
+
+
+def write_timeline(tmp_path, text):
+	path = tmp_path / 'timeline.txt'
+	path.write_text(text)
+	return str(path)
+
+def test_timeline_lines(tmp_path):
+	path = write_timeline(tmp_path, '# offset scene\n\n2.5, s2   # later\n0 S1\n  2.5\tS1\n1,s3\n')
+	#sorted by offset, lines with the same offset stay in file order, IDs match whatever their case
+	assert ECS.read_timeline(path, ['0', 'S1', 'S2', 's3', 'None']) == [(0.0, 'S1'), (1.0, 's3'), (2.5, 'S2'), (2.5, 'S1')]
+
+@pytest.mark.parametrize('line, error', [
+	('1 S9', 'line 2: scene S9 is not in the scenario'),
+	('-1 S1', "line 2: offset can't be negative"),
+	('soon S1', 'line 2: offset soon is not a number'),
+	('1 S1 S2', 'line 2: expected <offset> <scene>'),
+	('1 None', 'line 2: scene None is not in the scenario'),
+])
+def test_bad_timeline_lines(tmp_path, line, error):
+	path = write_timeline(tmp_path, '0 S1\n' + line + '\n')
+	with pytest.raises(ValueError, match=error):
+		ECS.read_timeline(path, ['0', 'S1', 'S2', 'None'])
+
+
+class Stub_Effect(ECS.Effects_Agent):
+	#an effect that says it ran and takes Effects[EFX_ID]['seconds'] to finish, fails if Effects[EFX_ID]['fail']
+	def __init__(self, Scenario, EFX_ID, message_queue, error_queue):
+		self.EFX_ID = EFX_ID
+		self.settings = Scenario.Effects[EFX_ID]
+		self.message_queue = message_queue
+		self.Event = threading.Event()
+		self.futures = []
+		self.failed = False
+
+	def work(self):
+		self.message_queue.put('ran ' + self.EFX_ID)
+		self.Event.wait(self.settings['seconds'])
+		self.failed = self.settings['fail']
+
+	def Run(self):
+		self.futures = ECS.Jobs.run('EFX', self.EFX_ID, self, [(self.work, [])])
+
+	def Stop(self):
+		self.Event.set()
+
+	def Progress(self):
+		return ''
+
+class Headless_Scenario(object):
+	#just what Headless reads from Scenario_Data, each scene runs the effects given for it
+	def __init__(self, effects):
+		self.Scenario = {'0':{'scene_children':list(effects), 'effects':['None'], 'logs':['None'], 'description':''}}
+		self.Effects = {}
+		for scene, settings in effects.items():
+			self.Scenario[scene] = {'scene_children':['None'], 'effects':[], 'logs':['None'], 'description':''}
+			for EFX_ID, seconds, fail in settings:
+				self.Scenario[scene]['effects'].append(EFX_ID)
+				self.Effects[EFX_ID] = {'seconds':seconds, 'fail':fail}
+		self.Graph = ECS.Scene_Graph(self.Scenario)
+		self.Logs = {}
+		self.Payloads = {}
+
+	def Stage_Logs(self, event):
+		pass
+
+#Headless stops and shuts down every job when it ends, so it gets a registry of its own
+@pytest.fixture
+def headless(tmp_path, monkeypatch):
+	monkeypatch.setattr(ECS, 'Jobs', ECS.Job_Registry())
+	return lambda effects, timeline, timeout=None: run_headless(tmp_path, effects, timeline, timeout)
+
+def run_headless(tmp_path, effects, timeline, timeout):
+	engine = ECS.Scenario_Engine(Headless_Scenario(effects))
+	engine.Effects_Backend = Stub_Effect
+	engine.sys_log_path = str(tmp_path / 'ECS_Log.jsonl')
+	out = io.StringIO()
+	failures = engine.Headless(timeline, out, json_lines=True, timeout=timeout)
+	lines = [json.loads(line) for line in out.getvalue().splitlines()]
+	return failures, lines[:-1], lines[-1]
+
+def test_headless_run_summary(headless):
+	failures, messages, summary = headless({'S1':[('E1', 0, False)], 'S2':[('E2', 0.1, False), ('E3', 0, False)]}, [(0, 'S1'), (0.2, 'S2')])
+	assert failures == 0
+	#messages are journaled under the scene that started the effect
+	assert sorted((message['scene'], message['id']) for message in messages if message['message'].startswith('ran ')) == [('S1', 'E1'), ('S2', 'E2'), ('S2', 'E3')]
+	assert summary['scenes'] == 2 and summary['failures'] == 0
+	rows = summary['summary']
+	assert [(row['scene'], row['offset'], row['effects'], row['logs'], row['failed']) for row in rows] == [('S1', 0, 1, 0, 0), ('S2', 0.2, 2, 0, 0)]
+	assert all(row['finished'] != None and row['lag'] >= 0 for row in rows)
+	assert rows[1]['finished'] >= 0.1
+
+def test_failed_effect_fails_the_run(headless):
+	failures, messages, summary = headless({'S1':[('E1', 0, True)], 'S2':[('E2', 0, False)]}, [(0, 'S1'), (0, 'S2')])
+	assert failures == 1
+	assert [(row['scene'], row['failed']) for row in summary['summary']] == [('S1', 1), ('S2', 0)]
+
+def test_timeout_stops_the_run(headless):
+	failures, messages, summary = headless({'S1':[('E1', 30, False)]}, [(0, 'S1')], timeout=0.3)
+	assert failures == 1
+	assert summary['summary'][0]['finished'] == None
+	assert summary['elapsed'] < 10
+	assert any(message['message'] == '[!] Timeline timed out with 1 effect/log threads still running, stopping them' for message in messages)
@@ -0,0 +1,85 @@
+import concurrent.futures
+import threading
+
+from conftest import ECS, write_logs
+
+
+def test_clear_is_not_listed_as_a_log(tmp_path, make_controller):
+	controller = make_controller(write_logs(tmp_path / 'l.json', [{"n": 1}]))
+	release = threading.Event()
+	cleared = []
+	def clear_index(index):
+		release.wait(5)
+		cleared.append(index)
+	controller.clear_index = clear_index
+	controller.Index_queue.put('old')
+	controller.Clear_Thread('all')
+	try:
+		assert [job['ID'] for job in ECS.Jobs.live('LOG') if job['worker'] is controller] == []
+		jobs = [job for job in ECS.Jobs.live('CLEAR') if job['worker'] is controller]
+		assert [job['ID'] for job in jobs] == ['test, old, all']
+		assert any(line.startswith('CLEAR test, old, all: running') for line in ECS.Jobs.Status())
+	finally:
+		release.set()
+		concurrent.futures.wait(controller.futures)
+	assert sorted(cleared) == ['all', 'old', 'test']
+
+def test_default_index_is_named(tmp_path, make_controller):
+	controller = make_controller(write_logs(tmp_path / 'l.json', [{"n": 1}]))
+	controller.clear_index = lambda index: index
+	controller.Clear_Thread()
+	concurrent.futures.wait(controller.futures)
+	assert [future.result() for future in controller.futures] == ['test']
+	assert 'CLEAR test: done' in ' '.join(ECS.Jobs.Status())
+
+class Worker(object):
+	def __init__(self):
+		self.release = threading.Event()
+
+	def work(self):
+		self.release.wait(5)
+
+	def Stop(self):
+		self.release.set()
+
+def test_registries_do_not_share_limits():
+	jobs = ECS.Job_Registry(limits={'LOG':2})
+	assert jobs.limits == {'EFX':64, 'LOG':2, 'CLEAR':4}
+	assert ECS.Job_Registry().limits['LOG'] == 32
+
+def test_queued_jobs_are_reported():
+	jobs = ECS.Job_Registry(limits={'EFX':2})
+	reports = []
+	first = Worker()
+	second = Worker()
+	try:
+		jobs.run('EFX', 'E1', first, [(first.work, [])], reports.append)
+		assert reports == []
+		futures = jobs.run('EFX', 'E2', second, [(second.work, []), (second.work, [])], reports.append)
+		assert reports == ['[!] EFX E2: 1 of 2 threads queued, all 2 EFX threads are busy']
+	finally:
+		jobs.stop_all()
+		concurrent.futures.wait(futures)
+		jobs.shutdown()
+	#the pool is free again
+	third = Worker()
+	third.Stop()
+	concurrent.futures.wait(jobs.run('EFX', 'E3', third, [(third.work, [])], reports.append))
+	assert len(reports) == 1
+
+def test_unpooled_calls_do_not_take_pool_threads():
+	jobs = ECS.Job_Registry(limits={'LOG':1})
+	reports = []
+	trickle = Worker()
+	log = Worker()
+	log.Stop()
+	try:
+		jobs.run('LOG', 'T1', trickle, [(trickle.work, [])], reports.append, pooled=False)
+		futures = jobs.run('LOG', 'L1', log, [(log.work, [])], reports.append)
+		concurrent.futures.wait(futures, 5)
+		assert all(future.done() for future in futures)
+		assert reports == []
+		assert [job['ID'] for job in jobs.live('LOG')] == ['T1']
+	finally:
+		jobs.stop_all()
+		jobs.shutdown()
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import ECS, write_logs
+
+
+def check_offsets(index, log_file, logs):
+	with open(log_file, 'rb') as f:
+		data = f.read()
+	assert len(index) == len(logs)
+	for k, log in enumerate(logs):
+		assert json.loads(data[index.offsets[k]:index.offsets[k] + index.lengths[k]]) == log
+
+def odd_file(path, logs):
+	#multi-byte characters, no newlines between some documents, and pretty printed ones
+	with open(path, 'w', encoding='utf-8') as f:
+		for n, log in enumerate(logs):
+			if n % 3 == 0:
+				f.write(json.dumps(log, ensure_ascii=False))
+			elif n % 3 == 1:
+				f.write(json.dumps(log, indent=2, ensure_ascii=False) + '\n\n')
+			else:
+				f.write(json.dumps(log) + '\r\n')
+	return str(path)
+
+LOGS = [{"@timestamp": "2022-12-09T19:14:{:02d}.{:03d}Z".format(n % 60, n), "message": "ü☃" * n, "n": n} for n in range(50)]
+
+
+def test_offsets(tmp_path):
+	log_file = odd_file(tmp_path / 'logs.json', LOGS)
+	index = ECS.Log_Index(log_file, str(tmp_path / 'cache'))
+	assert index.build(read_chunk=7)
+	check_offsets(index, log_file, LOGS)
+	assert index.doc_times()[3] == ECS.Timestamp_Rebaser.parse_iso(LOGS[3]["@timestamp"])
+
+def test_saved_index_is_reused(tmp_path):
+	log_file = write_logs(tmp_path / 'logs.json', LOGS)
+	built = ECS.Log_Index(log_file, str(tmp_path / 'cache')).load_or_build()
+	loaded = ECS.Log_Index(log_file, str(tmp_path / 'cache'))
+	assert loaded.load()
+	assert (loaded.offsets, loaded.lengths, loaded.times) == (built.offsets, built.lengths, built.times)
+
+def test_offsets_after_rebuild(tmp_path):
+	log_file = write_logs(tmp_path / 'logs.json', LOGS[:10])
+	ECS.Log_Index(log_file, str(tmp_path / 'cache')).load_or_build()
+	#same path, different content: the saved index is out of date and is rebuilt
+	changed = [{"message": "x" * 100, "n": n} for n in range(5)] + LOGS[20:30]
+	odd_file(tmp_path / 'logs.json', changed)
+	index = ECS.Log_Index(log_file, str(tmp_path / 'cache'))
+	assert not index.load()
+	index = ECS.Log_Index(log_file, str(tmp_path / 'cache')).load_or_build()
+	check_offsets(index, log_file, changed)
+	assert index.doc_times()[:5] == [None] * 5
+
+def test_concurrent_saves_do_not_collide(tmp_path):
+	log_file = write_logs(tmp_path / 'logs.json', LOGS)
+	index = ECS.Log_Index(log_file, str(tmp_path / 'cache')).load_or_build()
+	errors = []
+	def save():
+		try:
+			for n in range(20):
+				ECS.Log_Index(log_file, str(tmp_path / 'cache')).load_or_build() if n % 2 else index.save()
+		except Exception as e:
+			errors.append(e)
+	threads = [threading.Thread(target=save) for n in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert errors == []
+	assert os.listdir(tmp_path / 'cache') == [os.path.basename(index.index_path)]
+	loaded = ECS.Log_Index(log_file, str(tmp_path / 'cache'))
+	assert loaded.load()
+	check_offsets(loaded, log_file, LOGS)
+
+def test_malformed_file_stops_at_max_doc(tmp_path):
+	path = tmp_path / 'bad.json'
+	path.write_text('{"a": 1}\n{"b": "' + 'x' * 100000)
+	with pytest.raises(json.JSONDecodeError):
+		ECS.Log_Index(str(path), str(tmp_path)).build(read_chunk=100, max_doc=1000)
@@ -0,0 +1,104 @@
+import copy
+import io
+import json
+import time
+
+import pytest
+
+from conftest import ECS, record_sends, write_logs
+from test_timestamp_rebaser import winlogbeat_logs, zeek_logs
+
+
+ORIGIN_US = ECS.Timestamp_Rebaser.parse_iso("2023-03-02T17:41:08.512Z")
+
+
+#what stream_and_send would send for the same file
+def streamed(log_file, origin_us, fields=None, sample=1000):
+	rebaser = ECS.Timestamp_Rebaser(origin_us, fields, sample) if origin_us != None else None
+	with open(log_file) as fileobj:
+		out = []
+		for log in ECS.stream_json(fileobj):
+			if rebaser != None:
+				log = rebaser.rebase(log)
+			out.append((json.dumps(log) + "\n").encode())
+	return out
+
+def mixed_logs():
+	#documents without a time, and timestamps that are not in the first position
+	logs = winlogbeat_logs(40)
+	logs.insert(0, {"message": "no time at all"})
+	logs.insert(7, {"message": "still none", "tags": ["a"]})
+	logs[12]["extra"] = {"when": [logs[12]["@timestamp"]]}
+	return logs
+
+
+@pytest.mark.parametrize('logs', [mixed_logs(), zeek_logs(60)], ids=['winlogbeat', 'zeek'])
+def test_docs_match_streaming_path(tmp_path, logs):
+	log_file = write_logs(tmp_path / 'logs.json', logs)
+	payload = ECS.Log_Payload(log_file).build()
+	assert len(payload) == len(logs)
+	expected = streamed(log_file, ORIGIN_US)
+	assert list(payload.docs(ORIGIN_US)) == expected
+	#random access gives the same documents
+	for k in [len(logs) - 1, 0, 13, 5]:
+		assert payload.doc(k, ORIGIN_US) == expected[k]
+
+def test_docs_match_streaming_path_with_fields(tmp_path):
+	log_file = write_logs(tmp_path / 'logs.json', mixed_logs())
+	fields = ['@timestamp', 'event.created']
+	payload = ECS.Log_Payload(log_file, True, fields).build()
+	assert list(payload.docs(ORIGIN_US)) == streamed(log_file, ORIGIN_US, fields)
+
+def test_no_update_docs_are_unchanged(tmp_path):
+	logs = mixed_logs()
+	log_file = write_logs(tmp_path / 'logs.json', logs)
+	payload = ECS.Log_Payload(log_file, rebase=False).build()
+	assert list(payload.docs()) == [(json.dumps(log) + "\n").encode() for log in logs]
+
+
+def relative(times):
+	known = [t for t in times if t != None]
+	return [t - min(known) if t != None else None for t in times]
+
+@pytest.mark.parametrize('rebase', [True, False], ids=['rebased', 'no_update'])
+@pytest.mark.parametrize('logs', [mixed_logs(), zeek_logs(60)], ids=['winlogbeat', 'zeek'])
+def test_doc_times_match_log_index(tmp_path, logs, rebase):
+	log_file = write_logs(tmp_path / 'logs.json', logs)
+	payload = ECS.Log_Payload(log_file, rebase).build()
+	index = ECS.Log_Index(log_file, str(tmp_path)).load_or_build()
+	assert relative(payload.doc_times()) == relative(index.doc_times())
+	assert len(set(t for t in payload.doc_times() if t != None)) > 1
+
+
+#when each document went out, by its n
+def trickle_schedule(controller, run):
+	sent = record_sends(controller)
+	assert run() == "done."
+	return {log['n']: when for when, logs in sent for log in logs}
+
+@pytest.mark.parametrize('kind', ['winlogbeat', 'zeek'])
+@pytest.mark.parametrize('time_option', ['no_update', 'now'])
+def test_staged_trickle_is_paced_like_trickle_indexed(tmp_path, make_controller, kind, time_option):
+	spacing = 0.03
+	logs = []
+	for n in range(10):
+		t = 1670613265.412 + n * spacing
+		if kind == 'winlogbeat':
+			logs.append({"@timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)) + ".{:03d}Z".format(round(t * 1000) % 1000), "n": n})
+		else:
+			logs.append({"ts": round(t, 6), "n": n})
+	log_file = write_logs(tmp_path / 'logs.json', logs)
+
+	payload = ECS.Log_Payload(log_file, time_option != 'no_update').build()
+	controller = make_controller(log_file, time=time_option, delay=True, trickle_tick=0.005)
+	staged = trickle_schedule(controller, lambda: controller.send_payload(payload))
+	controller = make_controller(log_file, time=time_option, delay=True, trickle_tick=0.005)
+	indexed = trickle_schedule(controller, lambda: controller.trickle_indexed(log_file))
+
+	assert sorted(staged) == sorted(indexed) == list(range(10))
+	for n in range(10):
+		due = n * spacing
+		assert due - 0.002 <= staged[n] <= due + 0.1
+		assert abs(staged[n] - indexed[n]) < 0.1
+	#spread out over the logs, not all sent in the first tick
+	assert staged[9] > 0.2
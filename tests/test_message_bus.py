@@ -0,0 +1,83 @@
+import threading
+import time
+
+from conftest import ECS
+
+
+def bus_channels(aging=50):
+	bus = ECS.Message_Bus(aging)
+	return bus, {source: bus.channel(source, priority, 0) for source, priority in [('ERROR', 0), ('EFX', 1), ('LOG', 2), ('CONTEXT', 3)]}
+
+def drain(bus):
+	taken = []
+	item = bus.get_nowait()
+	while item != None:
+		taken.append((item[0].source, item[1]))
+		item = bus.get_nowait()
+	return taken
+
+
+def test_priority_then_order():
+	bus, channels = bus_channels()
+	for source, message in [('LOG', 'l1'), ('ERROR', 'e1'), ('CONTEXT', 'c1'), ('EFX', 'x1'), ('ERROR', 'e2'), ('LOG', 'l2')]:
+		channels[source].put(message)
+	assert [message for source, message in drain(bus)] == ['e1', 'e2', 'x1', 'l1', 'l2', 'c1']
+	assert bus.empty()
+
+def test_waiting_messages_age_up():
+	bus, channels = bus_channels(aging=4)
+	channels['LOG'].put('log')
+	for n in range(20):
+		channels['ERROR'].put(n)
+	taken = [message for source, message in drain(bus)]
+	#every 4 messages sent behind it take LOG up a priority, so at most 2 * 4 errors sent after it go first
+	assert 0 < taken.index('log') <= 8
+	assert [message for message in taken if message != 'log'] == list(range(20))
+
+def test_flood_does_not_starve():
+	bus, channels = bus_channels(aging=5)
+	channels['CONTEXT'].put('context')
+	taken = []
+	#errors keep coming in as fast as they are taken
+	for n in range(100):
+		channels['ERROR'].put(n)
+		channels['ERROR'].put(n)
+		taken.append(bus.get_nowait()[1])
+		if 'context' in taken:
+			break
+	assert 'context' in taken
+	assert len(taken) <= 3 * 5
+
+def test_journal_in_sent_order():
+	bus, channels = bus_channels()
+	journaled = []
+	channels['LOG'].put('before')
+	bus.journal_to(lambda channel, message, sent: journaled.append((message, sent)))
+	for source, message in [('CONTEXT', 'c'), ('ERROR', 'e'), ('LOG', 'l')]:
+		channels[source].put(message)
+	assert [message for message, sent in journaled] == ['before', 'c', 'e', 'l']
+	assert [sent for message, sent in journaled] == sorted(sent for message, sent in journaled)
+	#taking them off the bus does not journal them again
+	assert [message for source, message in drain(bus)] == ['e', 'before', 'l', 'c']
+	assert len(journaled) == 4
+
+def test_tagged_channels_share_the_bus():
+	bus, channels = bus_channels()
+	channels['EFX'].tag('EFX_1', '3').put('hi')
+	channel, message, sent = bus.get_nowait()
+	assert (channel.source, channel.ID, channel.scene, message) == ('EFX', 'EFX_1', '3', 'hi')
+
+def test_get_blocks_until_put_or_wake():
+	bus, channels = bus_channels()
+	assert bus.get(timeout=0.05) == None
+	threading.Timer(0.05, channels['LOG'].put, ['late']).start()
+	start = time.monotonic()
+	assert bus.get(timeout=5)[1] == 'late'
+	assert time.monotonic() - start < 4
+	threading.Timer(0.05, bus.wake).start()
+	assert bus.get(timeout=5) == None
+	#a wake is handed out once, and comes before waiting messages
+	channels['LOG'].put('after')
+	bus.wake()
+	assert bus.get_nowait() == None
+	assert bus.get_nowait()[1] == 'after'
@@ -0,0 +1,26 @@
+from conftest import ECS
+
+
+def engine():
+	engine = ECS.Scenario_Engine.__new__(ECS.Scenario_Engine)
+	engine.cli_options = ["<i>Input Scene ID", "<B>Back", "<A>Ancestor", "<Q>Exit", "<C>Clear", "<L>List", "<E>Stop EFX", "<S>Stop Logs", "<P>Pause Logs", "<R>Resume Logs", "<G>Seek Logs", "<O>Orphans", "<J>Jobs", "<X>:Clear Index", "</>Search", "<PgUp/PgDn/End>Scroll"]
+	return engine
+
+def test_wide_screen_shows_everything():
+	lines = engine().option_lines(300, 4)
+	assert lines == [" ".join(engine().cli_options)]
+
+def test_lines_leave_room_for_the_prompt():
+	for columns in range(40, 200, 7):
+		for rows in range(4, 12):
+			lines = engine().option_lines(columns, rows)
+			assert len(lines) <= rows - 3
+			assert all(len(line) <= columns - 4 for line in lines)
+
+def test_help_when_they_do_not_fit():
+	full = engine().option_lines(90, 10)
+	assert len(full) > 1 and not '<?>Help' in ' '.join(full)
+	short = engine().option_lines(90, 4)
+	assert len(short) == 1
+	assert short[0].endswith('<?>Help')
+	assert short[0].startswith('<i>Input Scene ID <B>Back')
@@ -0,0 +1,160 @@
+import queue
+
+import pytest
+
+from conftest import ECS
+
+
+class Fake_Transport(object):
+	def __init__(self):
+		self.active = True
+		self.channels = []
+
+	def is_active(self):
+		return self.active
+
+	def set_keepalive(self, interval):
+		pass
+
+	def open_session(self):
+		channel = Fake_Channel()
+		self.channels.append(channel)
+		return channel
+
+
+class Fake_Channel(object):
+	def __init__(self):
+		self.closed = False
+
+	def close(self):
+		self.closed = True
+
+
+#stands in for paramiko.SSHClient, notes every connection made
+class Fake_Client(object):
+	made = []
+
+	def __init__(self):
+		self.transport = None
+		self.closed = False
+
+	def set_missing_host_key_policy(self, policy):
+		pass
+
+	def connect(self, agent_ip, username=None, password=None, timeout=None, compress=None):
+		self.key = (agent_ip, username)
+		self.transport = Fake_Transport()
+		Fake_Client.made.append(self)
+
+	def get_transport(self):
+		return self.transport
+
+	def close(self):
+		self.closed = True
+		if self.transport != None:
+			self.transport.active = False
+
+
+@pytest.fixture
+def registry(monkeypatch):
+	Fake_Client.made = []
+	monkeypatch.setattr(ECS.paramiko, 'SSHClient', Fake_Client)
+	registry = ECS.SSH_Registry()
+	monkeypatch.setattr(ECS, 'SSH_Connections', registry)
+	return registry
+
+
+def test_idle_connections_are_closed(registry, monkeypatch):
+	now = [1000.0]
+	monkeypatch.setattr(ECS.time, 'monotonic', lambda: now[0])
+	registry.idle_timeout = 60
+	first = registry.client('10.0.0.1', 'u', 'p')
+	channel = registry.session('10.0.0.2', 'u', 'p')
+	now[0] += 61
+	registry.client('10.0.0.3', 'u', 'p')
+	#10.0.0.2 still has a channel open
+	assert first.closed
+	assert sorted(registry.clients) == [('10.0.0.2', 'u'), ('10.0.0.3', 'u')]
+	channel.close()
+	now[0] += 61
+	registry.client('10.0.0.3', 'u', 'p')
+	assert list(registry.clients) == [('10.0.0.3', 'u')]
+
+def test_least_recently_used_connections_are_closed_past_max_clients(registry, monkeypatch):
+	now = [1000.0]
+	monkeypatch.setattr(ECS.time, 'monotonic', lambda: now[0])
+	registry.max_clients = 2
+	for ip in ['10.0.0.1', '10.0.0.2', '10.0.0.1', '10.0.0.3']:
+		now[0] += 1
+		registry.client(ip, 'u', 'p')
+	assert sorted(registry.clients) == [('10.0.0.1', 'u'), ('10.0.0.3', 'u')]
+	with registry.hold('10.0.0.3', 'u', 'p'):
+		now[0] += 1
+		registry.client('10.0.0.4', 'u', 'p')
+		#the held connection is kept even though it is older
+		assert sorted(registry.clients) == [('10.0.0.3', 'u'), ('10.0.0.4', 'u')]
+
+def test_only_unclaimed_prefetch_connections_are_dropped(registry):
+	registry.client('10.0.0.1', 'u', 'p', prefetch=True)
+	registry.client('10.0.0.2', 'u', 'p', prefetch=True)
+	registry.client('10.0.0.2', 'u', 'p')
+	registry.client('10.0.0.3', 'u', 'p')
+	registry.client('10.0.0.3', 'u', 'p', prefetch=True)
+	assert registry.unclaimed('10.0.0.1', 'u')
+	assert not registry.unclaimed('10.0.0.2', 'u')
+	assert not registry.unclaimed('10.0.0.3', 'u')
+	for ip in ['10.0.0.1', '10.0.0.2', '10.0.0.3']:
+		registry.drop(ip, 'u', prefetched=True)
+	assert sorted(registry.clients) == [('10.0.0.2', 'u'), ('10.0.0.3', 'u')]
+
+
+class Fake_Scenario(object):
+	#scenes start -> a, b; each child runs one effect on its own agent
+	def __init__(self, agents):
+		self.Logs = {}
+		self.Payloads = {}
+		self.Effects = {}
+		self.Scenario = {'start':{'logs':['None'], 'effects':['None'], 'scene_children':list(agents)}}
+		for scene, ip in agents.items():
+			self.Effects[scene + '_efx'] = {'agent_ip':[ip], 'agent_username':['u'], 'agent_password':['p'], 'effect_file':['None'], 'effect_file_destination':['None']}
+			self.Scenario[scene] = {'logs':['None'], 'effects':[scene + '_efx'], 'scene_children':['None']}
+
+
+@pytest.fixture
+def prefetcher(registry, monkeypatch):
+	#staging connects and uploads nothing
+	def stage(agent_ip, username, password, files, event=None, prefetch=False):
+		ECS.SSH_Connections.client(agent_ip, username, password, prefetch=prefetch)
+		return []
+	monkeypatch.setattr(ECS.Effect_Files, 'stage', stage)
+	def make(agents, connection_limit=16):
+		return ECS.Scene_Prefetcher(Fake_Scenario(agents), queue.Queue(), connection_limit=connection_limit)
+	return make
+
+def test_connections_for_a_branch_not_taken_are_dropped(registry, prefetcher):
+	prefetch = prefetcher({'a':'10.0.0.1', 'b':'10.0.0.2'})
+	prefetch.Warm('start')
+	prefetch.thread.join()
+	assert sorted(registry.clients) == [('10.0.0.1', 'u'), ('10.0.0.2', 'u')]
+	assert prefetch.connections == set(registry.clients)
+
+	#a was taken and its effect used the connection
+	registry.client('10.0.0.1', 'u', 'p')
+	prefetch.Warm('a')
+	prefetch.thread.join()
+	assert list(registry.clients) == [('10.0.0.1', 'u')]
+	assert [client.key for client in Fake_Client.made if client.closed] == [('10.0.0.2', 'u')]
+
+def test_connection_limit_counts_only_prefetched_connections(registry, prefetcher):
+	#connections effects opened do not stop the prefetcher
+	for n in range(5):
+		registry.client('10.0.1.{}'.format(n), 'u', 'p')
+	prefetch = prefetcher({'a':'10.0.0.1', 'b':'10.0.0.2', 'c':'10.0.0.3'}, connection_limit=2)
+	prefetch.Warm('start')
+	prefetch.thread.join()
+	assert len(prefetch.connections) == 2
+	assert len(registry) == 7
+
+	prefetch.Stop()
+	assert len(registry) == 5
+	assert prefetch.connections == set()
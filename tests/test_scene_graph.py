@@ -0,0 +1,80 @@
+from conftest import ECS
+
+
+def sheet(children):
+	return {scene: {'scene_children': kids, 'effects': ['None'], 'logs': ['None'], 'description': ''} for scene, kids in children.items()}
+
+class Graph_Scenario(object):
+	#just what Start_Scene reads from Scenario_Data, scenes with no effects or logs
+	def __init__(self, children):
+		self.Scenario = sheet(children)
+		self.Graph = ECS.Scene_Graph(self.Scenario)
+
+def back(engine):
+	engine.Start_Scene(engine.scene_path[-2], len(engine.scene_path) - 2)
+
+
+def test_shortest_paths_from_the_root():
+	graph = ECS.Scene_Graph(sheet({'0': ['1', '2'], '1': ['3'], '2': ['3', '4'], '3': ['4'], '4': [], '5': ['0'], 'None': []}))
+	assert graph.path('0') == ('0',)
+	assert graph.path('3') == ('0', '1', '3')
+	assert graph.path('4') == ('0', '2', '4')
+	assert graph.parents['3'] == ['1', '2']
+	#not reachable from the root, only by ID
+	assert graph.path('5') == ('5',)
+	assert graph.unreachable == ['5']
+	assert graph.dead_ends == ['4']
+	assert graph.cycles == []
+	assert not 'None' in graph.scenes
+
+def test_children_missing_from_the_sheet_are_dropped():
+	graph = ECS.Scene_Graph(sheet({'0': ['1', 'gone', '1'], '1': []}))
+	assert graph.children['0'] == ['1']
+
+def test_cycles():
+	graph = ECS.Scene_Graph(sheet({'0': ['1'], '1': ['0', '2'], '2': ['1', '2']}))
+	assert sorted(graph.cycles) == sorted([['0', '1', '0'], ['1', '2', '1'], ['2', '2']])
+	assert 'Scene cycle: 0 -> 1 -> 0' in graph.summary()
+	assert graph.summary().startswith('Scene graph: 3 scenes, 3 reachable from scene 0, 0 dead ends, 3 cycles')
+
+def test_missing_root():
+	graph = ECS.Scene_Graph(sheet({'1': []}))
+	assert graph.reachable == set()
+	assert 'Scene 0 does not exist!' in graph.summary()
+
+def test_path_follows_the_way_the_scenes_were_entered():
+	engine = ECS.Scenario_Engine(Graph_Scenario({'0': ['1', '2'], '1': ['3'], '2': ['3'], '3': [], '4': []}))
+	assert engine.scene_path == ['0']
+	for scene in ['2', '3']:
+		assert engine.Start_Scene(scene) == ([], 0)
+	#through 2, not the shortest way through 1
+	assert engine.scene_path == ['0', '2', '3']
+	engine.Start_Scene('0')
+	assert engine.scene_path == ['0']
+	engine.Start_Scene('4')
+	assert engine.scene_path == ['4']
+	engine.Start_Scene('3')
+	assert engine.scene_path == ['0', '1', '3']
+
+def test_back_to_a_parent_that_is_also_a_child():
+	engine = ECS.Scenario_Engine(Graph_Scenario({'0': ['1'], '1': ['0', '2'], '2': ['1']}))
+	engine.Start_Scene('1')
+	engine.Start_Scene('2')
+	assert engine.scene_path == ['0', '1', '2']
+	back(engine)
+	assert (engine.current_scene, engine.scene_path) == ('1', ['0', '1'])
+	back(engine)
+	assert (engine.current_scene, engine.scene_path) == ('0', ['0'])
+	#going forward into the cycle still adds to the path
+	engine.Start_Scene('1')
+	engine.Start_Scene('0')
+	assert engine.scene_path == ['0', '1', '0']
+
+def test_ancestor_cuts_the_path_at_the_place_chosen():
+	engine = ECS.Scenario_Engine(Graph_Scenario({'0': ['1'], '1': ['0', '2'], '2': ['1']}))
+	for scene in ['1', '0', '1', '2']:
+		engine.Start_Scene(scene)
+	assert engine.scene_path == ['0', '1', '0', '1', '2']
+	engine.Start_Scene('1', 1)
+	assert (engine.current_scene, engine.scene_path) == ('1', ['0', '1'])
+	assert engine.scene_children == ['0', '2']
@@ -0,0 +1,65 @@
+import threading
+
+from conftest import ECS
+
+
+def filled(texts, capacity=1000):
+	scrollback = ECS.Scrollback(capacity, 80)
+	for text in texts:
+		scrollback.append(text, 0)
+	return scrollback
+
+#offset of every line containing text, newest first
+def offsets(scrollback, text):
+	lines = scrollback.view(len(scrollback.lines))
+	return [len(lines) - 1 - n for n in range(len(lines) - 1, -1, -1) if text.lower() in lines[n][0].lower()]
+
+
+def test_search_back_and_forward():
+	scrollback = filled(['line {}{}'.format(n, ' match' if n % 7 == 0 else '') for n in range(100)])
+	found = offsets(scrollback, 'MATCH')
+	assert scrollback.search('Match') == found[0]
+	#walk back through every match, then forward again
+	walked = [scrollback.search('match')]
+	while True:
+		older = scrollback.search('match', walked[-1] + 1)
+		if older == None:
+			break
+		walked.append(older)
+	assert walked == found
+	back = [walked[-1]]
+	while True:
+		newer = scrollback.search('match', back[-1], True)
+		if newer == None:
+			break
+		back.append(newer)
+	assert back == list(reversed(found))
+	assert scrollback.highlight == 'match'
+
+def test_search_misses_and_edges():
+	scrollback = filled(['a', 'b', 'c'])
+	assert scrollback.search('') == None
+	assert scrollback.search('z') == None
+	assert scrollback.search('a', 3) == None
+	assert scrollback.search('c', 0, True) == None
+	assert scrollback.search('a', 10, True) == 2
+
+def test_search_after_lines_are_dropped():
+	scrollback = filled(['old match'] + ['x'] * 20 + ['new match'], capacity=10)
+	assert scrollback.search('match') == 0
+	assert scrollback.search('match', 1) == None
+
+def test_appends_go_on_while_searching():
+	scrollback = filled(['x'] * 50000 + ['needle'], capacity=100000)
+	stop = threading.Event()
+	def writer():
+		while not stop.is_set():
+			scrollback.append('y', 0)
+	thread = threading.Thread(target=writer)
+	thread.start()
+	try:
+		for n in range(5):
+			assert scrollback.search('needle') != None
+	finally:
+		stop.set()
+		thread.join()
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+from conftest import record_sends, write_logs
+
+
+def test_cursor_counts_answered_batches(tmp_path, make_controller):
+	logs = [{"n": n} for n in range(12)]
+	controller = make_controller(write_logs(tmp_path / 'l.json', logs), workers=2, bulk_docs=2)
+	release = threading.Event()
+	#hold every batch open, the queue behind them fills while elastic has answered for nothing
+	def on_send(sent):
+		release.wait(5)
+	sent = record_sends(controller, on_send)
+	thread = threading.Thread(target=controller.send_docs, args=[controller.serialize(logs)])
+	thread.start()
+	assert not release.wait(0.2)
+	assert controller.cursor['next'] == 0
+	release.set()
+	thread.join(5)
+	assert controller.cursor['next'] == 12
+	assert sorted(log['n'] for when, batch in sent for log in batch) == list(range(12))
+
+
+class Response(object):
+	def __init__(self, status_code, result=None):
+		self.status_code = status_code
+		self.result = result
+
+	def json(self):
+		if self.result is None:
+			raise ValueError("no json")
+		return self.result
+
+	def __str__(self):
+		return '<Response [{}]>'.format(self.status_code)
+
+#stands in for the requests session, answers posts from a list and keeps the bodies
+class Stub_Session(object):
+	def __init__(self, answers):
+		self.answers = list(answers)
+		self.bodies = []
+
+	def post(self, url, data=None, timeout=None):
+		self.bodies.append(data)
+		answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+		if isinstance(answer, Exception):
+			raise answer
+		return answer
+
+def stubbed(make_controller, tmp_path, answers, **settings):
+	controller = make_controller(write_logs(tmp_path / 'l.json', [{"n": 1}]), **settings)
+	session = Stub_Session(answers)
+	controller.get_session = lambda: session
+	waits = []
+	#back off without the wait
+	controller.Event.wait = lambda timeout=None: waits.append(timeout) or False
+	return controller, session, waits
+
+def errors(controller):
+	found = []
+	while not controller.Error_message_queue.empty():
+		found.append(controller.Error_message_queue.get())
+	return found
+
+
+def test_batches_split_by_docs_and_bytes(tmp_path, make_controller):
+	controller = make_controller(write_logs(tmp_path / 'l.json', [{"n": 1}]), bulk_docs=3, bulk_bytes=200)
+	docs = [b'{"n": %d}\n' % n for n in range(7)] + [b'{"big": "' + b'x' * 300 + b'"}\n', b'{"n": 8}\n']
+	batches = list(controller.bulk_batches(docs, 'idx'))
+	assert [count for body, count in batches] == [3, 3, 1, 1, 1]
+	action = b'{"index": {"_index": "idx"}}\n'
+	assert b''.join(body for body, count in batches) == b''.join(action + doc for doc in docs)
+	#a batch only goes past bulk_bytes when one document is bigger than it
+	assert [len(body) > 200 for body, count in batches] == [False, False, False, True, False]
+	assert list(controller.bulk_batches([], 'idx')) == []
+
+def test_retries_busy_and_failed_requests(tmp_path, make_controller):
+	ok = Response(200, {'errors': False})
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(429), Response(503), OSError('reset'), ok], bulk_retries=3)
+	response, rejected = controller.post_bulk(b'body')
+	assert (response, rejected) == (ok, 0)
+	assert len(session.bodies) == 4
+	assert waits == [2, 4, 8]
+	assert errors(controller) == ['[!] reset']
+
+def test_gives_up_after_the_retries(tmp_path, make_controller):
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(503)], bulk_retries=2)
+	response, rejected = controller.post_bulk(b'body')
+	assert response.status_code == 503 and len(session.bodies) == 3
+	#client errors are not retried
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(400)], bulk_retries=2)
+	assert controller.post_bulk(b'body')[0].status_code == 400 and len(session.bodies) == 1
+
+def test_stop_ends_the_retries(tmp_path, make_controller):
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(503)], bulk_retries=5)
+	controller.Event.wait = lambda timeout=None: True
+	assert controller.post_bulk(b'body')[0].status_code == 503 and len(session.bodies) == 1
+
+def test_rejected_documents_are_counted(tmp_path, make_controller):
+	items = [{'index': {'error': {'type': 'mapper_parsing_exception'}}}, {'create': {'error': {'type': 'version_conflict'}}}]
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(200, {'errors': True, 'items': items})])
+	stats = {'lock': threading.Lock(), 'result': "no logs.", 'batches': 0, 'sent': 0, 'sent_bytes': 0, 'failed': 0}
+	controller.send_batch(stats, b'body', 5, 'idx', False)
+	assert (stats['sent'], stats['failed'], controller.docs_sent) == (3, 2, 3)
+	assert errors(controller) == ['[!] 2 documents rejected by elastic, first error: {"type": "mapper_parsing_exception"}']
+
+@pytest.mark.parametrize('result', [{'errors': True}, {'errors': True, 'items': []}, {'errors': True, 'items': [{}]}, ['not', 'an', 'object']])
+def test_odd_error_replies_are_reported(tmp_path, make_controller, result):
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(200, result)])
+	response, rejected = controller.post_bulk(b'body')
+	assert response.status_code == 200
+	assert rejected == len(result.get('items', [])) if isinstance(result, dict) else rejected == 0
+
+def test_send_docs_totals(tmp_path, make_controller):
+	items = [{'index': {'error': {'type': 'bad'}}}]
+	controller, session, waits = stubbed(make_controller, tmp_path, [Response(200, {'errors': False}), Response(200, {'errors': True, 'items': items}), Response(200, {'errors': False})], bulk_docs=2)
+	result = controller.send_docs(controller.serialize({"n": n} for n in range(5)))
+	assert result == '<Response [200]>'
+	assert (controller.docs_sent, controller.cursor['next'], len(session.bodies)) == (4, 5, 3)
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+from conftest import ECS
+
+
+def read_records(path):
+	with open(path, encoding='utf-8') as f:
+		return [json.loads(line) for line in f]
+
+def test_records_are_written_in_batches(tmp_path):
+	journal = ECS.Session_Journal(str(tmp_path / 'journal.jsonl'), batch=2)
+	writes = []
+	class Counting_File(object):
+		def __init__(self, f):
+			self.f = f
+		def write(self, chunk):
+			writes.append(chunk.count('\n'))
+			return self.f.write(chunk)
+		def flush(self):
+			self.f.flush()
+		def close(self):
+			self.f.close()
+	journal.file = Counting_File(open(journal.path, 'w', encoding='utf-8'))
+	for n in range(5):
+		journal.write('EFX', 'S1', 'E1', 'line {}'.format(n), 1700000000 + n)
+	journal.queue.put(None)
+	#run the writer here, everything is already queued
+	journal.writer_thread()
+	assert writes == [2, 2, 1]
+	records = read_records(journal.path)
+	assert [list(record) for record in records] == [['@timestamp', 'source', 'scene', 'id', 'message']] * 5
+	assert records[0] == {'@timestamp':'2023-11-14T22:13:20.000Z', 'source':'EFX', 'scene':'S1', 'id':'E1', 'message':'line 0'}
+	assert [record['message'] for record in records] == ['line {}'.format(n) for n in range(5)]
+
+def test_records_are_on_disk_within_the_flush_interval(tmp_path):
+	journal = ECS.Session_Journal(str(tmp_path / 'journal.jsonl'), flush_interval=0.5)
+	journal.Start()
+	try:
+		start = time.monotonic()
+		journal.write('LOG', 'S1', None, 'sent', time.time())
+		time.sleep(0.2)
+		#still in the buffer
+		assert os.path.getsize(journal.path) == 0
+		while os.path.getsize(journal.path) == 0 and time.monotonic() - start < 5:
+			time.sleep(0.02)
+		assert 0.4 <= time.monotonic() - start < 2
+		assert [record['id'] for record in read_records(journal.path)] == [None]
+	finally:
+		journal.Stop()
+
+def test_rotates_past_max_bytes(tmp_path):
+	path = str(tmp_path / 'journal.jsonl')
+	journal = ECS.Session_Journal(path, batch=1, max_bytes=400, backups=3)
+	journal.Start()
+	for n in range(40):
+		journal.write('CONTEXT', 'S{}'.format(n % 3), 'C{}'.format(n), 'message {:02d}'.format(n), 1700000000.25 + n)
+	journal.Stop()
+	assert sorted(os.listdir(str(tmp_path))) == ['journal.jsonl', 'journal.jsonl.1', 'journal.jsonl.2', 'journal.jsonl.3']
+	files = [path + '.3', path + '.2', path + '.1', path]
+	for f in files:
+		assert 0 < os.path.getsize(f) <= 400
+	#oldest file first, the records carry on from one file to the next
+	records = [record for f in files for record in read_records(f)]
+	numbers = [int(record['message'].split()[1]) for record in records]
+	assert numbers == list(range(numbers[0], 40))
+	assert numbers[0] > 0
+	last = records[-1]
+	assert list(last) == ['@timestamp', 'source', 'scene', 'id', 'message']
+	assert last == {'@timestamp':'2023-11-14T22:13:59.250Z', 'source':'CONTEXT', 'scene':'S0', 'id':'C39', 'message':'message 39'}
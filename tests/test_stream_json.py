@@ -0,0 +1,91 @@
+import io
+import json
+
+import pytest
+
+from conftest import ECS
+
+
+LOGS = [
+	{"@timestamp": "2022-12-09T19:14:25.412Z", "message": "first"},
+	{"ts": 1670613265.412345, "id.orig_h": "10.5.1.2", "uri": "/ü/☃"},
+	{"nested": {"list": [1, 2.5, None, True], "empty": {}}, "message": "x" * 300},
+	12345,
+	[1, 2, 3],
+]
+
+
+class Counting_Reader(io.StringIO):
+	def __init__(self, text):
+		io.StringIO.__init__(self, text)
+		self.read_total = 0
+
+	def read(self, size=-1):
+		data = io.StringIO.read(self, size)
+		self.read_total += len(data)
+		return data
+
+
+@pytest.mark.parametrize('separator', ['\n', '', ' \r\n\t'])
+@pytest.mark.parametrize('read_chunk', [1, 2, 3, 7, 64, 1 << 20])
+def test_documents_across_chunk_boundaries(separator, read_chunk):
+	text = separator.join(json.dumps(log) for log in LOGS) + '\n'
+	assert list(ECS.stream_json(io.StringIO(text), read_chunk=read_chunk)) == LOGS
+
+def test_pretty_printed_documents():
+	text = ''.join(json.dumps(log, indent=4) for log in LOGS)
+	assert list(ECS.stream_json(io.StringIO(text), read_chunk=5)) == LOGS
+
+def test_number_cut_by_chunk_boundary():
+	#a top level number that ends on a chunk boundary must not be split in two
+	assert list(ECS.stream_json(io.StringIO('123456 7'), read_chunk=3)) == [123456, 7]
+
+def test_empty_strings_are_skipped():
+	assert list(ECS.stream_json(io.StringIO('"" {"a": 1} ""'), read_chunk=2)) == [{"a": 1}]
+
+def test_empty_input():
+	assert list(ECS.stream_json(io.StringIO(''))) == []
+	assert list(ECS.stream_json(io.StringIO(' \n\n '))) == []
+
+def test_malformed_document_raises_after_good_ones():
+	stream = ECS.stream_json(io.StringIO('{"a": 1}\n{"b": }\n{"c": 3}\n'), read_chunk=4)
+	assert next(stream) == {"a": 1}
+	with pytest.raises(json.JSONDecodeError):
+		next(stream)
+
+def test_truncated_document_raises():
+	with pytest.raises(json.JSONDecodeError):
+		list(ECS.stream_json(io.StringIO('{"a": 1}{"b": [1, 2'), read_chunk=3))
+
+def test_malformed_input_stops_at_max_doc():
+	#an unterminated string would otherwise be read to the end of the file before failing
+	text = '{"a": 1}\n{"b": "' + 'x' * 200000 + '\n{"c": 3}\n' * 1000
+	reader = Counting_Reader(text)
+	with pytest.raises(json.JSONDecodeError, match='No document ends within 1000'):
+		list(ECS.stream_json(reader, read_chunk=100, max_doc=1000))
+	assert reader.read_total < 5000
+
+def test_documents_up_to_max_doc_are_read():
+	big = {"message": "y" * 5000}
+	assert list(ECS.stream_json(io.StringIO(json.dumps(big) * 2), read_chunk=10, max_doc=6000)) == [big, big]
+
+def test_event_stops_the_stream():
+	import threading
+	event = threading.Event()
+	stream = ECS.stream_json(io.StringIO('1 2 3 4 5'), event, read_chunk=1)
+	assert next(stream) == 1
+	event.set()
+	assert list(stream) == []
+
+def test_toolkit_does_not_need_the_engine_dependencies(tmp_path):
+	import os
+	import subprocess
+	import sys
+	from conftest import ROOT
+	#block every module the engine needs that the standalone controller does not
+	(tmp_path / 'sitecustomize.py').write_text("import sys\nfor name in ['curses', 'readline', 'paramiko', 'scp', 'openpyxl', 'Scenario_engine_cursesier']:\n\tsys.modules[name] = None\n")
+	env = dict(os.environ, PYTHONPATH=str(tmp_path))
+	script = "import sys; sys.path.insert(0, {!r}); import standalone_log_controller as s, io; print(list(s.stream_logs(io.StringIO('{{}}{{}}'))))".format(os.path.join(ROOT, 'toolkit'))
+	out = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True)
+	assert out.returncode == 0, out.stderr
+	assert out.stdout.strip() == '[{}, {}]'
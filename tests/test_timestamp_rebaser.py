@@ -0,0 +1,101 @@
+import copy
+import json
+import random
+import time
+
+import pytest
+
+from conftest import ECS, ROOT, write_logs
+
+import sys
+import os
+sys.path.insert(0, os.path.join(ROOT, 'toolkit'))
+import standalone_log_controller as baseline
+
+
+ORIGIN = "2023-03-02T17:41:08.512Z"
+
+
+def winlogbeat_logs(count, seed=1):
+	rng = random.Random(seed)
+	t = 1670613265412
+	logs = []
+	for n in range(count):
+		t += rng.randrange(0, 5000)
+		stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t // 1000)) + ".{:03d}Z".format(t % 1000)
+		created = t + rng.randrange(0, 900)
+		created = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(created // 1000)) + ".{:03d}Z".format(created % 1000)
+		logs.append({"@timestamp": stamp, "event": {"created": created, "code": 4624}, "winlog": {"record_id": n, "times": [stamp, created]}, "message": "logon"})
+	return logs
+
+def zeek_logs(count, seed=2):
+	rng = random.Random(seed)
+	ts = 1670613265.412345
+	logs = []
+	for n in range(count):
+		ts = round(ts + rng.random() * 3, 6)
+		logs.append({"ts": ts, "uid": "C{}".format(n), "proto": "tcp"})
+	return logs
+
+def rebase_all(logs, origin=ORIGIN, fields=None, sample=1000):
+	rebaser = ECS.Timestamp_Rebaser(ECS.Timestamp_Rebaser.parse_iso(origin), fields, sample)
+	return [rebaser.rebase(log) for log in copy.deepcopy(logs)]
+
+
+def test_winlogbeat_matches_baseline():
+	logs = winlogbeat_logs(500)
+	assert rebase_all(logs) == baseline.update_timestamps(copy.deepcopy(logs), ORIGIN)
+
+def test_configured_fields_match_baseline():
+	logs = winlogbeat_logs(200)
+	fields = ['@timestamp', 'event.created', 'winlog.times.*']
+	assert rebase_all(logs, fields=fields) == baseline.update_timestamps(copy.deepcopy(logs), ORIGIN)
+
+def test_fields_learned_from_sample_are_kept():
+	logs = winlogbeat_logs(50)
+	assert rebase_all(logs, sample=3) == baseline.update_timestamps(copy.deepcopy(logs), ORIGIN)
+
+def test_zeek_matches_baseline(monkeypatch):
+	#the baseline goes through local time, which only round trips cleanly in UTC
+	monkeypatch.setenv('TZ', 'UTC')
+	time.tzset()
+	try:
+		logs = zeek_logs(300)
+		ours = rebase_all(logs)
+		theirs = baseline.update_timestamps(copy.deepcopy(logs), ORIGIN)
+	finally:
+		monkeypatch.undo()
+		time.tzset()
+	assert [log["@timestamp"] for log in ours] == [log["@timestamp"] for log in theirs]
+	for a, b in zip(ours, theirs):
+		assert float(a["ts"]) == pytest.approx(float(b["ts"]), abs=2e-6)
+		assert {k: v for k, v in a.items() if k not in ("ts", "@timestamp")} == {k: v for k, v in b.items() if k not in ("ts", "@timestamp")}
+
+def test_first_timestamp_lands_on_origin():
+	logs = rebase_all(winlogbeat_logs(5))
+	assert logs[0]["@timestamp"] == ORIGIN
+
+def test_no_timestamps_leaves_documents_alone():
+	logs = [{"message": "2022-12-09 not a timestamp", "n": 1}]
+	assert rebase_all(logs) == logs
+
+
+def test_update_timestamps_uses_rebaser(tmp_path, make_controller):
+	logs = winlogbeat_logs(20)
+	log_file = write_logs(tmp_path / 'w.json', logs)
+	controller = make_controller(log_file, time=ORIGIN)
+	assert controller.update_timestamps(copy.deepcopy(logs)) == baseline.update_timestamps(copy.deepcopy(logs), ORIGIN)
+
+def test_bad_time_option_is_reported(tmp_path, make_controller):
+	controller = make_controller(write_logs(tmp_path / 'w.json', []), time='yesterday')
+	assert controller.update_timestamps([]) == -1
+	assert 'not supported' in controller.Error_message_queue.get_nowait()
+
+def test_non_numeric_setting_is_reported(tmp_path, make_controller):
+	controller = make_controller(write_logs(tmp_path / 'w.json', []), timestamp_sample='lots')
+	assert controller.failed
+	message = controller.Error_message_queue.get_nowait()
+	assert message.startswith('[!] Bad config provided.') and 'lots' in message
+	#nothing is run for it
+	controller.Run()
+	assert controller.futures == []
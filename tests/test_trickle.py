@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import ECS, record_sends, write_logs
+
+
+ORIGIN = "2023-03-02T17:41:08.512Z"
+SPACING = 0.02
+
+
+def stamp(seconds):
+	us = round((1670613265.412 + seconds) * 1000000)
+	return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(us // 1000000)) + ".{:03d}Z".format(us // 1000 % 1000)
+
+def spaced_logs(count, spacing=SPACING):
+	return [{"@timestamp": stamp(n * spacing), "n": n} for n in range(count)]
+
+def sent_order(sent):
+	return [log['n'] for when, logs in sent for log in logs]
+
+
+def test_documents_go_out_in_time_order(tmp_path, make_controller):
+	logs = spaced_logs(10)
+	shuffled = [logs[n] for n in [3, 0, 9, 1, 5, 2, 8, 4, 7, 6]]
+	shuffled.insert(4, {"n": 'untimed'})
+	controller = make_controller(write_logs(tmp_path / 'l.json', shuffled), delay=True, trickle_tick=0.005)
+	sent = record_sends(controller)
+	assert controller.trickle_logs(shuffled) == "done."
+	#documents without a time go with the first tick
+	assert 'untimed' in [log['n'] for log in sent[0][1]]
+	assert [n for n in sent_order(sent) if n != 'untimed'] == list(range(10))
+	for when, batch in sent:
+		for log in batch:
+			if log['n'] != 'untimed':
+				assert when >= log['n'] * SPACING - 0.002
+
+def test_one_request_per_tick(tmp_path, make_controller):
+	logs = spaced_logs(20, 0.005)
+	controller = make_controller(write_logs(tmp_path / 'l.json', logs), delay=True, trickle_tick=0.04)
+	sent = record_sends(controller)
+	controller.trickle_logs(logs)
+	assert sent_order(sent) == list(range(20))
+	assert len(sent) <= 5
+	for (a, x), (b, y) in zip(sent, sent[1:]):
+		assert b - a >= 0.04 - 0.002
+
+
+def path_runner(path, controller, log_file):
+	if path == 'staged':
+		payload = ECS.Log_Payload(log_file).build()
+		return lambda: controller.send_payload(payload)
+	if path == 'indexed':
+		return lambda: controller.trickle_indexed(log_file)
+	return lambda: controller.trickle_logs(controller.parse_logs(log_file), 'default', controller.make_rebaser())
+
+@pytest.mark.parametrize('path', ['staged', 'indexed', 'parsed'])
+def test_replay_start_skips_and_rebases_from_first_sent(tmp_path, make_controller, path):
+	logs = spaced_logs(20)
+	log_file = write_logs(tmp_path / 'l.json', logs)
+	controller = make_controller(log_file, time=ORIGIN, delay=True, trickle_tick=0.005, replay_start=10 * SPACING - 0.001)
+	sent = record_sends(controller)
+	assert path_runner(path, controller, log_file)() == "done."
+	assert sent_order(sent) == list(range(10, 20))
+	first = sent[0][1][0]
+	assert first['@timestamp'] == ORIGIN
+	#the rest keep their spacing from it
+	last = sent[-1][1][-1]
+	assert ECS.Timestamp_Rebaser.parse_iso(last['@timestamp']) - ECS.Timestamp_Rebaser.parse_iso(ORIGIN) == round(9 * SPACING * 1000) * 1000
+	#starting in the middle does not wait for the skipped part
+	assert sent[0][0] < 0.05
+	assert controller.cursor['next'] == 20
+
+@pytest.mark.parametrize('path', ['staged', 'indexed', 'parsed'])
+def test_seek(tmp_path, make_controller, monkeypatch, path):
+	#bisect only takes a key from Python 3.10, the trickle has to do without
+	bisect_left = ECS.bisect.bisect_left
+	def old_bisect_left(a, x, lo=0, hi=None):
+		return bisect_left(a, x, lo, len(a) if hi is None else hi)
+	monkeypatch.setattr(ECS.bisect, 'bisect_left', old_bisect_left)
+	logs = spaced_logs(40)
+	log_file = write_logs(tmp_path / 'l.json', logs)
+	controller = make_controller(log_file, time=ORIGIN, delay=True, trickle_tick=0.005)
+	seeks = []
+	def on_send(sent):
+		#jump ahead once the first document is out, then back once the jump landed
+		if len(seeks) == 0:
+			seeks.append('forward')
+			controller.Seek(30 * SPACING - 0.001)
+		elif len(seeks) == 1 and sent[-1][1][0]['n'] >= 30:
+			seeks.append('back')
+			controller.Seek(-25 * SPACING, relative=True)
+	sent = record_sends(controller, on_send)
+	assert path_runner(path, controller, log_file)() == "done."
+	order = sent_order(sent)
+	assert order[0] == 0
+	back = order.index(30)
+	#everything between was skipped, then the seek back sent documents again
+	assert 1 not in order[:back]
+	assert order[back:].count(30) == 2
+	assert order[-1] == 39
+	#documents sent twice carry the same timestamps both times
+	times = {}
+	for when, batch in sent:
+		for log in batch:
+			assert times.setdefault(log['n'], log['@timestamp']) == log['@timestamp']
+
+def test_stop_ends_the_trickle(tmp_path, make_controller):
+	logs = spaced_logs(10, 1.0)
+	controller = make_controller(write_logs(tmp_path / 'l.json', logs), delay=True)
+	sent = record_sends(controller)
+	threading.Timer(0.1, controller.Stop).start()
+	start = time.monotonic()
+	assert controller.trickle_logs(logs) == "thread killed."
+	assert time.monotonic() - start < 1.0
+	assert sent_order(sent) == [0]
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 National Technology & Engineering Solutions of Sandia, LLC (NTESS).
+# Under the terms of Contract DE-NA0003525 with NTESS, the U.S. Government retains
+# certain rights in this software.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+#benchmarks the Scenario Engine's Log_Controller against a stand-in elastic running in this process
+#no ELK stack is needed: logs are generated, parsed, rebased and sent to a local _bulk server that can add latency and errors
+#results can be saved and compared against an earlier run to catch slowdowns before an exercise
+
+# IMPORTS
+
+import argparse
+import http.server
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import Scenario_engine_cursesier as ECS
+
+# FLAGS, GLOBALS
+
+verbose = False
+benchmarks = ['parse', 'update', 'send', 'trickle']
+kinds = ['winlogbeat', 'zeek']
+
+
+# CONSOLE OUTPUT FUNCTIONS
+
+def notify(message):
+	global verbose
+	if not verbose:
+		return
+	yellow='\033[0;33m'
+	no_color='\033[0m'
+	print(yellow + "[+] " + message + no_color, file=sys.stderr)
+
+def error(message):
+	red='\033[0;31m'
+	no_color='\033[0m'
+	print(red + "[!] " + message + no_color, file=sys.stderr)
+
+
+# MOCK ELASTIC
+
+#just enough of elastic for the Log_Controller: POST _bulk, DELETE <index> and GET /
+#latency and errors can be injected, and every document's arrival time can be recorded to measure trickle drift
+class Mock_Elastic_Handler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_message(self, *args):
+		pass
+
+	def reply(self, status, body):
+		out = json.dumps(body).encode()
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(out)))
+		self.end_headers()
+		self.wfile.write(out)
+
+	def do_GET(self):
+		self.reply(200, {'name':'ecs-mock', 'cluster_name':'ecs-benchmark', 'version':{'number':'7.17.0'}})
+
+	def do_POST(self):
+		server = self.server
+		body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		arrived = time.monotonic()
+		if not '/_bulk' in self.path:
+			self.reply(404, {'error':'only _bulk is mocked'})
+			return
+		if server.latency > 0 or server.jitter > 0:
+			time.sleep(server.latency + server.random.uniform(0, server.jitter))
+
+		#busy / broken elastic, the Log_Controller retries these
+		if server.error_rate > 0 and server.random.random() < server.error_rate:
+			status = server.random.choice([429, 500, 503])
+			with server.lock:
+				server.stats['errors'] += 1
+			self.reply(status, {'error':'injected', 'status':status})
+			return
+
+		lines = body.split(b'\n')
+		docs = lines[1:len(lines) - 1:2]
+		index = json.loads(lines[0])['index']['_index'] if len(lines) > 1 else None
+		rejected = 0
+		if server.reject_rate > 0:
+			rejected = sum(1 for doc in docs if server.random.random() < server.reject_rate)
+		times = []
+		if server.record:
+			times = [ECS.Log_Index.primary_time(json.loads(doc)) for doc in docs]
+
+		with server.lock:
+			server.stats['requests'] += 1
+			server.stats['docs'] += len(docs) - rejected
+			server.stats['rejected'] += rejected
+			server.stats['bytes'] += len(body)
+			server.indexes[index] = server.indexes.get(index, 0) + len(docs) - rejected
+			if server.record:
+				server.arrivals.extend((arrived, t) for t in times)
+
+		if rejected > 0:
+			items = [{'index':{'status':400, 'error':{'type':'mapper_parsing_exception', 'reason':'injected'}}}] * rejected
+			self.reply(200, {'errors':True, 'items':items})
+		else:
+			self.reply(200, {'errors':False})
+
+	def do_DELETE(self):
+		server = self.server
+		index = self.path.lstrip('/').split('?')[0]
+		with server.lock:
+			found = server.indexes.pop(index, None) != None
+			server.stats['deletes'] += 1
+		if found:
+			self.reply(200, {'acknowledged':True})
+		else:
+			self.reply(404, {'error':{'type':'index_not_found_exception', 'index':index}, 'status':404})
+
+#serves Mock_Elastic_Handler on its own thread
+# port : int, 0 picks a free port
+# latency : float, seconds every _bulk request is held before it is answered
+# jitter : float, up to this many more seconds, random per request
+# error_rate : float, fraction of _bulk requests answered with 429/500/503
+# reject_rate : float, fraction of documents reported back as rejected
+class Mock_Elastic(http.server.ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, port=0, latency=0.0, jitter=0.0, error_rate=0.0, reject_rate=0.0, seed=0):
+		super().__init__(('127.0.0.1', port), Mock_Elastic_Handler)
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.reject_rate = reject_rate
+		self.random = random.Random(seed)
+		self.lock = threading.Lock()
+		self.record = False
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.stats = {'requests':0, 'docs':0, 'rejected':0, 'bytes':0, 'errors':0, 'deletes':0}
+			self.indexes = {}
+			self.arrivals = []
+
+	def start(self):
+		self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def port(self):
+		return self.server_address[1]
+
+
+# LOG GENERATOR
+
+first_timestamp = 1670613265.412
+
+#winlogbeat style document, timestamps as "2022-12-09T19:14:25.412Z" strings
+def winlogbeat_doc(rng, n, ts):
+	stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)) + ".{:03d}Z".format(int(ts * 1000) % 1000)
+	host = "WS-{:03d}".format(rng.randrange(200))
+	return {
+		"@timestamp": stamp,
+		"agent": {"type": "winlogbeat", "version": "7.17.0", "hostname": host},
+		"ecs": {"version": "1.12.0"},
+		"event": {"code": 4624, "created": stamp, "kind": "event", "provider": "Microsoft-Windows-Security-Auditing", "outcome": "success"},
+		"host": {"name": host, "ip": ["10.5.{}.{}".format(rng.randrange(256), rng.randrange(256))]},
+		"winlog": {"channel": "Security", "event_id": 4624, "record_id": n, "computer_name": host + ".ecs.local",
+			"event_data": {"TargetUserName": "user{}".format(rng.randrange(1000)), "LogonType": str(rng.choice([2, 3, 10])), "IpAddress": "10.5.{}.{}".format(rng.randrange(256), rng.randrange(256))}},
+		"message": "An account was successfully logged on."
+	}
+
+#zeek conn style document, timestamp as a float "ts" epoch
+def zeek_doc(rng, n, ts):
+	return {
+		"ts": round(ts, 6),
+		"uid": "C{:016x}".format(rng.getrandbits(64)),
+		"id.orig_h": "10.5.{}.{}".format(rng.randrange(256), rng.randrange(256)),
+		"id.orig_p": rng.randrange(1024, 65536),
+		"id.resp_h": "10.1.{}.{}".format(rng.randrange(256), rng.randrange(256)),
+		"id.resp_p": rng.choice([22, 53, 80, 443, 502, 20000]),
+		"proto": "tcp",
+		"service": "http",
+		"duration": round(rng.random(), 6),
+		"orig_bytes": rng.randrange(100000),
+		"resp_bytes": rng.randrange(100000),
+		"conn_state": "SF",
+		"history": "ShADadFf",
+		"uri": "/"
+	}
+
+#write a synthetic log file, one JSON document per line like logstash's json output
+#documents are padded to about doc_bytes each and spaced 1/rate seconds apart in log time
+# path : string, file to write
+# kind : string, winlogbeat or zeek
+# count : int, number of documents
+# doc_bytes : int, about how big each serialized document is
+# rate : float, documents per second of log time
+# returns bytes written
+def generate_logs(path, kind, count, doc_bytes=800, rate=1000.0, seed=0):
+	rng = random.Random(seed)
+	make = winlogbeat_doc if kind == 'winlogbeat' else zeek_doc
+	pad_field = 'message' if kind == 'winlogbeat' else 'uri'
+	filler = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789 ') for i in range(4096))
+	written = 0
+	with open(path, 'w') as f:
+		lines = []
+		for n in range(count):
+			doc = make(rng, n, first_timestamp + n / rate)
+			line = json.dumps(doc)
+			#filler has nothing json escapes, so every character of it is one byte of the line
+			short = doc_bytes - len(line) - 1
+			if short > 0:
+				at = rng.randrange(len(filler))
+				doc[pad_field] += (filler * (short // len(filler) + 2))[at:at + short]
+				line = json.dumps(doc)
+			lines.append(line + '\n')
+			if len(lines) >= 10000:
+				written += f.write(''.join(lines))
+				lines = []
+		written += f.write(''.join(lines))
+	return written
+
+
+# BENCHMARKS
+
+#stands in for Scenario_Data with a single log, the Log_Controller only needs Logs and get_payload
+class Bench_Scenario(object):
+	def __init__(self, log_file, conf_file):
+		self.cache_dir = os.path.join(os.path.dirname(conf_file), '.ecs_cache')
+		self.Logs = {'bench':{'log_file':[log_file], 'config_file':[conf_file], 'log_index':['ecs-bench'], 'log_time':['now']}}
+
+	def get_payload(self, Log_ID):
+		return None
+
+#Log_Controller configured against the mock elastic, its messages are kept on queues and only errors are shown
+def make_controller(log_file, work_dir, port, options):
+	conf_file = os.path.join(work_dir, 'bench.conf')
+	with open(conf_file, 'w') as f:
+		f.write("[ELK]\nip = 127.0.0.1\nport = {}\ntime = now\nusername = bench\npassword = bench\nindex = ecs-bench\nsecurity = False\ndelay = False\n".format(port))
+		f.write("workers = {}\nbulk_docs = {}\ntrickle_tick = {}\nbulk_retries = {}\n".format(options['workers'], options['bulk_docs'], options['trickle_tick'], options['bulk_retries']))
+	messages = queue.Queue()
+	errors = queue.Queue()
+	controller = ECS.Log_Controller(Bench_Scenario(log_file, conf_file), 'bench', messages, errors, queue.Queue())
+	return controller, messages, errors
+
+def peak_rss_mb():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+#schedule drift of a trickle: how late each document arrived at elastic compared to where it falls in the logs
+# arrivals : list of (monotonic arrival, document time in microseconds)
+# start : float, monotonic time the trickle started
+def drift_stats(arrivals, start):
+	times = [t for arrived, t in arrivals if t != None]
+	if len(times) == 0:
+		return None
+	first = min(times)
+	drifts = sorted(arrived - start - (t - first) / 1000000 for arrived, t in arrivals if t != None)
+	return {'drift_mean_ms': round(sum(drifts) / len(drifts) * 1000, 2),
+		'drift_p50_ms': round(drifts[len(drifts) // 2] * 1000, 2),
+		'drift_p99_ms': round(drifts[min(len(drifts) - 1, int(len(drifts) * 0.99))] * 1000, 2),
+		'drift_max_ms': round(drifts[-1] * 1000, 2)}
+
+#run one benchmark, meant to be the only thing a fresh process does so its peak RSS is its own
+# name : string, one of benchmarks
+# log_file : string, generated log file
+# options : dict, parsed command line options
+# returns dict of results
+def run_benchmark(name, log_file, work_dir, options):
+	server = Mock_Elastic(0, options['latency'], options['jitter'], options['error_rate'], options['reject_rate'], options['seed']).start()
+	controller, messages, errors = make_controller(log_file, work_dir, server.port(), options)
+	file_bytes = os.path.getsize(log_file)
+	result = {'benchmark':name}
+
+	#everything but parse starts from parsed logs, which are not part of the timing
+	logs = None
+	if name != 'parse':
+		logs = controller.parse_logs(log_file)
+		if name == 'send' or name == 'trickle':
+			logs = controller.update_timestamps(logs)
+	rss_before = peak_rss_mb()
+
+	start = time.monotonic()
+	if name == 'parse':
+		out = controller.parse_logs(log_file)
+		docs = len(out) if isinstance(out, list) else 0
+		data_bytes = file_bytes
+	elif name == 'update':
+		out = controller.update_timestamps(logs)
+		docs = len(out) if isinstance(out, list) else 0
+		data_bytes = file_bytes
+	elif name == 'send':
+		out = controller.send_logs(logs, progress=False)
+		docs = len(logs)
+		data_bytes = server.stats['bytes']
+	elif name == 'trickle':
+		server.record = True
+		start = time.monotonic()
+		out = controller.trickle_logs(logs)
+		docs = len(logs)
+		data_bytes = server.stats['bytes']
+	elapsed = time.monotonic() - start
+
+	if name == 'send' or name == 'trickle':
+		result['received'] = server.stats['docs']
+		result['requests'] = server.stats['requests']
+		result['injected_errors'] = server.stats['errors']
+		result['rejected'] = server.stats['rejected']
+		result['lost'] = docs - server.stats['docs'] - server.stats['rejected']
+		#clear_index as the ECS does between runs
+		response = controller.clear_index()
+		if response != '<Response [200]>':
+			error("clearing ecs-bench returned {}".format(response))
+	if name == 'trickle':
+		result.update(drift_stats(server.arrivals, start) or {})
+		result['log_seconds'] = round(docs / options['trickle_rate'], 3)
+
+	result.update({'docs':docs, 'seconds':round(elapsed, 4),
+		'docs_per_sec':round(docs / elapsed, 1) if elapsed > 0 else None,
+		'mb_per_sec':round(data_bytes / 1048576 / elapsed, 2) if elapsed > 0 else None,
+		'peak_rss_mb':round(peak_rss_mb(), 1),
+		'rss_growth_mb':round(peak_rss_mb() - rss_before, 1),
+		'errors':errors.qsize()})
+	while not errors.empty():
+		notify(errors.get())
+	server.shutdown()
+	ECS.ELK_Connections.close()
+	return result
+
+#child process side of run_isolated
+def benchmark_process(pipe, name, log_file, work_dir, options):
+	try:
+		pipe.send(run_benchmark(name, log_file, work_dir, options))
+	except Exception as e:
+		pipe.send({'benchmark':name, 'failed':repr(e)})
+	pipe.close()
+
+#run a benchmark in a forked process so peak RSS is not carried over from the benchmarks before it
+def run_isolated(name, log_file, work_dir, options):
+	context = multiprocessing.get_context('fork')
+	parent, child = context.Pipe(duplex=False)
+	process = context.Process(target=benchmark_process, args=[child, name, log_file, work_dir, options])
+	process.start()
+	child.close()
+	try:
+		result = parent.recv()
+	except EOFError:
+		result = {'benchmark':name, 'failed':'benchmark process exited with {}'.format(process.exitcode)}
+	process.join()
+	return result
+
+
+# RESULTS
+
+#benchmarks that got slower, bigger or drifted more than tolerance over a saved run
+# results : list of result dicts, this run
+# baseline : list of result dicts, an earlier run saved with --save
+# tolerance : float, fraction worse than the baseline that is let through
+# returns list of strings, one per regression
+def compare(results, baseline, tolerance):
+	earlier = {(r['benchmark'], r['kind']): r for r in baseline}
+	regressions = []
+	for r in results:
+		base = earlier.get((r['benchmark'], r['kind']))
+		if base == None or 'failed' in r or 'failed' in base:
+			continue
+		key = "{} {}".format(r['benchmark'], r['kind'])
+		#trickles run at the rate of the logs, so their throughput says nothing
+		if r['benchmark'] != 'trickle' and base.get('docs_per_sec') and r['docs_per_sec'] < base['docs_per_sec'] * (1 - tolerance):
+			regressions.append("{}: {:.0f} docs/sec, was {:.0f}".format(key, r['docs_per_sec'], base['docs_per_sec']))
+		if base.get('rss_growth_mb') != None and r['rss_growth_mb'] > max(base['rss_growth_mb'] * (1 + tolerance), base['rss_growth_mb'] + 16):
+			regressions.append("{}: RSS grew {:.1f} MB, was {:.1f} MB".format(key, r['rss_growth_mb'], base['rss_growth_mb']))
+		#drift is measured in ms and is noisy, allow a tick's worth on top of the tolerance
+		if base.get('drift_p99_ms') != None and r.get('drift_p99_ms') != None and r['drift_p99_ms'] > base['drift_p99_ms'] * (1 + tolerance) + r['trickle_tick'] * 1000:
+			regressions.append("{}: p99 drift {:.1f} ms, was {:.1f} ms".format(key, r['drift_p99_ms'], base['drift_p99_ms']))
+	return regressions
+
+def print_results(results):
+	print("{:<8} {:<11} {:>8} {:>9} {:>11} {:>8} {:>9} {:>8} {:>15} {:>6}".format('bench', 'kind', 'docs', 'seconds', 'docs/sec', 'MB/sec', 'peak RSS', '+RSS', 'drift p99/max', 'errors'))
+	for r in results:
+		if 'failed' in r:
+			print("{:<8} {:<11} failed: {}".format(r['benchmark'], r['kind'], r['failed']))
+			continue
+		drift = "{:.1f}/{:.1f} ms".format(r['drift_p99_ms'], r['drift_max_ms']) if 'drift_p99_ms' in r else '-'
+		print("{:<8} {:<11} {:>8} {:>9.3f} {:>11.0f} {:>8.1f} {:>6.1f} MB {:>5.1f} MB {:>15} {:>6}".format(
+			r['benchmark'], r['kind'], r['docs'], r['seconds'], r['docs_per_sec'] or 0, r['mb_per_sec'] or 0, r['peak_rss_mb'], r['rss_growth_mb'], drift, r['errors']))
+		if r.get('lost'):
+			error("{} {}: {} documents never reached elastic".format(r['benchmark'], r['kind'], r['lost']))
+
+
+# SETUP
+
+def setup():
+	global verbose
+
+	parser = argparse.ArgumentParser(description='Benchmarks the Log Controller (parse_logs, update_timestamps, send_logs and trickle_logs) against a mock elastic _bulk server running in this process, reporting docs/sec, MB/sec, peak RSS and trickle schedule drift.')
+
+	parser.add_argument('-b', '--bench', default=','.join(benchmarks), help="Comma separated benchmarks to run out of {}. Default is all of them.".format(', '.join(benchmarks)))
+	parser.add_argument('-k', '--kind', default=','.join(kinds), help="Comma separated kinds of logs to generate: winlogbeat (@timestamp strings) and/or zeek (float ts). Default is both.")
+	parser.add_argument('-n', '--docs', type=int, default=100000, help="Documents generated for parse, update and send. Default is 100000.")
+	parser.add_argument('--doc-bytes', type=int, default=800, help="About how big each generated document is. Default is 800.")
+	parser.add_argument('--trickle-docs', type=int, default=500, help="Documents trickled. Default is 500.")
+	parser.add_argument('--trickle-rate', type=float, default=100.0, help="Documents per second of log time in the trickled logs. Default is 100.")
+	parser.add_argument('--trickle-tick', type=float, default=0.1, help="trickle_tick the Log Controller runs with. Default is 0.1.")
+	parser.add_argument('-w', '--workers', type=int, default=1, help="Bulk workers the Log Controller runs with. Default is 1.")
+	parser.add_argument('--bulk-docs', type=int, default=5000, help="Documents per _bulk request. Default is 5000.")
+	parser.add_argument('--bulk-retries', type=int, default=2, help="Times a failed _bulk request is retried. Default is 2.")
+	parser.add_argument('--latency', type=float, default=0.0, help="Seconds the mock elastic holds every _bulk request.")
+	parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many more seconds of latency, random per request.")
+	parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of _bulk requests answered with 429/500/503.")
+	parser.add_argument('--reject-rate', type=float, default=0.0, help="Fraction of documents the mock elastic rejects.")
+	parser.add_argument('--seed', type=int, default=0, help="Seed for the generated logs and injected errors.")
+	parser.add_argument('-d', '--dir', help="Directory to generate the logs in. Default is a temporary directory that is removed afterwards.")
+	parser.add_argument('--generate-only', action='store_true', help="Only generate the log files into --dir.")
+	parser.add_argument('--serve', type=int, metavar='PORT', help="Only run the mock elastic on this port, e.g. to point a scenario's log config at.")
+	parser.add_argument('--save', help="Save the results as JSON to this file.")
+	parser.add_argument('--baseline', help="Compare against results saved with --save and exit 1 on regressions.")
+	parser.add_argument('--tolerance', type=float, default=0.2, help="Fraction worse than the baseline that is not a regression. Default is 0.2.")
+	parser.add_argument('--json', action='store_true', help="Print results as JSON instead of a table.")
+	parser.add_argument('-v', '--verbose', action='store_true', help="Set this flag for verbose output information.")
+
+	args = vars(parser.parse_args())
+	if args['verbose']:
+		verbose = True
+
+	args['bench'] = [b.strip() for b in args['bench'].split(',') if b.strip() != '']
+	args['kind'] = [k.strip() for k in args['kind'].split(',') if k.strip() != '']
+	for b in args['bench']:
+		if not b in benchmarks:
+			parser.error("unknown benchmark " + b)
+	for k in args['kind']:
+		if not k in kinds:
+			parser.error("unknown kind " + k)
+	if args['generate_only'] and args['dir'] == None:
+		parser.error("--generate-only needs --dir")
+	if args['trickle_rate'] <= 0 or args['docs'] <= 0 or args['trickle_docs'] <= 0:
+		parser.error("--docs, --trickle-docs and --trickle-rate must be positive")
+	return args
+
+
+if __name__=="__main__":
+	options = setup()
+
+	if options['serve'] != None:
+		server = Mock_Elastic(options['serve'], options['latency'], options['jitter'], options['error_rate'], options['reject_rate'], options['seed']).start()
+		print("mock elastic on http://127.0.0.1:{}, Ctrl-C to stop".format(server.port()))
+		try:
+			while True:
+				time.sleep(10)
+				notify(json.dumps(server.stats))
+		except KeyboardInterrupt:
+			print(json.dumps(server.stats))
+		exit(0)
+
+	work_dir = options['dir'] if options['dir'] != None else tempfile.mkdtemp(prefix='ecs-bench-')
+	os.makedirs(work_dir, exist_ok=True)
+
+	#bulk logs for parse, update and send, slower logs for trickle
+	files = {}
+	needed = {True: options['generate_only'] or any(b != 'trickle' for b in options['bench']),
+		False: options['generate_only'] or 'trickle' in options['bench']}
+	for kind in options['kind']:
+		for bulk in [True, False]:
+			if not needed[bulk]:
+				continue
+			count = options['docs'] if bulk else options['trickle_docs']
+			rate = 1000.0 if bulk else options['trickle_rate']
+			path = os.path.join(work_dir, "{}{}.json".format(kind, '' if bulk else '_trickle'))
+			start = time.monotonic()
+			size = generate_logs(path, kind, count, options['doc_bytes'], rate, options['seed'])
+			notify("generated {} ({} docs, {:.1f} MB) in {:.1f}s".format(path, count, size / 1048576, time.monotonic() - start))
+			files[(kind, bulk)] = path
+	if options['generate_only']:
+		print("\n".join(files.values()))
+		exit(0)
+
+	results = []
+	try:
+		for kind in options['kind']:
+			for name in options['bench']:
+				notify("running {} on {}".format(name, kind))
+				result = run_isolated(name, files[(kind, name != 'trickle')], work_dir, options)
+				result['kind'] = kind
+				result['trickle_tick'] = options['trickle_tick']
+				results.append(result)
+	finally:
+		if options['dir'] == None:
+			shutil.rmtree(work_dir, ignore_errors=True)
+
+	if options['json']:
+		print(json.dumps(results, indent=1))
+	else:
+		print_results(results)
+
+	if options['save'] != None:
+		with open(options['save'], 'w') as f:
+			json.dump({'options':{k:v for k, v in options.items() if k in ['docs', 'doc_bytes', 'trickle_docs', 'trickle_rate', 'trickle_tick', 'workers', 'bulk_docs', 'latency', 'jitter', 'error_rate', 'reject_rate']}, 'results':results}, f, indent=1)
+
+	regressions = []
+	if options['baseline'] != None:
+		with open(options['baseline'], 'r') as f:
+			regressions = compare(results, json.load(f)['results'], options['tolerance'])
+		for r in regressions:
+			error("regression: " + r)
+		if len(regressions) == 0:
+			print("no regressions against " + options['baseline'])
+
+	failed = any('failed' in r for r in results)
+	exit(1 if regressions or failed else 0)
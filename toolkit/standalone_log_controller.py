@@ -28,6 +28,12 @@ import http.client as http_client
 import re
 from datetime import datetime
 import time
+import os
+import sys
+
+#the json decoding is shared with the Scenario Engine, log_stream.py only needs the standard library
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from log_stream import stream_json
 
 # FLAGS, GLOBALS
 
@@ -62,26 +68,14 @@ def error(message):
 
 # MAIN PROGRAM FUNCTIONS
 
+#decode json documents out of a log file one at a time, see stream_json in log_stream.py
+def stream_logs(fileobj, read_chunk=1 << 20):
+	return stream_json(fileobj, None, read_chunk)
+
 def parse_logs(my_file):
-	decoder = json.JSONDecoder()
-	fileobj = open(my_file, 'r')
 	#TODO:: verify log file content / structure?
-	all_logs = []
-
-	contents = fileobj.readlines()
-	for line in contents:
-		line=line.strip()
-		pos = 0
-		while not pos == len(line):
-			curr_log, length = decoder.raw_decode(line[pos:])
-			all_logs.append(curr_log)
-			pos+=length
-
-	#edge case where an empty string ends up in there
-	while("" in all_logs):
-		all_logs.remove("")
-
-	return all_logs
+	with open(my_file, 'r') as fileobj:
+		return list(stream_logs(fileobj))
 
 
 #sample timestamp: 2022-12-09T19:14:25.412Z